@@ -4,6 +4,13 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
+import metricas
+import servidor
+from autocomplete import IndiceAtualizavel
+from cache import CacheBinario, criar_cache
+from executor import ExecutorLimitado, Sobrecarregado
+from storage import criar_storage, LeitorEmBlocos, CHUNK_SIZE
+from uploads import RequestComLimites, parse_limites_por_tipo
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,11 +27,92 @@ if not SECRET_KEY or not DATABASE_URL:
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool de conexões dimensionado pela quantidade de workers/threads do gunicorn (ver servidor.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = servidor.opcoes_engine(DATABASE_URL)
+
+# Armazenamento dos anexos: 'local' (padrão) ou 's3'
+app.config['ANEXOS_STORAGE'] = os.getenv('ANEXOS_STORAGE', 'local')
+app.config['ANEXOS_DIR'] = os.getenv('ANEXOS_DIR', os.path.join(app.instance_path, 'anexos'))
+app.config['ANEXOS_S3_BUCKET'] = os.getenv('ANEXOS_S3_BUCKET')
+app.config['ANEXOS_S3_PREFIX'] = os.getenv('ANEXOS_S3_PREFIX', '')
+app.config['ANEXOS_S3_ENDPOINT_URL'] = os.getenv('ANEXOS_S3_ENDPOINT_URL')
+
+# Limites de upload em MB: total por requisição e, opcionalmente, por extensão ("pdf=50,jpg=10")
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv('MAX_CONTENT_LENGTH_MB', '50')) * 1024 * 1024)
+app.config['ANEXO_LIMITES_POR_TIPO'] = parse_limites_por_tipo(os.getenv('ANEXO_LIMITES_POR_TIPO'))
+app.request_class = RequestComLimites
+
+# Cache compartilhado entre os workers: 'arquivo' (padrão), 'redis' ou 'memoria'
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'arquivo')
+app.config['CACHE_DIR'] = os.getenv('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')
+# Vida máxima (segundos) das entradas no backend, inclusive as sem TTL, e limite de arquivos do backend 'arquivo'
+app.config['CACHE_TTL_MAXIMO'] = int(os.getenv('CACHE_TTL_MAXIMO', '86400'))
+app.config['CACHE_ARQUIVO_MAX_ENTRADAS'] = int(os.getenv('CACHE_ARQUIVO_MAX_ENTRADAS', '10000'))
+# Respostas do dashboard: frescas por TTL segundos, servidas vencidas (e renovadas) por mais TOLERANCIA
+app.config['DASHBOARD_CACHE_TTL'] = int(os.getenv('DASHBOARD_CACHE_TTL', '30'))
+app.config['DASHBOARD_CACHE_TOLERANCIA'] = int(os.getenv('DASHBOARD_CACHE_TOLERANCIA', '300'))
+
+# Tarefas em segundo plano (flask worker): arquivos gerados, tempo até uma tarefa
+# em execução ser considerada abandonada e por quanto tempo os resultados ficam disponíveis
+app.config['JOBS_DIR'] = os.getenv('JOBS_DIR', os.path.join(app.instance_path, 'jobs'))
+app.config['JOBS_S3_PREFIX'] = os.getenv('JOBS_S3_PREFIX', 'jobs')
+app.config['JOBS_TIMEOUT'] = int(os.getenv('JOBS_TIMEOUT', '3600'))
+app.config['JOBS_RETENCAO_HORAS'] = int(os.getenv('JOBS_RETENCAO_HORAS', '24'))
+
+# Cache dos PDFs de protocolo já gerados: tempo (segundos), diretório, limite em disco e
+# limite do LRU em memória de cada processo (MB)
+app.config['PDF_CACHE_TTL'] = int(os.getenv('PDF_CACHE_TTL', '86400'))
+app.config['PDF_CACHE_DIR'] = os.getenv('PDF_CACHE_DIR', os.path.join(app.instance_path, 'cache_pdf'))
+app.config['PDF_CACHE_MAX_MB'] = int(os.getenv('PDF_CACHE_MAX_MB', '1024'))
+app.config['PDF_CACHE_MEMORIA_MB'] = int(os.getenv('PDF_CACHE_MEMORIA_MB', '32'))
+
+# Máximo de protocolos em um PDF em lote
+app.config['PDF_LOTE_MAX'] = int(os.getenv('PDF_LOTE_MAX', '500'))
+# ... e no PDF em lote gerado dentro da requisição (GET /protocolos/pdf), que precisa caber no
+# timeout do gunicorn; lotes maiores vão para a fila (POST /jobs/protocolos/pdf)
+app.config['PDF_LOTE_SINCRONO_MAX'] = int(os.getenv('PDF_LOTE_SINCRONO_MAX', '20'))
+
+# Pool de processos para bcrypt e PDF, por processo: processos (vazio = a fatia de cada worker
+# HTTP nas CPUs ou todas fora do gunicorn, 0 = no próprio processo), tarefas que podem esperar na fila e espera máxima em segundos
+app.config['EXECUTOR_PROCESSOS'] = servidor.processos_cpu_por_worker()
+app.config['EXECUTOR_FILA'] = int(os.getenv('EXECUTOR_FILA', '8'))
+app.config['EXECUTOR_TIMEOUT'] = int(os.getenv('EXECUTOR_TIMEOUT', '30'))
+
+# Instrumentação por requisição (instrumentacao.py): tempo, SQL e bytes por rota em /metrics,
+# pico de memória (tracemalloc, mais lento) e limite em ms para registrar requisições lentas no log
+app.config['INSTRUMENTACAO'] = os.getenv('INSTRUMENTACAO', '0') == '1'
+app.config['INSTRUMENTACAO_MEMORIA'] = os.getenv('INSTRUMENTACAO_MEMORIA', '0') == '1'
+app.config['INSTRUMENTACAO_LENTA_MS'] = int(os.getenv('INSTRUMENTACAO_LENTA_MS', '1000'))
+
+# Máximo de protocolos atualizados ou encaminhados de uma vez
+app.config['ATUALIZACAO_LOTE_MAX'] = int(os.getenv('ATUALIZACAO_LOTE_MAX', '500'))
+
+# Token exigido em /metrics (Authorization: Bearer <token>); sem ele a rota fica desativada
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# Diretório local onde cada processo publica as suas métricas para /metrics somar (ver metricas.py)
+app.config['METRICAS_DIR'] = os.getenv('METRICAS_DIR', os.path.join(app.instance_path, 'metricas'))
+if app.config['METRICS_TOKEN']:
+    metricas.configurar(app.config['METRICAS_DIR'])
 
 # --- Extensions Initialization ---
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
+storage = criar_storage(app.config)
+# Resultados das tarefas ficam separados dos anexos, para poderem ser apagados sem conferir referências
+storage_jobs = criar_storage({**app.config, 'ANEXOS_DIR': app.config['JOBS_DIR'], 'ANEXOS_S3_PREFIX': app.config['JOBS_S3_PREFIX']})
+cache = criar_cache(app.config)
+cache_pdf = CacheBinario(
+    app.config['PDF_CACHE_DIR'], app.config['PDF_CACHE_TTL'],
+    max_bytes=app.config['PDF_CACHE_MAX_MB'] * 1024 * 1024,
+    max_bytes_memoria=app.config['PDF_CACHE_MEMORIA_MB'] * 1024 * 1024,
+)
+# Os processos do pool já nascem com os módulos do PDF e do bcrypt importados (ver executor.py)
+executor_cpu = ExecutorLimitado(
+    app.config['EXECUTOR_PROCESSOS'], app.config['EXECUTOR_FILA'], app.config['EXECUTOR_TIMEOUT'],
+    preload=('pdf', 'senhas'),
+)
 
 # --- Flask-Login Configuration ---
 # 'login' is the function name of the route for the login page
@@ -35,15 +123,43 @@ login_manager.login_message_category = 'info'
 # --- Imports for Routes and Models ---
 from flask import render_template, url_for, flash, redirect, request
 from flask_login import login_user, current_user, logout_user, login_required
-from flask import send_file, Response, jsonify, make_response
+from flask import send_file, Response, jsonify, make_response, abort
 from werkzeug.utils import secure_filename
+import dataclasses
 import io
-from openpyxl import Workbook
-from sqlalchemy import func, cast, Date
-from datetime import datetime, timedelta
-from weasyprint import HTML, CSS
-from forms import LoginForm, RegistrationForm, ProtocoloForm, AnexoForm, AdminUserCreationForm, AdminListItemForm
-from models import Usuario, Protocolo, HistoricoProtocolo, Anexo, Lotacao, TipoRequerimento, Servidor, db
+import hashlib
+import hmac
+from sqlalchemy import func, text
+from datetime import datetime
+from forms import LoginForm, RegistrationForm, ProtocoloForm, AnexoForm, AdminUserCreationForm, AdminListItemForm, ImportarServidoresForm
+from models import Usuario, Protocolo, HistoricoProtocolo, Anexo, Lotacao, TipoRequerimento, Servidor, Job, db
+import busca
+import dashboard
+import exportacao
+from filtros import FiltroProtocolos
+import importacao_servidores
+import instrumentacao
+import jobs
+import loading
+import numeracao
+import pdf
+import senhas
+import tramitacao
+from paginacao import paginar_keyset
+
+# Ordem padrão das listagens: ano e sequencial decrescentes (id desempata)
+ORDEM_LISTAGEM = [Protocolo.ano, Protocolo.sequencial, Protocolo.id]
+
+@app.template_global()
+def url_pagina(cursor):
+    """URL da página atual com outro cursor, preservando os filtros da pesquisa."""
+    args = request.args.to_dict()
+    args.pop('page', None)
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+# Os links de exportação e PDF só enfileiram tarefas quando há um `flask worker` ativo
+app.add_template_global(jobs.worker_ativo)
 
 # --- Routes ---
 @app.route("/")
@@ -60,7 +176,7 @@ def register():
         return redirect(url_for('home'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.senha.data).decode('utf-8')
+        hashed_password = senhas.gerar_hash(form.senha.data)
         # Por padrão, o primeiro usuário é admin, os outros são 'user'
         # Uma lógica mais robusta seria necessária para um sistema real
         tipo = 'admin' if Usuario.query.count() == 0 else 'user'
@@ -73,6 +189,7 @@ def register():
         )
         db.session.add(user)
         db.session.commit()
+        cache.invalidar('usuarios')
         flash(f'Sua conta foi criada, {form.nome_completo.data}! Agora você pode fazer login.', 'success')
         return redirect(url_for('login'))
     return render_template('register.html', title='Registrar', form=form)
@@ -85,7 +202,7 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = Usuario.query.filter_by(login=form.login.data).first()
-        if user and bcrypt.check_password_hash(user.senha, form.senha.data):
+        if user and senhas.conferir(user.senha, form.senha.data):
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             flash('Login bem-sucedido!', 'success')
@@ -104,10 +221,9 @@ def logout():
 @app.route("/meus_protocolos")
 @login_required
 def meus_protocolos():
-    page = request.args.get('page', 1, type=int)
-    protocolos = Protocolo.query.filter_by(responsavel=current_user.login)\
-        .order_by(Protocolo.id.desc())\
-        .paginate(page=page, per_page=10)
+    filtro = dataclasses.replace(filtro_da_requisicao(), responsavel=current_user.login)
+    query = filtro.aplicar(Protocolo.query.options(*loading.LISTAGEM))
+    protocolos = paginar_keyset(query, [Protocolo.id], cursor=request.args.get('cursor'), com_total=True)
     return render_template('protocolos.html', protocolos=protocolos, title="Meus Protocolos")
 
 from functools import wraps
@@ -124,19 +240,9 @@ def admin_required(f):
 @app.route("/relatorios")
 @login_required
 def relatorios():
-    # This route essentially does the same as listar_protocolos but renders a different template
-    # to match the original app's structure.
-    page = request.args.get('page', 1, type=int)
-    query = Protocolo.query
-    # ... (filter logic is identical to listar_protocolos) ...
-    if request.args.get('numero'):
-        query = query.filter(Protocolo.numero.ilike(f"%{request.args.get('numero')}%"))
-    if request.args.get('nome'):
-        query = query.filter(Protocolo.nome.ilike(f"%{request.args.get('nome')}%"))
-    if request.args.get('status'):
-        query = query.filter(Protocolo.status == request.args.get('status'))
-    # Add other filters as needed
-    protocolos = query.order_by(Protocolo.id.desc()).paginate(page=page, per_page=10)
+    # A mesma listagem de listar_protocolos, com o template de relatórios
+    query = filtro_da_requisicao().aplicar(Protocolo.query.options(*loading.LISTAGEM))
+    protocolos = paginar_keyset(query, ORDEM_LISTAGEM, cursor=request.args.get('cursor'), com_total=True)
     return render_template('relatorios.html', protocolos=protocolos, title="Relatórios")
 
 # --- Rotas de Configuração (Admin) ---
@@ -159,7 +265,8 @@ def configuracoes():
 
     return render_template('configuracoes.html', title="Configurações",
                            users=users, lotacoes=lotacoes, tipos=tipos,
-                           user_form=user_form, lotacao_form=lotacao_form, tipo_form=tipo_form)
+                           user_form=user_form, lotacao_form=lotacao_form, tipo_form=tipo_form,
+                           servidores_form=ImportarServidoresForm())
 
 @app.route("/admin/usuarios/novo", methods=['POST'])
 @login_required
@@ -167,7 +274,7 @@ def configuracoes():
 def admin_create_user():
     form = AdminUserCreationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.senha.data).decode('utf-8')
+        hashed_password = senhas.gerar_hash(form.senha.data)
         user = Usuario(
             nome_completo=form.nome_completo.data,
             login=form.login.data,
@@ -179,6 +286,7 @@ def admin_create_user():
         )
         db.session.add(user)
         db.session.commit()
+        cache.invalidar('usuarios')
         flash('Usuário criado com sucesso!', 'success')
     else:
         flash('Erro ao criar usuário. Verifique os dados.', 'danger')
@@ -200,6 +308,7 @@ def admin_create_list_item(item_type):
             new_item = Model(nome=form.nome.data, ativo=True)
             db.session.add(new_item)
             db.session.commit()
+            cache.invalidar(Model.__tablename__)
             flash(f'{item_type.capitalize()} adicionado com sucesso!', 'success')
     else:
         flash('Erro ao adicionar item.', 'danger')
@@ -219,103 +328,154 @@ def admin_toggle_item_status(item_type, item_id):
         item = Model.query.get_or_404(item_id)
         item.ativo = not item.ativo
         db.session.commit()
+        cache.invalidar(Model.__tablename__)
         flash(f'Status do item alterado com sucesso!', 'success')
     return redirect(url_for('configuracoes'))
 
+@app.route("/admin/servidores/importar", methods=['POST'])
+@login_required
+@admin_required
+def admin_importar_servidores():
+    form = ImportarServidoresForm()
+    if not form.validate_on_submit():
+        for erros in form.errors.values():
+            flash(erros[0], 'danger')
+        return redirect(url_for('configuracoes'))
+
+    arquivo = form.arquivo.data
+    try:
+        resultado = importacao_servidores.importar(
+            arquivo.stream, arquivo.filename, remover_ausentes=not form.manter_ausentes.data
+        )
+    except importacao_servidores.ArquivoInvalido as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('configuracoes'))
+    except Exception as e:
+        app.logger.exception('Erro ao importar servidores')
+        flash(f'Erro ao importar servidores: {e}', 'danger')
+        return redirect(url_for('configuracoes'))
+
+    # Os outros workers percebem a mudança na próxima verificação do índice
+    indice_servidores.expirar()
+    flash(
+        f"Servidores importados: {resultado['inseridos']} novos, {resultado['atualizados']} atualizados, "
+        f"{resultado['removidos']} removidos ({resultado['lidos']} linhas lidas, {resultado['ignorados']} sem matrícula).",
+        'success'
+    )
+    return redirect(url_for('configuracoes'))
+
 # --- Rota de Geração de PDF ---
 
 @app.route('/protocolo/<int:protocolo_id>/pdf')
 @login_required
 def gerar_pdf_protocolo(protocolo_id):
-    protocolo = Protocolo.query.get_or_404(protocolo_id)
-
-    # Renderiza um template HTML com os dados do protocolo
-    # Este template é feito especificamente para ser convertido em PDF
-    rendered_html = render_template('pdf_template.html', protocolo=protocolo)
-
-    # Gera o PDF a partir do HTML renderizado
-    pdf_bytes = HTML(string=rendered_html, base_url=request.base_url).write_pdf()
+    protocolo = Protocolo.query.options(*loading.COMPLETO).get_or_404(protocolo_id)
+    pdf_bytes, digest = pdf.gerar(protocolo)
 
     # Cria a resposta HTTP com o PDF
     response = make_response(pdf_bytes)
     response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'inline; filename=protocolo_{protocolo.numero.replace("/", "-")}.pdf'
+    response.headers['Content-Disposition'] = f'inline; filename={pdf.nome_arquivo(protocolo)}'
+    response.set_etag(digest)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def protocolos_para_lote(ids, filtro, limite=None):
+    """Protocolos de um PDF em lote: os ``ids`` na ordem dada ou, sem ids, os que atendem ``filtro``.
+
+    ``ValueError`` se passarem de ``limite`` (padrão: PDF_LOTE_MAX).
+    """
+    query = Protocolo.query.options(*loading.COMPLETO)
+    if ids:
+        query = query.filter(Protocolo.id.in_(ids))
+    else:
+        query = filtro.aplicar(query).order_by(*ORDEM_LISTAGEM)
+    limite = limite or app.config['PDF_LOTE_MAX']
+    protocolos = query.limit(limite + 1).all()
+    if len(protocolos) > limite:
+        raise ValueError(f'O lote excede o limite de {limite} protocolos; refine os filtros.')
+    if ids:
+        por_id = {p.id: p for p in protocolos}
+        protocolos = [por_id[i] for i in ids if i in por_id]
+    return protocolos
+
+def ids_do_lote(args):
+    """Lê ``ids=1,2,3`` da query string."""
+    try:
+        return [int(i) for i in args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        abort(400)
 
+@app.route('/protocolos/pdf')
+@login_required
+def gerar_pdf_lote():
+    """Um único PDF com vários protocolos (``ids`` ou os filtros da listagem), até PDF_LOTE_SINCRONO_MAX."""
+    try:
+        protocolos = protocolos_para_lote(
+            ids_do_lote(request.args), filtro_da_requisicao(), app.config['PDF_LOTE_SINCRONO_MAX']
+        )
+    except ValueError as e:
+        # Lotes maiores não cabem no timeout da requisição: são gerados pela fila de tarefas
+        return jsonify({'error': f'{e} Para lotes maiores, gere o PDF em segundo plano.',
+                        'jobUrl': url_for('enfileirar_pdf_lote', **request.args)}), 400
+    if not protocolos:
+        abort(404)
+    response = make_response(pdf.gerar_lote(protocolos))
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = 'inline; filename=protocolos.pdf'
     return response
 
 # --- Rotas de Protocolo ---
 
+def filtro_da_requisicao():
+    """Filtros de pesquisa da query string (ver filtros.py); parâmetros inválidos respondem 400."""
+    try:
+        return FiltroProtocolos.de_args(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+
 @app.route("/protocolos")
 @login_required
 def listar_protocolos():
-    page = request.args.get('page', 1, type=int)
-    query = Protocolo.query
-
-    # Get filter args
-    numero = request.args.get('numero')
-    nome = request.args.get('nome')
-    status = request.args.get('status')
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
-    tipo = request.args.get('tipo')
-
-    # Apply filters
-    if numero:
-        query = query.filter(Protocolo.numero.ilike(f'%{numero}%'))
-    if nome:
-        query = query.filter(Protocolo.nome.ilike(f'%{nome}%'))
-    if status:
-        query = query.filter(Protocolo.status == status)
-    if data_inicio:
-        query = query.filter(Protocolo.data_solicitacao >= data_inicio)
-    if data_fim:
-        query = query.filter(Protocolo.data_solicitacao <= data_fim)
-    if tipo:
-        query = query.filter(Protocolo.tipo_requerimento.ilike(f'%{tipo}%'))
+    query = filtro_da_requisicao().aplicar(Protocolo.query.options(*loading.LISTAGEM))
 
     # Ordena por ano (descendente) e depois pelo número do protocolo (descendente)
-    protocolos = query.order_by(
-        func.substr(Protocolo.numero, 6, 4).desc(),
-        func.substr(Protocolo.numero, 1, 4).desc()
-    ).paginate(page=page, per_page=10)
-
-    return render_template('protocolos.html', protocolos=protocolos, title="Todos os Protocolos")
-
-def gerar_proximo_numero_protocolo():
-    """Gera o próximo número de protocolo no formato NNNN/ANO."""
-    now = datetime.now()
-    current_year = now.year
-
-    # Busca todos os protocolos do ano corrente para encontrar o maior sequencial
-    protocolos_do_ano = Protocolo.query.filter(
-        Protocolo.numero.like(f'%/{current_year}')
-    ).all()
-
-    if not protocolos_do_ano:
-        # Se não houver nenhum protocolo no ano, começa do 1
-        novo_sequencial = 1
-    else:
-        # Extrai e encontra o maior número sequencial
-        maior_sequencial = 0
-        for p in protocolos_do_ano:
-            try:
-                sequencial_atual = int(p.numero.split('/')[0])
-                if sequencial_atual > maior_sequencial:
-                    maior_sequencial = sequencial_atual
-            except (ValueError, IndexError):
-                # Ignora números de protocolo em formato inesperado
-                continue
-        novo_sequencial = maior_sequencial + 1
-
-    # Formata o novo número com 4 dígitos, preenchendo com zeros à esquerda
-    return f'{str(novo_sequencial).zfill(4)}/{current_year}'
+    protocolos = paginar_keyset(query, ORDEM_LISTAGEM, cursor=request.args.get('cursor'), com_total=True)
+
+    return render_template('protocolos.html', protocolos=protocolos, title="Todos os Protocolos",
+                           api_url=url_for('api_listar_protocolos'))
+
+@app.route("/api/protocolos")
+@login_required
+def api_listar_protocolos():
+    """Página de protocolos em JSON, com os mesmos filtros e cursores da listagem."""
+    query = filtro_da_requisicao().aplicar(Protocolo.query.options(*loading.LISTAGEM))
+    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    pagina = paginar_keyset(query, ORDEM_LISTAGEM, cursor=request.args.get('cursor'), per_page=per_page,
+                            com_total=request.args.get('total') == '1')
+    return jsonify({
+        'itens': [{
+            'id': p.id,
+            'numero': p.numero,
+            'nome': p.nome,
+            'tipo_requerimento': p.tipo_requerimento,
+            'data_solicitacao': p.data_solicitacao.isoformat() if p.data_solicitacao else None,
+            'status': p.status,
+            'responsavel': p.responsavel,
+        } for p in pagina.items],
+        'anterior': pagina.prev_cursor,
+        'proximo': pagina.next_cursor,
+        'totalAproximado': pagina.total_aproximado,
+    })
 
 @app.route("/protocolo/novo", methods=['GET', 'POST'])
 @login_required
 def criar_protocolo():
     if request.method == 'POST':
-        # Dados são pegos diretamente do 'name' dos inputs do formulário
-        novo_numero = request.form.get('numero') or gerar_proximo_numero_protocolo()
+        # O número exibido no formulário é só uma prévia; o definitivo é
+        # reservado aqui, na mesma transação que grava o protocolo.
+        novo_numero = numeracao.proximo_numero()
 
         # Converte a data de string para objeto date
         data_solicitacao_str = request.form.get('data_solicitacao')
@@ -342,17 +502,13 @@ def criar_protocolo():
             responsavel=current_user.login,
             status='PROTOCOLO GERADO' # Status padrão como no sistema antigo
         )
-        db.session.add(protocolo)
-        db.session.commit()
-
-        # Adiciona o primeiro registro ao histórico
-        historico = HistoricoProtocolo(
-            protocolo_id=protocolo.id,
+        # Primeiro registro do histórico, gravado no mesmo commit que o protocolo
+        protocolo.historico.append(HistoricoProtocolo(
             status=protocolo.status,
             responsavel=protocolo.responsavel,
             observacao='Protocolo criado no sistema.'
-        )
-        db.session.add(historico)
+        ))
+        db.session.add(protocolo)
         db.session.commit()
 
         flash(f'Protocolo {novo_numero} criado com sucesso!', 'success')
@@ -365,14 +521,14 @@ def criar_protocolo():
 @app.route("/protocolo/<int:protocolo_id>")
 @login_required
 def detalhe_protocolo(protocolo_id):
-    protocolo = Protocolo.query.get_or_404(protocolo_id)
+    protocolo = Protocolo.query.options(*loading.DETALHE).get_or_404(protocolo_id)
     anexo_form = AnexoForm()
     return render_template('protocolo_detalhe.html', title=f"Protocolo {protocolo.numero}", protocolo=protocolo, anexo_form=anexo_form)
 
 @app.route("/protocolo/<int:protocolo_id>/editar", methods=['GET', 'POST'])
 @login_required
 def editar_protocolo(protocolo_id):
-    protocolo = Protocolo.query.get_or_404(protocolo_id)
+    protocolo = Protocolo.query.options(*loading.COMPLETO).get_or_404(protocolo_id)
 
     if request.method == 'POST':
         # Manual update from form data
@@ -419,9 +575,12 @@ def editar_protocolo(protocolo_id):
 @login_required
 def deletar_protocolo(protocolo_id):
     protocolo = Protocolo.query.get_or_404(protocolo_id)
+    anexos = list(protocolo.anexos)
     # Adicionar verificação de permissão aqui
     db.session.delete(protocolo)
     db.session.commit()
+    for anexo in anexos:
+        remover_blob_se_orfao(anexo)
     flash('Protocolo excluído com sucesso.', 'success')
     return redirect(url_for('listar_protocolos'))
 
@@ -435,15 +594,16 @@ def adicionar_anexo(protocolo_id):
     if form.validate_on_submit():
         file = form.anexo.data
         filename = secure_filename(file.filename)
-        file_data = file.read()
+        # Copia em blocos para o storage, calculando tamanho e hash no caminho
+        chave, tamanho, digest = guardar_conteudo(file.stream)
 
         novo_anexo = Anexo(
             protocolo_id=protocolo.id,
             file_name=filename,
-            storage_path=f"{protocolo.id}/{filename}", # Manter um caminho lógico
-            file_size=len(file_data),
-            mime_type=file.mimetype,
-            file_data=file_data
+            storage_path=chave,
+            sha256=digest,
+            file_size=tamanho,
+            mime_type=file.mimetype
         )
         db.session.add(novo_anexo)
         db.session.commit()
@@ -455,16 +615,84 @@ def adicionar_anexo(protocolo_id):
 
     return redirect(url_for('detalhe_protocolo', protocolo_id=protocolo_id))
 
+def abrir_conteudo_anexo(anexo):
+    """Abre o conteúdo do anexo para leitura em streaming, sem carregá-lo inteiro."""
+    if anexo.sha256 is not None:
+        return storage.open(anexo.storage_path)
+
+    # Anexo legado, ainda gravado no banco: lê o BYTEA em blocos com substr(),
+    # usando uma conexão própria que continua aberta durante o envio da resposta.
+    conexao = db.engine.connect()
+
+    def ler_bloco(posicao, tamanho):
+        return conexao.execute(
+            db.select(func.substr(Anexo.file_data, posicao + 1, tamanho)).where(Anexo.id == anexo.id)
+        ).scalar()
+
+    leitor = LeitorEmBlocos(ler_bloco, anexo.file_size, ao_fechar=conexao.close)
+    return io.BufferedReader(leitor, buffer_size=CHUNK_SIZE)
+
+@app.errorhandler(413)
+def arquivo_muito_grande(e):
+    flash('O arquivo enviado excede o tamanho máximo permitido.', 'danger')
+    return redirect(request.referrer or url_for('home'))
+
 @app.route("/anexo/<int:anexo_id>/download")
 @login_required
 def baixar_anexo(anexo_id):
     anexo = Anexo.query.get_or_404(anexo_id)
-    return send_file(
-        io.BytesIO(anexo.file_data),
+    arquivo = abrir_conteudo_anexo(anexo)
+    response = send_file(
+        arquivo,
         mimetype=anexo.mime_type,
         as_attachment=True,
         download_name=anexo.file_name
     )
+    # Tamanho, ETag e data conhecidos permitem Range (retomada) e respostas 304
+    response.content_length = anexo.file_size
+    response.set_etag(anexo.sha256 or f'anexo-{anexo.id}-{anexo.file_size}')
+    if anexo.created_at:
+        response.last_modified = anexo.created_at
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    response = response.make_conditional(request, accept_ranges=True, complete_length=anexo.file_size)
+    if response.status_code in (304, 412):
+        arquivo.close()
+    return response
+
+def travar_conteudo(digest):
+    """Lock do conteúdo ``digest`` até o fim da transação (PostgreSQL).
+
+    Serializa a gravação de anexos com a remoção de blobs órfãos do mesmo
+    hash: a remoção confere as referências e apaga segurando o lock, e a
+    gravação só confia no arquivo depois de obtê-lo, registrando o anexo
+    antes de soltá-lo (no commit).
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_advisory_xact_lock(hashtextextended(:digest, 0))'), {'digest': digest})
+
+def guardar_conteudo(stream):
+    """``storage.save`` seguido do lock do conteúdo; o chamador faz commit do anexo que o referencia."""
+    inicio = stream.tell()
+    chave, tamanho, digest = storage.save(stream)
+    travar_conteudo(digest)
+    if not storage.exists(chave):
+        # Uma remoção de órfão apagou o blob entre o save e o lock: grava de novo
+        stream.seek(inicio)
+        chave, tamanho, digest = storage.save(stream)
+    return chave, tamanho, digest
+
+def remover_blob_se_orfao(anexo):
+    """Apaga o arquivo do storage se nenhum outro anexo aponta para ele."""
+    if anexo.sha256 is None:
+        return
+    travar_conteudo(anexo.sha256)
+    em_uso = db.session.query(Anexo.id).filter(Anexo.sha256 == anexo.sha256).first()
+    if not em_uso:
+        storage.delete(anexo.storage_path)
+    # Solta o lock do conteúdo
+    db.session.commit()
 
 @app.route("/anexo/<int:anexo_id>/deletar", methods=['POST'])
 @login_required
@@ -474,6 +702,7 @@ def deletar_anexo(anexo_id):
     # Adicionar verificação de permissão aqui
     db.session.delete(anexo)
     db.session.commit()
+    remover_blob_se_orfao(anexo)
     flash('Anexo excluído com sucesso.', 'success')
     return redirect(url_for('detalhe_protocolo', protocolo_id=protocolo_id))
 
@@ -488,181 +717,273 @@ def atualizar_protocolo_status():
 
     if not protocolo_id or not novo_status:
         return jsonify({'sucesso': False, 'mensagem': 'Dados insuficientes.'}), 400
+    try:
+        protocolo_id = int(protocolo_id)
+    except (TypeError, ValueError):
+        abort(404)
 
-    protocolo = Protocolo.query.get_or_404(protocolo_id)
+    try:
+        resultado = tramitacao.atualizar_status(
+            [protocolo_id], novo_status, current_user.login, novo_responsavel, observacao
+        )[protocolo_id]
+        if resultado['sucesso']:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'sucesso': False, 'mensagem': str(e)}), 500
 
-    # Atualiza o protocolo
-    protocolo.status = novo_status
-    if novo_responsavel:
-        protocolo.responsavel = novo_responsavel
-
-    # Adiciona registro ao histórico
-    historico = HistoricoProtocolo(
-        protocolo_id=protocolo.id,
-        status=novo_status,
-        responsavel=current_user.login, # Quem fez a ação
-        observacao=observacao
-    )
-    db.session.add(historico)
+    if not resultado['sucesso']:
+        db.session.rollback()
+        abort(404)
+    return jsonify({'sucesso': True, 'mensagem': 'Protocolo atualizado com sucesso.'})
 
+@app.route("/protocolos/atualizar/lote", methods=['POST'])
+@login_required
+def atualizar_protocolos_em_lote():
+    """Atualiza o status (ou encaminha) vários protocolos em uma única transação."""
+    data = request.get_json(silent=True) or {}
+    novo_status = data.get('novoStatus')
     try:
+        ids = [int(protocolo_id) for protocolo_id in data.get('protocoloIds') or []]
+    except (TypeError, ValueError):
+        return jsonify({'sucesso': False, 'mensagem': 'Ids de protocolo inválidos.'}), 400
+
+    if not ids or not novo_status:
+        return jsonify({'sucesso': False, 'mensagem': 'Dados insuficientes.'}), 400
+    if len(ids) > app.config['ATUALIZACAO_LOTE_MAX']:
+        return jsonify({'sucesso': False, 'mensagem': f"Selecione no máximo {app.config['ATUALIZACAO_LOTE_MAX']} protocolos."}), 400
+
+    try:
+        resultados = tramitacao.atualizar_status(
+            ids, novo_status, current_user.login, data.get('novoResponsavel'), data.get('observacao')
+        )
         db.session.commit()
-        return jsonify({'sucesso': True, 'mensagem': 'Protocolo atualizado com sucesso.'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'sucesso': False, 'mensagem': str(e)}), 500
 
+    return jsonify({
+        'sucesso': True,
+        'atualizados': sum(1 for r in resultados.values() if r['sucesso']),
+        'resultados': [{'id': protocolo_id, **resultado} for protocolo_id, resultado in resultados.items()],
+    })
+
 # --- Rota de Backup ---
 
-@app.route('/protocolos/backup/excel')
-@login_required
-def backup_excel():
-    """Gera um arquivo Excel com todos os protocolos, aplicando os filtros ativos."""
-    query = Protocolo.query
-
-    # Re-aplica a mesma lógica de filtro da listagem
-    if request.args.get('numero'):
-        query = query.filter(Protocolo.numero.ilike(f"%{request.args.get('numero')}%"))
-    if request.args.get('nome'):
-        query = query.filter(Protocolo.nome.ilike(f"%{request.args.get('nome')}%"))
-    if request.args.get('status'):
-        query = query.filter(Protocolo.status == request.args.get('status'))
-    if request.args.get('data_inicio'):
-        query = query.filter(Protocolo.data_solicitacao >= request.args.get('data_inicio'))
-    if request.args.get('data_fim'):
-        query = query.filter(Protocolo.data_solicitacao <= request.args.get('data_fim'))
-    if request.args.get('tipo'):
-        query = query.filter(Protocolo.tipo_requerimento.ilike(f"%{request.args.get('tipo')}%"))
-
-    protocolos = query.order_by(Protocolo.id.asc()).all()
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = 'Backup Protocolos'
-
-    headers = [
-        'Número', 'Matrícula', 'Nome', 'Endereço', 'Município', 'Bairro', 'CEP',
-        'Telefone', 'CPF', 'RG', 'Cargo', 'Lotação', 'Unidade', 'Tipo de Requerimento',
-        'Requer ao', 'Data Solicitação', 'Observações', 'Status', 'Responsável'
-    ]
-    sheet.append(headers)
-
-    for p in protocolos:
-        row = [
-            p.numero, p.matricula, p.nome, p.endereco, p.municipio, p.bairro, p.cep,
-            p.telefone, p.cpf, p.rg, p.cargo, p.lotacao, p.unidade_exercicio,
-            p.tipo_requerimento, p.requer_ao,
-            p.data_solicitacao.strftime('%Y-%m-%d') if p.data_solicitacao else '',
-            p.observacoes, p.status, p.responsavel
-        ]
-        sheet.append(row)
-
-    virtual_workbook = io.BytesIO()
-    workbook.save(virtual_workbook)
-    virtual_workbook.seek(0)
+@app.route('/protocolos/backup/excel', defaults={'formato': 'xlsx'})
+@app.route('/protocolos/backup/<path:formato>')
+@login_required
+def backup_protocolos(formato):
+    """Exporta os protocolos (xlsx, csv ou csv.gz), aplicando os filtros ativos."""
+    if formato not in exportacao.FORMATOS:
+        abort(404)
+
+    # Os mesmos filtros da listagem
+    filtros = filtro_da_requisicao().condicoes()
 
+    mimetype, nome_arquivo = exportacao.FORMATOS[formato]
     return send_file(
-        virtual_workbook,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        exportacao.exportar(filtros, formato),
+        mimetype=mimetype,
         as_attachment=True,
-        download_name='backup_protocolos.xlsx'
+        download_name=nome_arquivo
+    )
+
+# --- Tarefas em segundo plano (executadas por `flask worker`, ver jobs.py) ---
+
+@jobs.tarefa('exportacao')
+def tarefa_exportacao(parametros):
+    formato = parametros['formato']
+    mimetype, nome_arquivo = exportacao.FORMATOS[formato]
+    filtros = FiltroProtocolos.de_args(parametros.get('filtros', {})).condicoes()
+    return exportacao.exportar(filtros, formato), nome_arquivo, mimetype
+
+@jobs.tarefa('pdf')
+def tarefa_pdf(parametros):
+    protocolo = Protocolo.query.options(*loading.COMPLETO).get(parametros['protocolo_id'])
+    if protocolo is None:
+        raise ValueError('Protocolo não encontrado.')
+    # render_template e url_for precisam de uma requisição
+    with app.test_request_context():
+        pdf_bytes, _ = pdf.gerar(protocolo)
+    return io.BytesIO(pdf_bytes), pdf.nome_arquivo(protocolo), 'application/pdf'
+
+@jobs.tarefa('pdf_lote')
+def tarefa_pdf_lote(parametros):
+    protocolos = protocolos_para_lote(
+        parametros.get('ids'), FiltroProtocolos.de_args(parametros.get('filtros', {}))
+    )
+    if not protocolos:
+        raise ValueError('Nenhum protocolo encontrado para os filtros informados.')
+    with app.test_request_context():
+        pdf_bytes = pdf.gerar_lote(protocolos)
+    return io.BytesIO(pdf_bytes), 'protocolos.pdf', 'application/pdf'
+
+def job_json(job):
+    dados = {
+        'id': job.id,
+        'tipo': job.tipo,
+        'status': job.status,
+        'erro': job.erro,
+        'statusUrl': url_for('status_job', job_id=job.id),
+    }
+    if job.status == jobs.CONCLUIDO:
+        dados['downloadUrl'] = url_for('baixar_job', job_id=job.id)
+        dados['nomeArquivo'] = job.resultado_nome
+    return dados
+
+def obter_job_do_usuario(job_id):
+    job = db.get_or_404(Job, job_id)
+    if job.usuario_id != current_user.id and current_user.tipo != 'admin':
+        abort(404)
+    return job
+
+@app.route('/jobs/exportacao/<path:formato>', methods=['POST'])
+@login_required
+def enfileirar_exportacao(formato):
+    """Enfileira a exportação dos protocolos com os filtros da query string."""
+    if formato not in exportacao.FORMATOS:
+        abort(404)
+    filtros = filtro_da_requisicao().para_dict()
+    job = jobs.enfileirar('exportacao', {'formato': formato, 'filtros': filtros}, current_user.id)
+    return jsonify(job_json(job)), 202
+
+@app.route('/jobs/protocolo/<int:protocolo_id>/pdf', methods=['POST'])
+@login_required
+def enfileirar_pdf(protocolo_id):
+    db.get_or_404(Protocolo, protocolo_id)
+    job = jobs.enfileirar('pdf', {'protocolo_id': protocolo_id}, current_user.id)
+    return jsonify(job_json(job)), 202
+
+@app.route('/jobs/protocolos/pdf', methods=['POST'])
+@login_required
+def enfileirar_pdf_lote():
+    """Enfileira um PDF com vários protocolos (``ids`` ou os filtros da listagem)."""
+    ids = ids_do_lote(request.args)
+    filtros = filtro_da_requisicao().para_dict()
+    job = jobs.enfileirar('pdf_lote', {'ids': ids, 'filtros': filtros}, current_user.id)
+    return jsonify(job_json(job)), 202
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def status_job(job_id):
+    return jsonify(job_json(obter_job_do_usuario(job_id)))
+
+@app.route('/jobs/<int:job_id>/download')
+@login_required
+def baixar_job(job_id):
+    job = obter_job_do_usuario(job_id)
+    if job.status != jobs.CONCLUIDO:
+        abort(404)
+    return send_file(
+        storage_jobs.open(job.resultado_chave),
+        mimetype=job.resultado_mime,
+        as_attachment=True,
+        download_name=job.resultado_nome
     )
 
 # --- API Routes for Dynamic Data ---
 
+def resposta_json_cacheada(namespace, carregar, chave=''):
+    """Resposta JSON servida do cache versionado, com ETag forte para permitir 304."""
+    def serializar():
+        corpo = app.json.dumps(carregar())
+        return {'corpo': corpo, 'etag': hashlib.sha256(corpo.encode('utf-8')).hexdigest()}
+
+    entrada = cache.obter(namespace, chave, serializar)
+    response = app.response_class(entrada['corpo'], mimetype='application/json')
+    response.set_etag(entrada['etag'])
+    # O navegador sempre revalida, mas recebe 304 enquanto a versão não mudar
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/api/usuarios')
 @login_required
 def get_usuarios():
     """Retorna uma lista de usuários ativos para preencher selects."""
     try:
-        usuarios = Usuario.query.filter_by(status='ativo').all()
         # Retornando apenas os campos necessários para evitar expor dados sensíveis
-        usuarios_list = [{'id': u.id, 'login': u.login, 'nome': u.nome} for u in usuarios]
-        return jsonify(usuarios_list)
+        return resposta_json_cacheada('usuarios', lambda: [
+            {'id': u.id, 'login': u.login, 'nome': u.nome}
+            for u in Usuario.query.filter_by(status='ativo').all()
+        ])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+COLUNAS_SERVIDOR = (Servidor.matricula, Servidor.nome, Servidor.lotacao, Servidor.cargo, Servidor.unidade_de_exercicio)
+
+def _carregar_servidores():
+    return db.session.query(*COLUNAS_SERVIDOR).execution_options(yield_per=5000).all()
+
+def _assinatura_servidores():
+    # Muda com inserções/remoções e com a invalidação explícita do namespace 'servidores'
+    total, maior_id = db.session.query(func.count(Servidor.id), func.max(Servidor.id)).one()
+    return cache.backend.versao('servidores'), total, maior_id
+
+indice_servidores = IndiceAtualizavel(_carregar_servidores, _assinatura_servidores)
+
 @app.route('/api/servidor/<string:matricula>')
 @login_required
 def get_servidor(matricula):
-    servidor = Servidor.query.filter_by(matricula=matricula).first()
+    servidor = db.session.query(*COLUNAS_SERVIDOR).filter(Servidor.matricula == matricula).first()
     if servidor:
-        return jsonify({
-            'matricula': servidor.matricula,
-            'nome': servidor.nome,
-            'lotacao': servidor.lotacao,
-            'cargo': servidor.cargo,
-            'unidade_de_exercicio': servidor.unidade_de_exercicio
-        })
+        return jsonify(dict(servidor._mapping))
     return jsonify({'error': 'Servidor não encontrado'}), 404
 
 @app.route('/api/servidores/search')
 @login_required
 def search_servidores():
-    query_nome = request.args.get('nome', '')
-    if len(query_nome) < 3:
-        return jsonify({'error': 'A busca requer ao menos 3 caracteres'}), 400
-
-    servidores = Servidor.query.filter(Servidor.nome.ilike(f'%{query_nome}%')).limit(10).all()
-    return jsonify([{
-        'matricula': s.matricula,
-        'nome': s.nome,
-        'lotacao': s.lotacao,
-        'cargo': s.cargo,
-        'unidade_de_exercicio': s.unidade_de_exercicio
-    } for s in servidores])
+    query_nome = request.args.get('nome', '').strip()
+    if len(query_nome) < 2:
+        return jsonify({'error': 'A busca requer ao menos 2 caracteres'}), 400
+
+    servidores = indice_servidores.obter().buscar(query_nome, limite=10)
+    if not servidores:
+        # Trechos no meio das palavras: busca por trigramas no banco
+        servidores = db.session.query(*COLUNAS_SERVIDOR).filter(busca.contem(Servidor.nome, query_nome))\
+            .order_by(busca.relevancia(Servidor.nome, query_nome), Servidor.nome).limit(10).all()
+    return jsonify([dict(s._mapping) for s in servidores])
 
 @app.route('/api/lotacoes')
 @login_required
 def get_lotacoes():
-    lotacoes = Lotacao.query.filter_by(ativo=True).order_by(Lotacao.nome).all()
-    return jsonify([l.nome for l in lotacoes])
+    return resposta_json_cacheada('lotacoes', lambda: [
+        l.nome for l in Lotacao.query.filter_by(ativo=True).order_by(Lotacao.nome).all()
+    ])
 
 @app.route('/api/tipos_requerimento')
 @login_required
 def get_tipos_requerimento():
-    tipos = TipoRequerimento.query.filter_by(ativo=True).order_by(TipoRequerimento.nome).all()
-    return jsonify([t.nome for t in tipos])
+    return resposta_json_cacheada('tipos_requerimento', lambda: [
+        t.nome for t in TipoRequerimento.query.filter_by(ativo=True).order_by(TipoRequerimento.nome).all()
+    ])
+
+# Lista estática, ordenada uma única vez
+BAIRROS = sorted([
+    "Centro", "Girilândia", "Padre Assis Monteiro", "Hermógenes Henrique Girão",
+    "São José", "Nossa Senhora da Conceição", "Planalto Aeroporto", "Júlia Santiago",
+    "São Francisco", "Nova Morada", "Divino Espírito Santo", "Alto Tiradentes",
+    "Capitão Dionísio Matos de Fontes", "Irapuan Nobre", "Dois de Agosto",
+    "Cristo Rei", "Sede Rural", "Outro"
+])
 
 @app.route('/api/bairros')
 @login_required
 def get_bairros():
     """Retorna uma lista estática de bairros."""
-    bairros = [
-        "Centro", "Girilândia", "Padre Assis Monteiro", "Hermógenes Henrique Girão",
-        "São José", "Nossa Senhora da Conceição", "Planalto Aeroporto", "Júlia Santiago",
-        "São Francisco", "Nova Morada", "Divino Espírito Santo", "Alto Tiradentes",
-        "Capitão Dionísio Matos de Fontes", "Irapuan Nobre", "Dois de Agosto",
-        "Cristo Rei", "Sede Rural", "Outro"
-    ]
-    return jsonify(sorted(bairros))
+    return resposta_json_cacheada('bairros', lambda: BAIRROS)
 
 @app.route('/protocolos/ultimoNumero/<int:ano>')
 @login_required
 def get_ultimo_numero(ano):
     """Obtém o último número de protocolo para um determinado ano."""
-    protocolos_do_ano = Protocolo.query.filter(
-        Protocolo.numero.like(f'%/{ano}')
-    ).all()
-
-    if not protocolos_do_ano:
-        maior_sequencial = 0
-    else:
-        maior_sequencial = 0
-        for p in protocolos_do_ano:
-            try:
-                sequencial_atual = int(p.numero.split('/')[0])
-                if sequencial_atual > maior_sequencial:
-                    maior_sequencial = sequencial_atual
-            except (ValueError, IndexError):
-                continue
-
-    return jsonify({'ultimo': maior_sequencial})
+    return jsonify({'ultimo': numeracao.ultimo_sequencial(ano)})
 
 @app.route('/api/protocolo/<int:protocolo_id>')
 @login_required
 def get_protocolo_api(protocolo_id):
-    protocolo = Protocolo.query.get_or_404(protocolo_id)
+    protocolo = Protocolo.query.options(*loading.COMPLETO).get_or_404(protocolo_id)
     return jsonify({
         'id': protocolo.id,
         'numero': protocolo.numero,
@@ -690,98 +1011,15 @@ def get_protocolo_api(protocolo_id):
 @login_required
 def dashboard_stats():
     try:
-        # --- Filter Parsing ---
-        data_inicio_str = request.args.get('dataInicio')
-        data_fim_str = request.args.get('dataFim')
-        status = request.args.get('status')
-        tipo = request.args.get('tipo')
-        lotacao = request.args.get('lotacao')
-        evolucao_periodo = request.args.get('evolucaoPeriodo', '30d')
-        evolucao_agrupamento = request.args.get('evolucaoAgrupamento', 'day')
-
-        # --- Base Query Construction ---
-        base_query = Protocolo.query
-        if status:
-            base_query = base_query.filter(Protocolo.status == status)
-        if tipo:
-            base_query = base_query.filter(Protocolo.tipo_requerimento == tipo)
-        if lotacao:
-            base_query = base_query.filter(Protocolo.lotacao == lotacao)
-
-        # --- Period-Filtered Query ---
-        period_query = base_query
-        if data_inicio_str:
-            period_query = period_query.filter(Protocolo.data_solicitacao >= datetime.strptime(data_inicio_str, '%Y-%m-%d').date())
-        if data_fim_str:
-            period_query = period_query.filter(Protocolo.data_solicitacao <= datetime.strptime(data_fim_str, '%Y-%m-%d').date())
-
-        # --- Novos no Período (Card) ---
-        novos_query = base_query.filter(Protocolo.data_solicitacao != None)
-        if data_inicio_str:
-             novos_query = novos_query.filter(Protocolo.data_solicitacao >= datetime.strptime(data_inicio_str, '%Y-%m-%d').date())
-        else: # Default to last 7 days if no start date
-             novos_query = novos_query.filter(Protocolo.data_solicitacao >= (datetime.now().date() - timedelta(days=7)))
-        if data_fim_str:
-             novos_query = novos_query.filter(Protocolo.data_solicitacao <= datetime.strptime(data_fim_str, '%Y-%m-%d').date())
-
-        novos_no_periodo = novos_query.count()
-
-        # --- Pendentes Antigos (Card) ---
-        pendentes_antigos = db.session.query(func.count(Protocolo.id)).filter(
-            Protocolo.data_solicitacao != None,
-            Protocolo.data_solicitacao <= (datetime.now().date() - timedelta(days=15)),
-            ~Protocolo.status.in_(['Finalizado', 'Concluído'])
-        ).scalar()
-
-        # --- Finalizados no Período (Card) ---
-        total_finalizados = period_query.filter(Protocolo.status.in_(['Finalizado', 'Concluído'])).count()
-
-        # --- Top 5 Tipos (Bar Chart) ---
-        top_tipos = period_query.with_entities(
-            Protocolo.tipo_requerimento,
-            func.count(Protocolo.id).label('total')
-        ).filter(Protocolo.tipo_requerimento != None, Protocolo.tipo_requerimento != '').group_by(Protocolo.tipo_requerimento).order_by(func.count(Protocolo.id).desc()).limit(5).all()
-
-        # --- Data for Pie Chart (Status or Tipo) ---
-        todos_tipos = period_query.with_entities(
-            Protocolo.tipo_requerimento,
-            func.count(Protocolo.id).label('total')
-        ).filter(Protocolo.tipo_requerimento != None, Protocolo.tipo_requerimento != '').group_by(Protocolo.tipo_requerimento).order_by(func.count(Protocolo.id).desc()).all()
-
-        status_protocolos = period_query.with_entities(
-            Protocolo.status,
-            func.count(Protocolo.id).label('total')
-        ).filter(Protocolo.status != None, Protocolo.status != '').group_by(Protocolo.status).all()
-
-        # --- Evolução (Line Chart) ---
-        evolucao_query = base_query.filter(Protocolo.data_solicitacao != None)
-        today = datetime.now().date()
-        if evolucao_periodo == '7d':
-            evolucao_query = evolucao_query.filter(Protocolo.data_solicitacao >= (today - timedelta(days=7)))
-        elif evolucao_periodo == 'month':
-            evolucao_query = evolucao_query.filter(func.date_trunc('month', Protocolo.data_solicitacao) == func.date_trunc('month', today))
-        elif evolucao_periodo == 'all':
-             evolucao_query = evolucao_query.filter(Protocolo.data_solicitacao >= '2025-01-01')
-        else: # 30d default
-            evolucao_query = evolucao_query.filter(Protocolo.data_solicitacao >= (today - timedelta(days=30)))
-
-        group_by_logic = func.date_trunc('month', Protocolo.data_solicitacao) if evolucao_agrupamento == 'month' else cast(Protocolo.data_solicitacao, Date)
-
-        evolucao_protocolos = evolucao_query.with_entities(
-            group_by_logic.label('intervalo'),
-            func.count(Protocolo.id).label('total')
-        ).group_by('intervalo').order_by('intervalo').all()
-
-        # --- JSON Response Assembly ---
-        stats = {
-            'novosNoPeriodo': novos_no_periodo,
-            'pendentesAntigos': pendentes_antigos or 0,
-            'totalFinalizados': total_finalizados,
-            'topTipos': [{'tipo_requerimento': r.tipo_requerimento, 'total': r.total} for r in top_tipos],
-            'todosTipos': [{'tipo_requerimento': r.tipo_requerimento, 'total': r.total} for r in todos_tipos],
-            'statusProtocolos': [{'status': r.status, 'total': r.total} for r in status_protocolos],
-            'evolucaoProtocolos': [{'intervalo': r.intervalo.isoformat(), 'total': r.total} for r in evolucao_protocolos if r.intervalo is not None]
-        }
+        filtro = FiltroProtocolos.de_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        stats = dashboard.estatisticas_em_cache(
+            filtro,
+            evolucao_periodo=request.args.get('evolucaoPeriodo', '30d'),
+            evolucao_agrupamento=request.args.get('evolucaoAgrupamento', 'day'),
+        )
         return jsonify(stats)
 
     except Exception as e:
@@ -789,7 +1027,43 @@ def dashboard_stats():
         app.logger.error(f"ERROR in dashboard_stats: {e}\n{traceback.format_exc()}")
         return jsonify({'error': f'Ocorreu um erro no servidor ao buscar os dados do dashboard: {str(e)}'}), 500
 
+@app.errorhandler(Sobrecarregado)
+def servidor_ocupado(e):
+    response = make_response(str(e), 503)
+    response.headers['Retry-After'] = '2'
+    return response
+
+@metricas.coletor_por_processo
+def metricas_executor():
+    # Cada worker HTTP tem o próprio pool; /metrics soma os de todos
+    rotulos = {}
+    yield ('protocolo_executor_pendentes', 'gauge',
+           'Tarefas de CPU em execução ou aguardando no pool.', rotulos, executor_cpu.pendentes)
+    yield ('protocolo_executor_fila', 'gauge',
+           'Tarefas de CPU aguardando um processo livre.', rotulos, executor_cpu.em_fila)
+    yield ('protocolo_executor_concluidas_total', 'counter',
+           'Tarefas de CPU concluídas.', rotulos, executor_cpu.concluidas)
+    yield ('protocolo_executor_rejeitadas_total', 'counter',
+           'Tarefas de CPU recusadas por fila cheia.', rotulos, executor_cpu.rejeitadas)
+
+@app.after_request
+def publicar_metricas(response):
+    metricas.publicar_se_devido()
+    return response
+
+@app.route('/metrics')
+def metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(metricas.formatar(), mimetype='text/plain; version=0.0.4')
+
+import commands  # Registra os comandos de linha de comando (flask <comando>)
+
 if __name__ == '__main__':
     # The port must be available. Railway provides the PORT env var.
+    # Servidor de desenvolvimento; em produção use `gunicorn -c gunicorn.conf.py app:app`
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,118 @@
+"""Índice em memória para o autocompletar de servidores por nome.
+
+Cada palavra dos nomes (sem acentos, minúscula) entra em uma lista ordenada;
+a busca por prefixo é uma bisseção nessa lista, então o custo não cresce
+com o tamanho da tabela. O índice é reconstruído quando a tabela muda
+(versão do cache ou assinatura da tabela diferente).
+"""
+import bisect
+import sys
+import threading
+import time
+from array import array
+
+from busca import normalizar
+
+
+class IndiceServidores:
+    """Índice de prefixos sobre os nomes de uma lista de servidores.
+
+    ``registros`` são linhas com atributo ``nome`` (ex.: ``Row`` do SQLAlchemy).
+    """
+
+    def __init__(self, registros):
+        self.registros = registros
+        self.nomes = [normalizar(r.nome or '') for r in registros]
+
+        # Nome completo ordenado: os resultados que começam pelo termo vêm primeiro
+        ordem = sorted(range(len(registros)), key=self.nomes.__getitem__)
+        self._nomes_ordenados = [self.nomes[i] for i in ordem]
+        self._ordem = array('i', ordem)
+
+        # Palavras de todos os nomes, ordenadas, com o índice do registro correspondente
+        pares = sorted(
+            (sys.intern(palavra), i)
+            for i, nome in enumerate(self.nomes)
+            for palavra in set(nome.split())
+        )
+        self._palavras = [p for p, _ in pares]
+        self._registros_palavra = array('i', (i for _, i in pares))
+
+    def __len__(self):
+        return len(self.registros)
+
+    @staticmethod
+    def _faixa(lista, prefixo):
+        inicio = bisect.bisect_left(lista, prefixo)
+        fim = bisect.bisect_left(lista, prefixo + '￿')
+        return inicio, fim
+
+    def _com_palavra(self, prefixo):
+        inicio, fim = self._faixa(self._palavras, prefixo)
+        return set(self._registros_palavra[inicio:fim])
+
+    def buscar(self, termo, limite=10):
+        """Servidores cujo nome tem palavras começando por cada palavra de ``termo``."""
+        termo = normalizar(termo or '').strip()
+        palavras = termo.split()
+        if not palavras:
+            return []
+
+        resultados = []
+        vistos = set()
+
+        # 1) Nome completo começando pelo termo, já em ordem alfabética
+        inicio, fim = self._faixa(self._nomes_ordenados, termo)
+        for i in self._ordem[inicio:min(fim, inicio + limite)]:
+            resultados.append(i)
+            vistos.add(i)
+
+        # 2) Todas as palavras do termo como prefixo de alguma palavra do nome
+        if len(resultados) < limite:
+            conjuntos = sorted((self._com_palavra(p) for p in palavras), key=len)
+            candidatos = conjuntos[0].intersection(*conjuntos[1:]) - vistos
+            restantes = sorted(candidatos, key=self.nomes.__getitem__)
+            resultados.extend(restantes[:limite - len(resultados)])
+
+        return [self.registros[i] for i in resultados]
+
+
+class IndiceAtualizavel:
+    """Mantém um ``IndiceServidores`` e o reconstrói quando os dados mudam.
+
+    ``carregar()`` devolve a lista de registros e ``assinatura()`` um valor
+    barato que muda junto com a tabela; ela é consultada no máximo a cada
+    ``intervalo`` segundos. Enquanto um thread reconstrói, os demais seguem
+    usando o índice anterior.
+    """
+
+    def __init__(self, carregar, assinatura, intervalo=60):
+        self._carregar = carregar
+        self._assinatura = assinatura
+        self._intervalo = intervalo
+        self._indice = None
+        self._assinatura_atual = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self):
+        agora = time.monotonic()
+        if self._indice is not None and agora - self._verificado_em < self._intervalo:
+            return self._indice
+
+        if not self._lock.acquire(blocking=self._indice is None):
+            return self._indice
+        try:
+            if self._indice is None or time.monotonic() - self._verificado_em >= self._intervalo:
+                assinatura = self._assinatura()
+                if self._indice is None or assinatura != self._assinatura_atual:
+                    self._indice = IndiceServidores(self._carregar())
+                    self._assinatura_atual = assinatura
+                self._verificado_em = time.monotonic()
+            return self._indice
+        finally:
+            self._lock.release()
+
+    def expirar(self):
+        """Força a verificação da assinatura na próxima busca."""
+        self._verificado_em = 0.0
@@ -0,0 +1,48 @@
+"""Busca sem acentos em 500 mil protocolos e 50 mil servidores (índices de trigramas).
+
+Mede a listagem filtrada por nome e a busca de servidores (prefixo pelo
+índice em memória e trecho no meio do nome pelo índice de trigramas) e
+confere no plano que os filtros ``LIKE '%termo%'`` usam os índices GIN.
+As quantidades podem ser reduzidas com BENCH_PROTOCOLOS e BENCH_SERVIDORES.
+
+    python -m pytest bench/bench_busca.py -s
+"""
+import os
+
+import busca
+from filtros import FiltroProtocolos
+from medicao import analisar, cronometrar, indices, plano, semear_protocolos, semear_servidores, varreduras_sequenciais
+from models import Protocolo, Servidor
+
+PROTOCOLOS = int(os.getenv('BENCH_PROTOCOLOS', '500000'))
+SERVIDORES = int(os.getenv('BENCH_SERVIDORES', '50000'))
+
+
+def test_listagem_filtrada_por_nome(cliente, banco):
+    semear_protocolos(banco.session, PROTOCOLOS)
+    analisar(banco.session, 'protocolos')
+
+    for termo in ('conceicao', 'joao magalhaes', 'simoes falcao'):
+        consulta = banco.session.query(Protocolo.id).filter(*FiltroProtocolos(nome=termo).condicoes())
+        usados = indices(plano(banco.session, consulta))
+        mediana, resposta = cronometrar(lambda: cliente.get('/api/protocolos', query_string={'nome': termo}))
+        assert resposta.status_code == 200 and resposta.get_json()['itens']
+        print(f'\n/api/protocolos?nome={termo}: {mediana:.1f} ms ({PROTOCOLOS} protocolos; índices {sorted(usados)})')
+        assert 'protocolos' not in varreduras_sequenciais(plano(banco.session, consulta))
+        assert 'ix_protocolos_nome_trgm' in usados
+
+
+def test_busca_de_servidores(cliente, banco):
+    semear_servidores(banco.session, SERVIDORES)
+    analisar(banco.session, 'servidores')
+
+    mediana, resposta = cronometrar(lambda: cliente.get('/api/servidores/search', query_string={'nome': 'magal'}))
+    assert resposta.get_json()
+    print(f'\nservidores, prefixo (índice em memória): {mediana:.2f} ms ({SERVIDORES} servidores)')
+
+    termo = 'agalhae'  # no meio da palavra: vai ao banco
+    consulta = banco.session.query(Servidor.id).filter(busca.contem(Servidor.nome, termo))
+    mediana, resposta = cronometrar(lambda: cliente.get('/api/servidores/search', query_string={'nome': termo}))
+    assert resposta.get_json()
+    print(f'servidores, trecho (trigramas): {mediana:.1f} ms; índices {sorted(indices(plano(banco.session, consulta)))}')
+    assert 'ix_servidores_nome_trgm' in indices(plano(banco.session, consulta))
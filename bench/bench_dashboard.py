@@ -0,0 +1,70 @@
+"""Dashboard com 1 milhão de protocolos: comandos SQL e latência.
+
+As estatísticas saem do consolidado diário, então o custo depende dos dias,
+tipos, status e lotações distintos, não da quantidade de protocolos. Mede
+``dashboard.estatisticas`` (sem cache) com alguns filtros e a rota
+``/protocolos/dashboard-stats`` sem e com cache, e falha se o cálculo passar
+de uma consulta, ler ``protocolos`` ou passar de BENCH_DASHBOARD_MAX_MS.
+A quantidade pode ser reduzida com BENCH_PROTOCOLOS.
+
+    python -m pytest bench/bench_dashboard.py -s
+"""
+import os
+from datetime import date
+
+import pytest
+
+import dashboard
+from app import cache
+from filtros import FiltroProtocolos
+from medicao import analisar, cronometrar, semear_protocolos
+from models import ProtocoloStatsDiario
+
+PROTOCOLOS = int(os.getenv('BENCH_PROTOCOLOS', '1000000'))
+MAX_MS = float(os.getenv('BENCH_DASHBOARD_MAX_MS', '500'))
+HOJE = date(2025, 6, 30)
+
+FILTROS = {
+    'sem filtros': FiltroProtocolos(),
+    'tipo': FiltroProtocolos(tipo='tipo 1'),
+    'status e lotação': FiltroProtocolos(status='Em análise', lotacao='Lotação 7'),
+    'período': FiltroProtocolos(data_inicio=date(2024, 1, 1), data_fim=date(2024, 12, 31)),
+}
+
+
+@pytest.fixture
+def massa(banco):
+    semear_protocolos(banco.session, PROTOCOLOS)
+    analisar(banco.session, 'protocolos', 'protocolo_stats_diario')
+    return banco
+
+
+@pytest.mark.parametrize('nome', FILTROS)
+def test_estatisticas_sem_cache(massa, contador_sql, nome):
+    filtro = FILTROS[nome]
+    with contador_sql.medir() as medicao:
+        dashboard.estatisticas(filtro, 'all', 'month', hoje=HOJE)
+    comandos = list(medicao.comandos)
+
+    mediana, _ = cronometrar(lambda: dashboard.estatisticas(filtro, 'all', 'month', hoje=HOJE))
+    linhas = massa.session.query(ProtocoloStatsDiario).count()
+    print(f'\n{nome}: {len(comandos)} consulta(s), {mediana:.1f} ms '
+          f'({PROTOCOLOS} protocolos, {linhas} linhas no consolidado)')
+    assert len(comandos) == 1
+    assert 'FROM protocolos' not in comandos[0]
+    assert mediana < MAX_MS
+
+
+def test_rota_com_e_sem_cache(massa, cliente):
+    url = '/protocolos/dashboard-stats?evolucaoPeriodo=all&evolucaoAgrupamento=month'
+
+    def sem_cache():
+        cache.invalidar(dashboard.NAMESPACE_CACHE)
+        return cliente.get(url)
+
+    mediana_sem, resposta = cronometrar(sem_cache)
+    assert resposta.status_code == 200
+    mediana_com, resposta = cronometrar(lambda: cliente.get(url))
+    assert resposta.status_code == 200
+    print(f'\n/protocolos/dashboard-stats: {mediana_sem:.1f} ms sem cache, {mediana_com:.1f} ms com cache')
+    assert mediana_sem < MAX_MS
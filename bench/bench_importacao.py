@@ -0,0 +1,122 @@
+"""Importações em massa: extração do RH com 200 mil servidores e 100 mil protocolos.
+
+A primeira carga parte da tabela vazia; a segunda é a atualização típica,
+com parte dos servidores alterada, alguns novos e alguns fora da extração.
+Enquanto ela roda, outro thread consulta servidores pela rota
+``/api/servidor/<matricula>``, que não pode ficar esperando a importação
+(tudo acontece em uma transação, e as leituras veem a versão anterior).
+
+Os protocolos são importados em lotes e comparados, em protocolos por
+segundo, com o cadastro um a um pela rota ``/protocolo/novo``, o único
+caminho que existia antes. As quantidades podem ser reduzidas com
+BENCH_SERVIDORES e BENCH_PROTOCOLOS.
+
+    python -m pytest bench/bench_importacao.py -s
+"""
+import csv
+import io
+import os
+import threading
+import time
+
+import importacao_protocolos
+import importacao_servidores
+from medicao import PRIMEIROS_NOMES, SOBRENOMES, STATUS
+from models import HistoricoProtocolo, Protocolo, Servidor
+
+SERVIDORES = int(os.getenv('BENCH_SERVIDORES', '200000'))
+PROTOCOLOS = int(os.getenv('BENCH_PROTOCOLOS', '100000'))
+# Cadastros pela rota usados na comparação
+PELA_ROTA = 300
+
+
+def nome(i):
+    return (f'{PRIMEIROS_NOMES[i % len(PRIMEIROS_NOMES)]} {SOBRENOMES[i // 7 % len(SOBRENOMES)]} '
+            f'{SOBRENOMES[i // 131 % len(SOBRENOMES)]}')
+
+
+def extracao_rh(quantidade, versao=0):
+    """CSV da extração: na versão 1, 10% mudam de lotação, 1% sai e 1% entra."""
+    arquivo = io.StringIO()
+    escritor = csv.writer(arquivo, delimiter=';')
+    escritor.writerow(importacao_servidores.COLUNAS)
+    inicio = quantidade // 100 if versao else 0
+    for i in range(inicio, quantidade + inicio):
+        lotacao = i % 60 + (1 if versao and i % 10 == 0 else 0)
+        escritor.writerow((100000 + i, nome(i), f'Lotação {lotacao}', f'Cargo {i % 30}', f'Unidade {i % 300}'))
+    return io.BytesIO(arquivo.getvalue().encode('utf-8'))
+
+
+def test_sincronizacao_de_servidores(app, cliente, banco):
+    inicio = time.perf_counter()
+    resultado = importacao_servidores.importar(extracao_rh(SERVIDORES), 'rh.csv')
+    carga = time.perf_counter() - inicio
+    assert resultado['inseridos'] == SERVIDORES
+    print(f'\ncarga inicial: {carga:.1f} s ({SERVIDORES} servidores)')
+
+    consultas = []
+    parar = threading.Event()
+
+    def consultar():
+        i = 0
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            resposta = cliente.get(f'/api/servidor/{100000 + SERVIDORES // 2 + i % 1000}')
+            consultas.append((time.perf_counter() - inicio, resposta.status_code))
+            i += 1
+
+    leitor = threading.Thread(target=consultar)
+    leitor.start()
+    try:
+        inicio = time.perf_counter()
+        resultado = importacao_servidores.importar(extracao_rh(SERVIDORES, versao=1), 'rh.csv')
+        atualizacao = time.perf_counter() - inicio
+    finally:
+        parar.set()
+        leitor.join()
+
+    print(f"atualização: {atualizacao:.1f} s ({resultado['inseridos']} inseridos, "
+          f"{resultado['atualizados']} atualizados, {resultado['removidos']} removidos); "
+          f"{len(consultas)} consultas durante a importação, a mais lenta em "
+          f"{max(tempo for tempo, _ in consultas) * 1000:.0f} ms")
+    novos = SERVIDORES // 100
+    assert (resultado['inseridos'], resultado['removidos']) == (novos, novos)
+    assert resultado['atualizados'] == len([i for i in range(novos, SERVIDORES) if i % 10 == 0])
+    assert Servidor.query.count() == SERVIDORES
+    assert all(status == 200 for _, status in consultas)
+    # As consultas seguem respondendo enquanto a importação roda
+    assert max(tempo for tempo, _ in consultas) < atualizacao / 2
+
+
+def lote_de_protocolos(quantidade):
+    """CSV de protocolos do sistema antigo: metade com número, metade sem."""
+    arquivo = io.StringIO()
+    escritor = csv.writer(arquivo, delimiter=';')
+    escritor.writerow(('protocolo', 'requerente', 'tipo', 'lotacao', 'data', 'status', 'observacoes'))
+    for i in range(1, quantidade + 1):
+        escritor.writerow((
+            f'{i}/2019' if i % 2 else '', nome(i), f'Tipo {i % 40}', f'Lotação {i % 60}',
+            f'{1 + i % 28:02d}/{1 + i % 12:02d}/2019', STATUS[i % len(STATUS)], 'Migrado do sistema antigo.',
+        ))
+    return io.BytesIO(arquivo.getvalue().encode('utf-8'))
+
+
+def test_importacao_de_protocolos(app, cliente, banco):
+    inicio = time.perf_counter()
+    for i in range(PELA_ROTA):
+        resposta = cliente.post('/protocolo/novo', data={'nome': nome(i), 'data_solicitacao': '2019-01-02',
+                                                         'tipo_requerimento': f'Tipo {i % 40}'})
+        assert resposta.status_code == 302
+    por_segundo_rota = PELA_ROTA / (time.perf_counter() - inicio)
+
+    relatorio = io.StringIO()
+    inicio = time.perf_counter()
+    resultado = importacao_protocolos.importar(lote_de_protocolos(PROTOCOLOS), 'legado.csv', relatorio, 'migracao')
+    importacao = time.perf_counter() - inicio
+
+    print(f'\n{PROTOCOLOS} protocolos importados em {importacao:.1f} s ({PROTOCOLOS / importacao:.0f}/s); '
+          f'pela rota: {por_segundo_rota:.0f}/s')
+    assert resultado == {'lidos': PROTOCOLOS, 'importados': PROTOCOLOS, 'rejeitados': 0}
+    assert Protocolo.query.count() == PROTOCOLOS + PELA_ROTA
+    assert HistoricoProtocolo.query.count() == PROTOCOLOS + PELA_ROTA
+    assert PROTOCOLOS / importacao > 10 * por_segundo_rota
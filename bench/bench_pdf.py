@@ -0,0 +1,84 @@
+"""PDF de N protocolos: N impressões avulsas contra um PDF em lote.
+
+As avulsas são o que os atendentes faziam, ``/protocolo/<id>/pdf`` um por
+um; o lote é ``/protocolos/pdf?ids=...``, que carrega os protocolos em uma
+consulta e diagrama os documentos em paralelo no pool de CPU. O pool aqui
+tem um processo por CPU e o cache de PDFs é ignorado, para que os dois
+lados paguem o layout de todos os documentos. N pode ser mudado com
+BENCH_PDFS.
+
+    python -m pytest bench/bench_pdf.py -s
+"""
+import io
+import os
+import time
+from datetime import date
+
+import pytest
+from pypdf import PdfReader
+
+import pdf
+from executor import ExecutorLimitado
+from models import HistoricoProtocolo, Protocolo
+
+PDFS = int(os.getenv('BENCH_PDFS', '50'))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    processos = os.cpu_count() or 1
+    executor = ExecutorLimitado(processos, max_fila=processos * 4, timeout=600, preload=('pdf',))
+    monkeypatch.setattr(pdf, 'executor_cpu', executor)
+    monkeypatch.setattr(pdf.cache_pdf, 'get', lambda chave: None)
+    yield executor
+    if executor._pool is not None:
+        executor._pool.shutdown()
+
+
+@pytest.fixture
+def lote_sincrono(app):
+    anterior = app.config['PDF_LOTE_SINCRONO_MAX']
+    app.config['PDF_LOTE_SINCRONO_MAX'] = PDFS
+    yield
+    app.config['PDF_LOTE_SINCRONO_MAX'] = anterior
+
+
+def semear(banco):
+    ids = []
+    for i in range(1, PDFS + 1):
+        protocolo = Protocolo(
+            numero=f'{i:04d}/2026', ano=2026, sequencial=i, nome=f'Requerente {i}', status='Em análise',
+            tipo_requerimento='Férias', lotacao='SEDUC', data_solicitacao=date(2026, 1, 1 + i % 28),
+            endereco=f'Rua {i}, 100', requer_ao='Secretário', observacoes='Observação do atendimento. ' * 40,
+        )
+        for j in range(5):
+            protocolo.historico.append(HistoricoProtocolo(status='Em análise', responsavel='admin',
+                                                          observacao=f'Andamento {j}'))
+        banco.session.add(protocolo)
+        banco.session.flush()
+        ids.append(protocolo.id)
+    banco.session.commit()
+    return ids
+
+
+def test_avulsos_contra_lote(cliente, banco, pool, lote_sincrono):
+    ids = semear(banco)
+    # Sobe os processos do pool e aquece fontes e estilos antes de medir
+    pool.mapear(pdf._renderizar, ['<p>PDF</p>'] * pool.processos)
+
+    inicio = time.perf_counter()
+    paginas_avulsas = 0
+    for protocolo_id in ids:
+        resposta = cliente.get(f'/protocolo/{protocolo_id}/pdf')
+        assert resposta.status_code == 200
+        paginas_avulsas += len(PdfReader(io.BytesIO(resposta.get_data())).pages)
+    avulsos = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resposta = cliente.get('/protocolos/pdf', query_string={'ids': ','.join(map(str, ids))})
+    lote = time.perf_counter() - inicio
+    assert resposta.status_code == 200
+    assert len(PdfReader(io.BytesIO(resposta.get_data())).pages) == paginas_avulsas
+
+    print(f'\n{PDFS} protocolos, {pool.processos} processo(s) no pool: '
+          f'{avulsos * 1000:.0f} ms avulsos, {lote * 1000:.0f} ms em lote ({avulsos / lote:.1f}x)')
@@ -0,0 +1,82 @@
+"""Memória no envio de anexos de 1, 50 e 200 MB.
+
+Compara o pico de memória alocada (tracemalloc) no caminho atual, que copia
+o upload em blocos para o storage, com o que a versão anterior fazia, ler o
+arquivo inteiro (``file.read()``) para gravá-lo no banco. O corpo da
+requisição vem de um arquivo em disco, para não pesar na medição.
+
+    python -m pytest bench/bench_uploads.py -s
+"""
+import os
+import tempfile
+import tracemalloc
+
+import pytest
+
+from models import Anexo, Protocolo
+
+TAMANHOS_MB = (1, 50, 200)
+
+
+@pytest.fixture(scope='module')
+def arquivos():
+    gerados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for megas in TAMANHOS_MB:
+            caminho = os.path.join(pasta, f'{megas}mb.pdf')
+            with open(caminho, 'wb') as f:
+                for _ in range(megas):
+                    f.write(os.urandom(1024 * 1024))
+            gerados[megas] = caminho
+        yield gerados
+
+
+@pytest.fixture
+def sem_limite(app):
+    anterior = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = None
+    yield
+    app.config['MAX_CONTENT_LENGTH'] = anterior
+
+
+def _pico(funcao):
+    tracemalloc.start()
+    try:
+        inicial = tracemalloc.get_traced_memory()[0]
+        funcao()
+        return tracemalloc.get_traced_memory()[1] - inicial
+    finally:
+        tracemalloc.stop()
+
+
+def _upload(caminho):
+    return {'anexo': (open(caminho, 'rb'), os.path.basename(caminho))}
+
+
+@pytest.mark.parametrize('megas', TAMANHOS_MB)
+def test_pico_de_memoria_do_upload(app, cliente, banco, arquivos, sem_limite, megas):
+    protocolo = Protocolo(numero='0001/2026', nome='Bench', status='Aberto')
+    banco.session.add(protocolo)
+    banco.session.commit()
+    caminho = arquivos[megas]
+
+    def atual():
+        resposta = cliente.post(f'/protocolo/{protocolo.id}/anexo/novo', data=_upload(caminho),
+                                content_type='multipart/form-data')
+        assert resposta.status_code == 302
+
+    def anterior():
+        # O que adicionar_anexo fazia antes: o arquivo inteiro em um bytes
+        with app.test_request_context(f'/protocolo/{protocolo.id}/anexo/novo', method='POST',
+                                      data=_upload(caminho), content_type='multipart/form-data'):
+            from flask import request
+            assert len(request.files['anexo'].read()) == megas * 1024 * 1024
+
+    pico_atual = _pico(atual)
+    pico_anterior = _pico(anterior)
+    assert Anexo.query.one().file_size == megas * 1024 * 1024
+
+    print(f'\n{megas:>4} MB: pico {pico_atual / 2**20:7.1f} MB em streaming, '
+          f'{pico_anterior / 2**20:7.1f} MB lendo o arquivo inteiro')
+    # Memória constante: não cresce com o tamanho do arquivo
+    assert pico_atual < 8 * 1024 * 1024
@@ -0,0 +1,91 @@
+"""Utilitários dos benchmarks: cronômetro, massa de dados e planos de execução."""
+import json
+import statistics
+import time
+
+from sqlalchemy import text
+
+import stats_diario
+
+PRIMEIROS_NOMES = ('João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Carlos', 'Luíza', 'Paulo',
+                   'Adriana', 'Lucas', 'Juliana', 'Márcio', 'Patrícia', 'Sérgio', 'Fernanda')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Conceição', 'Araújo', 'Gonçalves', 'Pereira',
+              'Lima', 'Ferreira', 'Ribeiro', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Almeida',
+              'Nascimento', 'Barbosa', 'Magalhães', 'Brandão', 'Assunção', 'Falcão', 'Simões')
+STATUS = ('PROTOCOLO GERADO', 'Em análise', 'Encaminhado', 'Finalizado', 'Concluído')
+
+
+def _array(valores):
+    return '(ARRAY[' + ', '.join("'" + v.replace("'", "''") + "'" for v in valores) + '])'
+
+
+# Nome de três partes a partir de i, com acentos como nos nomes reais
+NOME = (f"{_array(PRIMEIROS_NOMES)}[1 + i % {len(PRIMEIROS_NOMES)}] || ' ' || "
+        f"{_array(SOBRENOMES)}[1 + (i / 7) % {len(SOBRENOMES)}] || ' ' || "
+        f"{_array(SOBRENOMES)}[1 + (i / 131) % {len(SOBRENOMES)}]")
+
+
+def semear_protocolos(sessao, quantidade, ano=2020):
+    """Insere ``quantidade`` protocolos (sequenciais 1..quantidade de ``ano``) e o consolidado do dashboard."""
+    sessao.execute(text(
+        "INSERT INTO protocolos (numero, ano, sequencial, nome, status, tipo_requerimento, lotacao, "
+        "responsavel, data_solicitacao, visto) "
+        f"SELECT lpad(i::text, greatest(4, length(i::text)), '0') || '/{ano}', {ano}, i, {NOME}, "
+        f"{_array(STATUS)}[1 + i % {len(STATUS)}], 'Tipo ' || (i % 40), 'Lotação ' || (i % 60), "
+        "'usuario' || (i % 200), DATE '2020-01-01' + (i % 2000), false "
+        "FROM generate_series(1, :quantidade) AS i"
+    ), {'quantidade': quantidade})
+    # O INSERT em massa não passa pelos eventos da sessão que mantêm o consolidado
+    stats_diario.reconstruir(sessao.connection())
+    sessao.commit()
+
+
+def semear_servidores(sessao, quantidade):
+    sessao.execute(text(
+        "INSERT INTO servidores (matricula, nome, lotacao, cargo, unidade_de_exercicio) "
+        f"SELECT (100000 + i)::text, {NOME}, 'Lotação ' || (i % 60), 'Cargo ' || (i % 30), 'Unidade ' || (i % 300) "
+        "FROM generate_series(1, :quantidade) AS i"
+    ), {'quantidade': quantidade})
+    sessao.commit()
+
+
+def analisar(sessao, *tabelas):
+    for tabela in tabelas:
+        sessao.execute(text(f'ANALYZE {tabela}'))
+    sessao.commit()
+
+
+def cronometrar(funcao, repeticoes=5):
+    """``(mediana em ms, último resultado)`` de ``repeticoes`` chamadas, depois de uma de aquecimento."""
+    resultado = funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), resultado
+
+
+def plano(sessao, consulta):
+    """Plano (JSON do EXPLAIN) de uma consulta do SQLAlchemy, com os parâmetros já interpolados."""
+    conexao = sessao.connection()
+    compilado = consulta.statement.compile(dialect=conexao.dialect, compile_kwargs={'render_postcompile': True})
+    resultado = conexao.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + compilado.string, compilado.params).scalar()
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]['Plan']
+
+
+def nos(plano_consulta):
+    """Todos os nós do plano, em profundidade."""
+    yield plano_consulta
+    for filho in plano_consulta.get('Plans', ()):
+        yield from nos(filho)
+
+
+def indices(plano_consulta):
+    return {no['Index Name'] for no in nos(plano_consulta) if 'Index Name' in no}
+
+
+def varreduras_sequenciais(plano_consulta):
+    return {no['Relation Name'] for no in nos(plano_consulta) if no['Node Type'] == 'Seq Scan'}
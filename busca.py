@@ -0,0 +1,66 @@
+"""Busca textual sem acentos e sem diferenciar maiúsculas.
+
+As consultas usam duas funções SQL: ``normalizar_busca(texto)`` (minúsculas,
+sem acentos) e ``similarity(a, b)`` (semelhança por trigramas). No
+PostgreSQL elas vêm das extensões unaccent/pg_trgm (ver
+migrations/0004_busca_trigramas.sql), e os índices GIN sobre
+``normalizar_busca(coluna)`` atendem os filtros ``LIKE '%termo%'``. No SQLite
+as mesmas funções são registradas em Python a cada conexão.
+"""
+import sqlite3
+import unicodedata
+
+from sqlalchemy import and_, event, func, true
+from sqlalchemy.engine import Engine
+
+
+def normalizar(texto):
+    """Remove acentos e converte para minúsculas ('João' -> 'joao')."""
+    if texto is None:
+        return None
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _trigramas(texto):
+    # Mesmo critério do pg_trgm: cada palavra ganha dois espaços antes e um depois
+    trigramas = set()
+    for palavra in ''.join(c if c.isalnum() else ' ' for c in normalizar(texto)).split():
+        palavra = f'  {palavra} '
+        trigramas.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return trigramas
+
+
+def similaridade(a, b):
+    """Semelhança entre 0 e 1 pela proporção de trigramas em comum."""
+    if a is None or b is None:
+        return 0.0
+    ta, tb = _trigramas(a), _trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+@event.listens_for(Engine, 'connect')
+def _registrar_funcoes_sqlite(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('normalizar_busca', 1, normalizar, deterministic=True)
+        dbapi_connection.create_function('similarity', 2, similaridade, deterministic=True)
+
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def contem(coluna, termo):
+    """Filtro: ``coluna`` contém todas as palavras de ``termo``, ignorando acentos."""
+    expressao = func.normalizar_busca(coluna)
+    palavras = normalizar(termo).split()
+    if not palavras:
+        return true()
+    return and_(*[expressao.like(f'%{_escapar_like(p)}%', escape='\\') for p in palavras])
+
+
+def relevancia(coluna, termo):
+    """Expressão de ordenação: resultados mais parecidos com ``termo`` primeiro."""
+    return func.similarity(func.normalizar_busca(coluna), normalizar(termo)).desc()
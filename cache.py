@@ -0,0 +1,446 @@
+"""Cache versionado para dados de consulta frequente.
+
+Cada namespace (ex.: 'lotacoes') tem um número de versão. As entradas são
+guardadas sob ``(namespace, versão, chave)``, então invalidar um namespace
+é só incrementar a versão: as entradas antigas deixam de ser encontradas e
+são descartadas depois. No LRU local, pela expiração e pelo limite de
+itens. No Redis, pelo TTL da chave. No backend de arquivos, na leitura de
+uma entrada vencida e numa varredura periódica; ambos os backends limitam a
+vida das entradas sem TTL a ``ttl_maximo``. Há um LRU em memória por processo e, opcionalmente, um
+backend compartilhado entre os workers (arquivos locais ou Redis), que
+também guarda as versões para que a invalidação valha para todos.
+
+``obter_renovavel`` acrescenta stale-while-revalidate: passado o ``ttl``, o
+valor antigo continua sendo servido por mais ``tolerancia`` segundos
+enquanto um thread o recalcula. Acertos, falhas e valores vencidos são
+contados em memória e somados ao backend a cada ``INTERVALO_CONTADORES``
+segundos (ver ``contadores``), para que uma leitura em cache não custe uma
+gravação.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Intervalo (segundos) entre as gravações dos contadores de obter_renovavel no backend
+INTERVALO_CONTADORES = 10
+
+
+class LRUCache:
+    """Dicionário limitado, seguro entre threads, com expiração opcional."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._dados[chave] = (valor, expira_em)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+
+class MemoriaBackend:
+    """Versões mantidas só no processo atual (útil com um único worker)."""
+
+    def __init__(self):
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        return None
+
+    def set(self, chave, valor, ttl=None):
+        pass
+
+    def versao(self, namespace):
+        return self._versoes.get(namespace, 0)
+
+    def incrementar(self, namespace, quantidade=1):
+        with self._lock:
+            self._versoes[namespace] = self._versoes.get(namespace, 0) + quantidade
+            return self._versoes[namespace]
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _gravar(diretorio, destino, conteudo, expira_em):
+    """Grava ``conteudo`` (bytes) de forma atômica, com o mtime igual à expiração."""
+    fd, tmp = tempfile.mkstemp(dir=diretorio)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(conteudo)
+    os.utime(tmp, (expira_em, expira_em))
+    os.replace(tmp, destino)
+
+
+def varrer_diretorio(pasta, max_entradas=None, max_bytes=None):
+    """Remove de ``pasta`` os arquivos vencidos (mtime = expiração) e, acima dos limites, os que expiram primeiro."""
+    agora = time.time()
+    restantes = []
+    removidos = 0
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            try:
+                estado = entrada.stat()
+            except FileNotFoundError:
+                continue
+            if estado.st_mtime < agora:
+                _remover(entrada.path)
+                removidos += 1
+            else:
+                restantes.append((estado.st_mtime, estado.st_size, entrada.path))
+
+    restantes.sort()
+    quantidade = len(restantes)
+    total = sum(tamanho for _, tamanho, _ in restantes)
+    for _, tamanho, caminho in restantes:
+        if (max_entradas is None or quantidade <= max_entradas) and (max_bytes is None or total <= max_bytes):
+            break
+        _remover(caminho)
+        removidos += 1
+        quantidade -= 1
+        total -= tamanho
+    return removidos
+
+
+class _Periodico:
+    """Diz, entre os threads de um processo, quando uma tarefa periódica deve rodar de novo."""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def devido(self):
+        with self._lock:
+            if time.monotonic() - self._ultima < self.intervalo:
+                return False
+            self._ultima = time.monotonic()
+            return True
+
+
+class ArquivoBackend:
+    """Backend compartilhado entre os processos de uma máquina, em um diretório local.
+
+    O mtime de cada arquivo de valor é o instante em que ele expira (entradas
+    sem TTL expiram após ``ttl_maximo``), então a varredura (``varrer``, no
+    máximo a cada ``intervalo_varredura`` segundos por processo, disparada
+    pelas gravações) acha as vencidas só com ``stat``. Acima de
+    ``max_entradas`` arquivos, ela remove também os que expiram primeiro.
+    """
+
+    def __init__(self, diretorio, max_entradas=10000, ttl_maximo=86400, intervalo_varredura=300):
+        self.diretorio = diretorio
+        self.max_entradas = max_entradas
+        self.ttl_maximo = ttl_maximo
+        self._varredura = _Periodico(intervalo_varredura)
+        os.makedirs(os.path.join(diretorio, 'valores'), exist_ok=True)
+        os.makedirs(os.path.join(diretorio, 'versoes'), exist_ok=True)
+
+    def _arquivo_valor(self, chave):
+        return os.path.join(self.diretorio, 'valores', hashlib.sha1(chave.encode()).hexdigest())
+
+    def get(self, chave):
+        caminho = self._arquivo_valor(chave)
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                expira_em, valor = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Entradas gravadas antes da expiração obrigatória não têm ``expira_em``
+        if expira_em is None or expira_em < time.time():
+            _remover(caminho)
+            return None
+        return valor
+
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.time() + min(ttl or self.ttl_maximo, self.ttl_maximo)
+        _gravar(self.diretorio, self._arquivo_valor(chave), json.dumps([expira_em, valor]).encode('utf-8'), expira_em)
+        if self._varredura.devido():
+            self.varrer()
+
+    def varrer(self):
+        """Remove as entradas vencidas e, acima de ``max_entradas``, as que expiram primeiro."""
+        return varrer_diretorio(os.path.join(self.diretorio, 'valores'), max_entradas=self.max_entradas)
+
+    def versao(self, namespace):
+        try:
+            with open(os.path.join(self.diretorio, 'versoes', namespace), encoding='utf-8') as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def incrementar(self, namespace, quantidade=1):
+        caminho = os.path.join(self.diretorio, 'versoes', namespace)
+        with open(caminho, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            atual = int(f.read() or 0) + quantidade
+            f.seek(0)
+            f.truncate()
+            f.write(str(atual))
+            return atual
+
+
+class RedisBackend:
+    """Backend compartilhado em Redis (ou qualquer cliente com get/set/incr)."""
+
+    def __init__(self, url=None, client=None, prefixo='protocolo:', ttl_maximo=86400):
+        if client is None:
+            import redis  # Dependência opcional, necessária apenas para este backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefixo = prefixo
+        self.ttl_maximo = ttl_maximo
+
+    def get(self, chave):
+        valor = self.client.get(self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def set(self, chave, valor, ttl=None):
+        ttl = min(ttl or self.ttl_maximo, self.ttl_maximo)
+        self.client.set(self.prefixo + chave, json.dumps(valor), ex=max(1, int(ttl)))
+
+    def versao(self, namespace):
+        return int(self.client.get(f'{self.prefixo}versao:{namespace}') or 0)
+
+    def incrementar(self, namespace, quantidade=1):
+        return self.client.incr(f'{self.prefixo}versao:{namespace}', quantidade)
+
+
+class CacheVersionado:
+    """LRU local na frente de um backend compartilhado, com invalidação por namespace."""
+
+    def __init__(self, backend, maxsize=512):
+        self.backend = backend
+        self.local = LRUCache(maxsize)
+        self._renovando = set()
+        self._lock = threading.Lock()
+        self._contagens = Counter()
+        self._ultima_gravacao = time.monotonic()
+
+    def obter(self, namespace, chave, carregar, ttl=None):
+        """Retorna o valor em cache ou chama ``carregar()`` e guarda o resultado (JSON)."""
+        versao = self.backend.versao(namespace)
+        chave_completa = f'{namespace}:{versao}:{chave}'
+
+        valor = self.local.get(chave_completa)
+        if valor is not None:
+            return valor
+        valor = self.backend.get(chave_completa)
+        if valor is None:
+            valor = carregar()
+            self.backend.set(chave_completa, valor, ttl)
+        self.local.set(chave_completa, valor, ttl)
+        return valor
+
+    def buscar(self, namespace, chave, ttl=None):
+        """Valor em cache ou None, sem carregar (``ttl`` vale para a cópia no LRU local)."""
+        chave_completa = f'{namespace}:{self.backend.versao(namespace)}:{chave}'
+        valor = self.local.get(chave_completa)
+        if valor is None:
+            valor = self.backend.get(chave_completa)
+            if valor is not None:
+                self.local.set(chave_completa, valor, ttl)
+        return valor
+
+    def guardar(self, namespace, chave, valor, ttl=None):
+        chave_completa = f'{namespace}:{self.backend.versao(namespace)}:{chave}'
+        self.backend.set(chave_completa, valor, ttl)
+        self.local.set(chave_completa, valor, ttl)
+
+    def obter_renovavel(self, namespace, chave, carregar, ttl, tolerancia):
+        """Como ``obter``, com stale-while-revalidate.
+
+        Até ``ttl`` segundos o valor é servido como está; até ``ttl + tolerancia``
+        é servido vencido e recarregado em segundo plano; depois disso (ou após
+        ``invalidar``) é recalculado na própria chamada. ``carregar`` pode ser
+        chamado fora da requisição e precisa criar o próprio contexto.
+        """
+        versao = self.backend.versao(namespace)
+        chave_completa = f'{namespace}:{versao}:{chave}'
+        agora = time.time()
+
+        entrada = self.local.get(chave_completa)
+        if entrada is None or agora - entrada[0] >= ttl:
+            # Outro worker pode já ter renovado o valor no backend
+            compartilhada = self.backend.get(chave_completa)
+            if compartilhada is not None and (entrada is None or compartilhada[0] > entrada[0]):
+                entrada = compartilhada
+                self.local.set(chave_completa, entrada, ttl + tolerancia)
+
+        if entrada is None:
+            resultado = 'miss'
+            entrada = self._recarregar(chave_completa, carregar, ttl + tolerancia)
+        elif agora - entrada[0] < ttl:
+            resultado = 'hit'
+        else:
+            resultado = 'stale'
+            self._renovar_em_segundo_plano(chave_completa, carregar, ttl + tolerancia)
+        self._contar(f'contador.{namespace}.{resultado}')
+        return entrada[1]
+
+    def _contar(self, contador):
+        with self._lock:
+            self._contagens[contador] += 1
+            if time.monotonic() - self._ultima_gravacao < INTERVALO_CONTADORES:
+                return
+        self.gravar_contadores()
+
+    def gravar_contadores(self):
+        """Soma ao backend as contagens acumuladas neste processo."""
+        with self._lock:
+            contagens, self._contagens = self._contagens, Counter()
+            self._ultima_gravacao = time.monotonic()
+        for contador, quantidade in contagens.items():
+            self.backend.incrementar(contador, quantidade)
+
+    def _recarregar(self, chave_completa, carregar, ttl):
+        entrada = [time.time(), carregar()]
+        self.backend.set(chave_completa, entrada, ttl)
+        self.local.set(chave_completa, entrada, ttl)
+        return entrada
+
+    def _renovar_em_segundo_plano(self, chave_completa, carregar, ttl):
+        with self._lock:
+            if chave_completa in self._renovando:
+                return
+            self._renovando.add(chave_completa)
+
+        def renovar():
+            try:
+                self._recarregar(chave_completa, carregar, ttl)
+            finally:
+                with self._lock:
+                    self._renovando.discard(chave_completa)
+
+        threading.Thread(target=renovar, daemon=True).start()
+
+    def contadores(self, namespace):
+        """Quantas chamadas de ``obter_renovavel`` foram 'hit', 'stale' ou 'miss'.
+
+        Inclui as contagens deste processo; as dos outros aparecem depois que
+        eles as gravam (até ``INTERVALO_CONTADORES`` segundos).
+        """
+        self.gravar_contadores()
+        return {
+            resultado: self.backend.versao(f'contador.{namespace}.{resultado}')
+            for resultado in ('hit', 'stale', 'miss')
+        }
+
+    def invalidar(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.incrementar(namespace)
+
+
+class CacheBinario:
+    """Conteúdos binários grandes (ex.: PDFs), um arquivo por chave, fora do cache versionado.
+
+    Os arquivos seguem o esquema do ArquivoBackend (mtime = expiração,
+    varredura periódica), com o diretório limitado a ``max_bytes``. Os
+    conteúdos lidos recentemente ficam em um LRU próprio limitado a
+    ``max_bytes_memoria``, para não disputar o LRU do cache versionado com as
+    entradas pequenas (dashboard, listas de referência).
+    """
+
+    def __init__(self, diretorio, ttl, max_bytes, max_bytes_memoria, intervalo_varredura=300):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_bytes_memoria = max_bytes_memoria
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+        self._varredura = _Periodico(intervalo_varredura)
+        # Os temporários ficam fora de 'valores', que é o que a varredura percorre
+        os.makedirs(os.path.join(diretorio, 'valores'), exist_ok=True)
+
+    def _arquivo(self, chave):
+        return os.path.join(self.diretorio, 'valores', hashlib.sha1(chave.encode()).hexdigest())
+
+    def _lembrar(self, chave, conteudo, expira_em):
+        if len(conteudo) > self.max_bytes_memoria:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(chave, None)
+            if anterior is not None:
+                self._bytes_memoria -= len(anterior[0])
+            self._memoria[chave] = (conteudo, expira_em)
+            self._bytes_memoria += len(conteudo)
+            while self._bytes_memoria > self.max_bytes_memoria:
+                _, (removido, _) = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(removido)
+
+    def get(self, chave):
+        agora = time.time()
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is not None and item[1] >= agora:
+                self._memoria.move_to_end(chave)
+                return item[0]
+        caminho = self._arquivo(chave)
+        try:
+            expira_em = os.stat(caminho).st_mtime
+            if expira_em < agora:
+                _remover(caminho)
+                return None
+            with open(caminho, 'rb') as f:
+                conteudo = f.read()
+        except FileNotFoundError:
+            return None
+        self._lembrar(chave, conteudo, expira_em)
+        return conteudo
+
+    def set(self, chave, conteudo):
+        expira_em = time.time() + self.ttl
+        _gravar(self.diretorio, self._arquivo(chave), conteudo, expira_em)
+        self._lembrar(chave, conteudo, expira_em)
+        if self._varredura.devido():
+            self.varrer()
+
+    def varrer(self):
+        """Remove os arquivos vencidos e, acima de ``max_bytes``, os que expiram primeiro."""
+        return varrer_diretorio(os.path.join(self.diretorio, 'valores'), max_bytes=self.max_bytes)
+
+
+def criar_cache(config):
+    """Instancia o cache com o backend configurado em ``CACHE_BACKEND``."""
+    backend = config.get('CACHE_BACKEND', 'arquivo')
+    ttl_maximo = config.get('CACHE_TTL_MAXIMO', 86400)
+    if backend == 'memoria':
+        return CacheVersionado(MemoriaBackend())
+    if backend == 'arquivo':
+        return CacheVersionado(ArquivoBackend(
+            config['CACHE_DIR'], max_entradas=config.get('CACHE_ARQUIVO_MAX_ENTRADAS', 10000), ttl_maximo=ttl_maximo
+        ))
+    if backend == 'redis':
+        return CacheVersionado(RedisBackend(config['CACHE_REDIS_URL'], ttl_maximo=ttl_maximo))
+    raise RuntimeError(f"CACHE_BACKEND inválido: {backend!r} (use 'memoria', 'arquivo' ou 'redis').")
@@ -0,0 +1,148 @@
+"""Comandos de manutenção executados via `flask <comando>`."""
+import io
+
+import click
+
+from app import app, db, guardar_conteudo
+from models import Anexo
+import importacao_protocolos
+import importacao_servidores
+import jobs
+import migracoes
+import pdf
+import planos
+import stats_diario
+
+
+@app.cli.command('migrar-anexos')
+@click.option('--lote', default=20, show_default=True, help='Quantidade de anexos lidos do banco por vez.')
+def migrar_anexos(lote):
+    """Move o conteúdo legado de anexos.file_data para o storage de anexos."""
+    ultimo_id = 0
+    migrados = 0
+    while True:
+        # Lê poucos registros por vez, para não trazer todos os BYTEA para a memória
+        linhas = db.session.query(Anexo.id, Anexo.file_data).filter(
+            Anexo.sha256 == None,
+            Anexo.file_data != None,
+            Anexo.id > ultimo_id
+        ).order_by(Anexo.id).limit(lote).all()
+        if not linhas:
+            break
+
+        for anexo_id, file_data in linhas:
+            chave, tamanho, digest = guardar_conteudo(io.BytesIO(file_data))
+            db.session.query(Anexo).filter(Anexo.id == anexo_id).update({
+                'storage_path': chave,
+                'sha256': digest,
+                'file_size': tamanho,
+                'file_data': None,
+            }, synchronize_session=False)
+            ultimo_id = anexo_id
+        db.session.commit()
+        migrados += len(linhas)
+        click.echo(f'{migrados} anexos migrados...')
+
+    click.echo(f'Concluído: {migrados} anexos movidos para o storage.')
+
+
+@app.cli.command('reconstruir-estatisticas')
+def reconstruir_estatisticas():
+    """Recalcula protocolo_stats_diario a partir da tabela de protocolos."""
+    stats_diario.reconstruir(db.session.connection())
+    db.session.commit()
+    click.echo('Consolidado diário de protocolos reconstruído.')
+
+
+@app.cli.command('worker')
+@click.option('--processos', default=1, show_default=True, help='Quantidade de processos executando tarefas.')
+@click.option('--intervalo', default=2.0, show_default=True, help='Segundos entre consultas quando a fila está vazia.')
+def worker(processos, intervalo):
+    """Executa as tarefas em segundo plano (exportações e PDFs) enfileiradas pela aplicação."""
+    # Processos criados por fork herdam fontes, estilos e imagens já carregados
+    pdf.aquecer()
+    click.echo(f'Worker iniciado com {processos} processo(s).')
+    jobs.iniciar_workers(processos, intervalo)
+
+
+@app.cli.command('importar-servidores')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--manter-ausentes', is_flag=True, help='Não remove os servidores que não estão no arquivo.')
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Codificação do arquivo CSV.')
+def importar_servidores(arquivo, manter_ausentes, encoding):
+    """Sincroniza a tabela de servidores com uma extração do RH (CSV ou XLSX)."""
+    with open(arquivo, 'rb') as f:
+        resultado = importacao_servidores.importar(f, arquivo, remover_ausentes=not manter_ausentes, encoding=encoding)
+    click.echo(
+        f"Concluído: {resultado['lidos']} linhas lidas ({resultado['ignorados']} sem matrícula), "
+        f"{resultado['inseridos']} inseridos, {resultado['atualizados']} atualizados, "
+        f"{resultado['removidos']} removidos."
+    )
+
+
+@app.cli.command('importar-protocolos')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--relatorio', type=click.Path(dir_okay=False), help='CSV com as linhas rejeitadas (padrão: ARQUIVO.erros.csv).')
+@click.option('--responsavel', default='importacao', show_default=True, help='Login gravado no histórico e usado quando a linha não tem responsável.')
+@click.option('--lote', default=1000, show_default=True, help='Registros gravados por transação.')
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Codificação do arquivo CSV/JSONL.')
+def importar_protocolos(arquivo, relatorio, responsavel, lote, encoding):
+    """Importa protocolos em lote de um CSV, XLSX ou JSONL (migração ou lote de outro órgão)."""
+    relatorio = relatorio or f'{arquivo}.erros.csv'
+    with open(arquivo, 'rb') as f, open(relatorio, 'w', encoding='utf-8', newline='') as erros:
+        resultado = importacao_protocolos.importar(
+            f, arquivo, erros, responsavel, tamanho_lote=lote, encoding=encoding,
+            progresso=lambda parcial: click.echo(f"{parcial['lidos']} registros lidos, {parcial['importados']} importados..."),
+        )
+    click.echo(
+        f"Concluído: {resultado['importados']} protocolos importados, {resultado['rejeitados']} rejeitados."
+    )
+    if resultado['rejeitados']:
+        click.echo(f'Linhas rejeitadas em {relatorio}.')
+
+
+@app.cli.command('migrar')
+@click.option('--listar', is_flag=True, help='Só mostra as migrações e se já foram aplicadas.')
+@click.option('--marcar-ate', metavar='VERSAO', help='Registra como aplicadas, sem executar, as migrações até VERSAO (ex.: 0007).')
+def migrar(listar, marcar_ate):
+    """Aplica, em ordem, as migrações de migrations/ ainda não registradas em schema_migrations."""
+    with migracoes.Migrador() as migrador:
+        if listar:
+            aplicadas = migrador.aplicadas()
+            for versao, arquivo in migracoes.arquivos():
+                click.echo(f"{'[x]' if versao in aplicadas else '[ ]'} {arquivo}")
+            return
+
+        pendentes = migrador.pendentes()
+        if marcar_ate:
+            # Bancos em que as migrações foram aplicadas à mão antes deste comando existir
+            for versao, arquivo in pendentes:
+                if versao <= marcar_ate:
+                    migrador.marcar(versao, arquivo)
+                    click.echo(f'Marcada como aplicada: {arquivo}')
+            return
+
+        if not pendentes:
+            click.echo('Nenhuma migração pendente.')
+            return
+        for versao, arquivo in pendentes:
+            click.echo(f'Aplicando {arquivo}...')
+            migrador.aplicar(versao, arquivo)
+        click.echo(f'{len(pendentes)} migração(ões) aplicada(s).')
+
+
+@app.cli.command('verificar-consultas')
+@click.option('--limite', default=1000, show_default=True, help='Linhas a partir das quais uma varredura sequencial é falha.')
+@click.option('--semear', default=0, show_default=True, help='Protocolos fictícios inseridos antes e desfeitos no fim (use uma base descartável).')
+def verificar_consultas(limite, semear):
+    """Roda EXPLAIN nas consultas das rotas e falha se alguma varrer sequencialmente uma tabela grande."""
+    falhas = 0
+    for nome, grandes, linhas in planos.verificar(limite, semear):
+        if grandes:
+            falhas += 1
+            tabelas = ', '.join(f'{tabela} (~{linhas[tabela]} linhas)' for tabela in grandes)
+            click.echo(f'FALHA {nome}: varredura sequencial em {tabelas}')
+        else:
+            click.echo(f'ok    {nome}')
+    if falhas:
+        raise click.ClickException(f'{falhas} consulta(s) com varredura sequencial em tabelas grandes.')
@@ -0,0 +1,181 @@
+"""Configuração compartilhada pelos testes (tests/) e benchmarks (bench/).
+
+Os testes que usam o banco precisam de um PostgreSQL descartável em
+``TEST_DATABASE_URL`` (ex.: ``postgresql://postgres@localhost/protocolo_teste``,
+com as extensões unaccent e pg_trgm disponíveis): o esquema é recriado do
+zero (``db.create_all`` e as migrações de migrations/) e as tabelas são
+esvaziadas antes de cada teste. Sem a variável, esses testes são pulados e
+os demais rodam normalmente.
+
+As variáveis abaixo são definidas antes de importar a aplicação, que lê a
+configuração no import. O pool de CPU roda no próprio processo
+(``EXECUTOR_PROCESSOS=0``), exceto nos testes que criam o seu.
+"""
+import contextlib
+import os
+import tempfile
+
+import pytest
+from flask.testing import FlaskClient
+
+URL_TESTE = os.getenv('TEST_DATABASE_URL')
+_PASTA = tempfile.mkdtemp(prefix='protocolo-testes-')
+
+os.environ.update({
+    'SECRET_KEY': 'teste',
+    'DATABASE_URL': URL_TESTE or f"sqlite:///{os.path.join(_PASTA, 'sem-banco.db')}",
+    'ANEXOS_STORAGE': 'local',
+    'ANEXOS_DIR': os.path.join(_PASTA, 'anexos'),
+    'JOBS_DIR': os.path.join(_PASTA, 'jobs'),
+    'CACHE_BACKEND': 'memoria',
+    'CACHE_DIR': os.path.join(_PASTA, 'cache'),
+    'PDF_CACHE_DIR': os.path.join(_PASTA, 'cache_pdf'),
+    'METRICAS_DIR': os.path.join(_PASTA, 'metricas'),
+    'EXECUTOR_PROCESSOS': '0',
+    'INSTRUMENTACAO': '0',
+})
+os.environ.pop('METRICS_TOKEN', None)
+
+# A aplicação precisa ser importada antes de models (import circular app <-> models)
+import app as _aplicacao  # noqa: E402,F401
+
+SENHA = 'senha-de-teste'
+
+
+class _ClienteIsolado(FlaskClient):
+    """Cliente de teste em que cada requisição tem o próprio contexto da aplicação.
+
+    Sem isso, a requisição reaproveita o contexto aberto pelo teste e, com
+    ele, a sessão do SQLAlchemy e o ``g`` (usuário logado), o que esconde
+    consultas que em produção aconteceriam.
+    """
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as aplicacao
+    aplicacao.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    aplicacao.test_client_class = _ClienteIsolado
+    return aplicacao
+
+
+@pytest.fixture(scope='session')
+def _esquema(app):
+    """Recria o esquema do banco de teste uma vez por sessão."""
+    if not URL_TESTE or not URL_TESTE.startswith('postgresql'):
+        pytest.skip('requer PostgreSQL em TEST_DATABASE_URL')
+
+    from sqlalchemy import text
+
+    import migracoes
+    from app import db
+
+    with app.app_context():
+        with db.engine.begin() as conexao:
+            conexao.execute(text('DROP SCHEMA public CASCADE'))
+            conexao.execute(text('CREATE SCHEMA public'))
+        db.create_all()
+        with migracoes.Migrador() as migrador:
+            for versao, arquivo in migrador.pendentes():
+                migrador.aplicar(versao, arquivo)
+        db.session.remove()
+
+
+@pytest.fixture
+def banco(app, _esquema):
+    """Banco de teste vazio, com um contexto da aplicação ativo."""
+    from sqlalchemy import text
+
+    from app import cache, db, indice_servidores
+
+    with app.app_context():
+        tabelas = ', '.join(tabela.name for tabela in db.metadata.sorted_tables)
+        db.session.execute(text(f'TRUNCATE {tabelas} RESTART IDENTITY CASCADE'))
+        db.session.commit()
+        cache.local.clear()
+        # Os ids recomeçam a cada teste: a versão nova força a reconstrução do índice de servidores
+        cache.invalidar('servidores')
+        indice_servidores.expirar()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def admin(banco):
+    import senhas
+    from models import Usuario
+
+    usuario = Usuario(nome='Admin', nome_completo='Admin Teste', login='admin',
+                      senha=senhas.gerar_hash(SENHA), tipo='admin', status='ativo')
+    banco.session.add(usuario)
+    banco.session.commit()
+    return usuario
+
+
+def entrar(aplicacao, login='admin', senha=SENHA):
+    """Cliente de teste já autenticado."""
+    cliente = aplicacao.test_client()
+    resposta = cliente.post('/login', data={'login': login, 'senha': senha})
+    assert resposta.status_code == 302, resposta.get_data(as_text=True)
+    return cliente
+
+
+@pytest.fixture
+def cliente(app, admin):
+    return entrar(app)
+
+
+def _tamanho(valor):
+    if valor is None:
+        return 0
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return len(valor)
+    if isinstance(valor, str):
+        return len(valor.encode('utf-8'))
+    return 8
+
+
+class ContadorSQL:
+    """Comandos SQL executados e bytes recebidos do banco dentro de ``medir()``.
+
+    Os bytes são a soma do tamanho dos valores das linhas de cada resultado.
+    O cursor do psycopg2 já tem todas as linhas no cliente quando o comando
+    termina; elas são lidas e o cursor volta ao início para a aplicação.
+    Cursores no servidor (``stream_results``) só entram na contagem de comandos.
+    """
+
+    def __init__(self):
+        self.comandos = []
+        self.bytes = 0
+        self._ativo = False
+
+    def _depois_do_comando(self, conn, cursor, statement, parameters, context, executemany):
+        if not self._ativo:
+            return
+        self.comandos.append(statement)
+        if cursor.description is not None and not getattr(cursor, 'name', None):
+            linhas = cursor.fetchall()
+            cursor.scroll(0, mode='absolute')
+            self.bytes += sum(_tamanho(valor) for linha in linhas for valor in linha)
+
+    @contextlib.contextmanager
+    def medir(self):
+        self.comandos, self.bytes, self._ativo = [], 0, True
+        try:
+            yield self
+        finally:
+            self._ativo = False
+
+
+@pytest.fixture
+def contador_sql(banco):
+    from sqlalchemy import event
+
+    contador = ContadorSQL()
+    event.listen(banco.engine, 'after_cursor_execute', contador._depois_do_comando)
+    yield contador
+    event.remove(banco.engine, 'after_cursor_execute', contador._depois_do_comando)
@@ -0,0 +1,183 @@
+"""Estatísticas do dashboard de protocolos.
+
+Todos os números do dashboard saem de uma única consulta sobre o
+consolidado diário (``protocolo_stats_diario``, ver stats_diario.py),
+agrupada por (tipo, status, dia da evolução). Cada grupo traz somas
+condicionais (``SUM(total) FILTER (WHERE ...)``) para os cartões; totais
+por tipo e por status, o top 5 e o agrupamento mensal são somados em
+Python a partir dessas linhas, que são poucas (tipos x status x dias do
+gráfico). O custo não depende do número de protocolos, só de quantos dias
+distintos eles cobrem.
+
+Os filtros são os mesmos das listagens (``FiltroProtocolos``, ver
+filtros.py), aplicados às colunas do consolidado: tipo por "contém", status
+e lotação por igualdade; número, nome e responsável não existem no
+consolidado e não se aplicam aos cartões.
+
+As respostas ficam em cache (``estatisticas_em_cache``) por combinação de
+filtros, com stale-while-revalidate, e são invalidadas no commit de
+qualquer alteração que mude o consolidado.
+"""
+import json
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import and_, case, event, func, or_, true
+from sqlalchemy.orm import Session
+
+from app import app, cache, db
+from filtros import FiltroProtocolos
+from metricas import coletor
+from models import ProtocoloStatsDiario
+from stats_diario import SEM_DATA
+
+# Namespace das respostas do dashboard no cache versionado
+NAMESPACE_CACHE = 'dashboard'
+
+STATUS_FINALIZADOS = ('Finalizado', 'Concluído')
+
+# Cartão "Novos": sem data inicial, considera os últimos dias
+DIAS_NOVOS_PADRAO = 7
+# Cartão "Pendentes antigos": abertos há mais de tantos dias
+DIAS_PENDENTE_ANTIGO = 15
+# Início do gráfico de evolução no período "todos"
+INICIO_EVOLUCAO = date(2025, 1, 1)
+
+# Campos de FiltroProtocolos que existem no consolidado (sem 'data': o período é tratado à parte)
+COLUNAS_CONSOLIDADO = {
+    'tipo': ProtocoloStatsDiario.tipo_requerimento,
+    'status': ProtocoloStatsDiario.status,
+    'lotacao': ProtocoloStatsDiario.lotacao,
+}
+
+
+def periodo_evolucao(periodo, hoje):
+    """Intervalo ``[inicio, fim)`` de datas do gráfico de evolução (fim None = sem limite)."""
+    if periodo == '7d':
+        return hoje - timedelta(days=7), None
+    if periodo == 'month':
+        inicio = hoje.replace(day=1)
+        return inicio, (inicio + timedelta(days=32)).replace(day=1)
+    if periodo == 'all':
+        return INICIO_EVOLUCAO, None
+    return hoje - timedelta(days=30), None
+
+
+def consulta(filtro, evolucao_periodo, hoje):
+    """A consulta ao consolidado de que ``estatisticas`` tira todos os números (sem executá-la)."""
+    data_inicio, data_fim = filtro.data_inicio, filtro.data_fim
+    consolidado = ProtocoloStatsDiario
+    data = consolidado.data
+    # Protocolos sem data ficam em SEM_DATA, que é menor que qualquer data real
+    com_data = data != SEM_DATA
+
+    # O período entra à parte: os cartões "Novos" e a evolução usam intervalos próprios
+    base = and_(true(), *filtro.condicoes(COLUNAS_CONSOLIDADO))
+
+    ate_fim = [com_data, data <= data_fim] if data_fim else []
+    no_periodo = and_(base, *([data >= data_inicio] if data_inicio else []), *ate_fim)
+    novos = and_(base, data >= (data_inicio or hoje - timedelta(days=DIAS_NOVOS_PADRAO)), *ate_fim)
+    # Os pendentes antigos não dependem dos filtros da tela
+    pendentes = and_(
+        com_data,
+        data <= hoje - timedelta(days=DIAS_PENDENTE_ANTIGO),
+        consolidado.status != '',
+        ~consolidado.status.in_(STATUS_FINALIZADOS),
+    )
+    evolucao_inicio, evolucao_fim = periodo_evolucao(evolucao_periodo, hoje)
+    na_evolucao = and_(base, data >= evolucao_inicio, *([data < evolucao_fim] if evolucao_fim else []))
+
+    soma = lambda condicao: func.coalesce(func.sum(consolidado.total).filter(condicao), 0)
+    return db.session.query(
+        consolidado.tipo_requerimento,
+        consolidado.status,
+        case((na_evolucao, data)).label('intervalo'),
+        func.sum(consolidado.total).label('total'),
+        soma(no_periodo).label('no_periodo'),
+        soma(novos).label('novos'),
+        soma(pendentes).label('pendentes'),
+    ).filter(
+        or_(no_periodo, novos, pendentes, na_evolucao)
+    ).group_by(consolidado.tipo_requerimento, consolidado.status, 'intervalo')
+
+
+def estatisticas(filtro=None, evolucao_periodo='30d', evolucao_agrupamento='day', hoje=None):
+    """Monta o dicionário devolvido por ``/protocolos/dashboard-stats``."""
+    hoje = hoje or date.today()
+    filtro = filtro or FiltroProtocolos()
+    linhas = consulta(filtro, evolucao_periodo, hoje).all()
+
+    novos_no_periodo = pendentes_antigos = total_finalizados = 0
+    por_tipo, por_status, evolucao = Counter(), Counter(), Counter()
+    for linha in linhas:
+        novos_no_periodo += linha.novos
+        pendentes_antigos += linha.pendentes
+        if linha.no_periodo:
+            if linha.tipo_requerimento:
+                por_tipo[linha.tipo_requerimento] += linha.no_periodo
+            if linha.status:
+                por_status[linha.status] += linha.no_periodo
+            if linha.status in STATUS_FINALIZADOS:
+                total_finalizados += linha.no_periodo
+        if linha.intervalo is not None:
+            # Só as linhas da evolução têm intervalo, então ``total`` é a contagem do gráfico
+            dia = linha.intervalo
+            evolucao[dia.replace(day=1) if evolucao_agrupamento == 'month' else dia] += linha.total
+
+    todos_tipos = [
+        {'tipo_requerimento': t, 'total': n}
+        for t, n in sorted(por_tipo.items(), key=lambda item: (-item[1], item[0]))
+    ]
+    return {
+        'novosNoPeriodo': novos_no_periodo,
+        'pendentesAntigos': pendentes_antigos,
+        'totalFinalizados': total_finalizados,
+        'topTipos': todos_tipos[:5],
+        'todosTipos': todos_tipos,
+        'statusProtocolos': [
+            {'status': s, 'total': n}
+            for s, n in sorted(por_status.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'evolucaoProtocolos': [
+            {'intervalo': intervalo.isoformat(), 'total': evolucao[intervalo]}
+            for intervalo in sorted(evolucao)
+        ],
+    }
+
+
+def estatisticas_em_cache(filtro, evolucao_periodo='30d', evolucao_agrupamento='day'):
+    """``estatisticas(...)`` servido do cache (ver DASHBOARD_CACHE_TTL)."""
+    # "hoje" entra na chave: os cartões e a evolução são relativos à data atual
+    hoje = date.today()
+    chave = json.dumps(
+        [hoje.isoformat(), filtro.para_dict(), evolucao_periodo, evolucao_agrupamento], sort_keys=True
+    )
+
+    def carregar():
+        with app.app_context():
+            return estatisticas(filtro, evolucao_periodo, evolucao_agrupamento, hoje=hoje)
+
+    return cache.obter_renovavel(
+        NAMESPACE_CACHE, chave, carregar,
+        ttl=app.config['DASHBOARD_CACHE_TTL'],
+        tolerancia=app.config['DASHBOARD_CACHE_TOLERANCIA'],
+    )
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_cache(session):
+    if session.info.pop('consolidado_alterado', False):
+        cache.invalidar(NAMESPACE_CACHE)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop('consolidado_alterado', None)
+
+
+@coletor
+def _metricas_cache():
+    for resultado, total in cache.contadores(NAMESPACE_CACHE).items():
+        yield ('protocolo_cache_requests_total', 'counter',
+               'Consultas ao cache de respostas por resultado (hit, stale, miss).',
+               {'cache': NAMESPACE_CACHE, 'resultado': resultado}, total)
@@ -0,0 +1,169 @@
+"""Pool de processos para trabalho pesado de CPU (bcrypt, layout de PDF).
+
+Os workers HTTP só esperam o resultado: o cálculo roda em um
+``ProcessPoolExecutor`` de tamanho fixo. Cada worker do gunicorn tem o seu
+pool, dimensionado com a sua fatia das CPUs (``servidor.processos_cpu_por_worker``),
+então o total de processos de CPU acompanha os núcleos e não cresce com a
+quantidade de workers. A fila é limitada: quando há mais tarefas esperando
+do que ``max_fila``, a chamada falha na hora com ``Sobrecarregado`` (a
+aplicação responde 503 com Retry-After) em vez de acumular requisições
+presas. Um lote (``mapear``) ocupa no máximo ``processos`` vagas, então
+não esgota a fila das chamadas interativas (login, PDF avulso).
+
+O pool é criado no primeiro uso de cada processo, depois do fork do
+gunicorn, com o contexto ``forkserver`` (``spawn`` onde não houver): os
+processos do pool não são cópias de um worker com vários threads, o que
+com ``fork`` pode herdar locks presos. Os módulos de ``preload`` são
+importados uma vez no servidor de fork e herdados por cada processo. Com
+``processos=0`` as funções rodam no próprio processo.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturoExpirado
+from concurrent.futures.process import BrokenProcessPool
+
+
+class Sobrecarregado(Exception):
+    """A fila do pool está cheia ou a tarefa não terminou a tempo."""
+
+
+def _contexto(preload):
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    contexto = multiprocessing.get_context('forkserver')
+    if preload:
+        contexto.set_forkserver_preload(list(preload))
+    return contexto
+
+
+def _aplicar(funcao, itens):
+    return [funcao(item) for item in itens]
+
+
+class ExecutorLimitado:
+    """``ProcessPoolExecutor`` com fila limitada e contadores para /metrics."""
+
+    def __init__(self, processos=None, max_fila=8, timeout=30, preload=()):
+        self.processos = (os.cpu_count() or 1) if processos is None else processos
+        self.max_fila = max_fila
+        self.timeout = timeout
+        self.preload = tuple(preload)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Tarefas submetidas e ainda não concluídas (em execução + na fila)
+        self.pendentes = 0
+        self.concluidas = 0
+        self.rejeitadas = 0
+
+    def _obter_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=self.processos, mp_context=_contexto(self.preload))
+            self._pid = os.getpid()
+        return self._pool
+
+    @property
+    def em_fila(self):
+        return max(0, self.pendentes - self.processos)
+
+    def _reservar(self, quantidade=1):
+        with self._lock:
+            if self.pendentes + quantidade > self.processos + self.max_fila and self.pendentes:
+                self.rejeitadas += 1
+                raise Sobrecarregado('Servidor ocupado; tente novamente em instantes.')
+            self.pendentes += quantidade
+            return self._obter_pool() if self.processos else None
+
+    def _liberar(self, quantidade=1):
+        with self._lock:
+            self.pendentes -= quantidade
+            self.concluidas += quantidade
+
+    def executar(self, funcao, *args):
+        """Executa ``funcao(*args)`` no pool e devolve o resultado (bloqueia até terminar).
+
+        ``funcao`` precisa ser uma função de módulo (é enviada ao processo por nome).
+        """
+        pool = self._reservar()
+        if pool is None:
+            try:
+                return funcao(*args)
+            finally:
+                self._liberar()
+        try:
+            futuro = self._submeter(pool, funcao, *args)
+        except BaseException:
+            self._liberar()
+            raise
+        # A vaga só é liberada quando a tarefa termina, mesmo que a espera expire antes
+        futuro.add_done_callback(lambda _: self._liberar())
+        try:
+            return self._resultado(futuro, self.timeout)
+        except FuturoExpirado:
+            raise Sobrecarregado('A tarefa demorou demais para ser executada.')
+
+    def _submeter(self, pool, funcao, *args):
+        try:
+            return pool.submit(funcao, *args)
+        except BrokenProcessPool:
+            # Um processo do pool morreu: o próximo uso cria outro pool
+            self._pool = None
+            raise
+
+    def _resultado(self, futuro, timeout=None):
+        try:
+            return futuro.result(timeout=timeout)
+        except BrokenProcessPool:
+            self._pool = None
+            raise
+
+    def mapear(self, funcao, itens):
+        """Como ``map(funcao, itens)``, distribuindo os itens pelo pool (lotes grandes, ex.: PDFs)."""
+        itens = list(itens)
+        if not itens:
+            return []
+        if not self.processos or len(itens) == 1:
+            self._reservar()
+            try:
+                return _aplicar(funcao, itens)
+            finally:
+                self._liberar()
+
+        tamanho = max(1, len(itens) // (self.processos * 4))
+        partes = [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+        # O lote ocupa no máximo uma vaga por processo e mantém só essa quantidade de partes no
+        # pool: uma chamada interativa espera no máximo uma parte, não o lote inteiro
+        vagas = min(self.processos, len(partes))
+        pool = self._reservar(vagas)
+        futuros = []
+        try:
+            for parte in partes:
+                em_andamento = [futuro for futuro in futuros if not futuro.done()]
+                if len(em_andamento) >= vagas:
+                    wait(em_andamento, return_when=FIRST_COMPLETED)
+                futuros.append(self._submeter(pool, _aplicar, funcao, parte))
+            resultados = [resultado for futuro in futuros for resultado in self._resultado(futuro)]
+        except BaseException:
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+        finally:
+            # As vagas só voltam quando as partes já submetidas terminarem
+            pendentes = [futuro for futuro in futuros if not futuro.done()]
+            if pendentes:
+                restantes = [len(pendentes)]
+
+                def parte_concluida(_):
+                    with self._lock:
+                        restantes[0] -= 1
+                        terminou = restantes[0] == 0
+                    if terminou:
+                        self._liberar(vagas)
+
+                for futuro in pendentes:
+                    futuro.add_done_callback(parte_concluida)
+            else:
+                self._liberar(vagas)
+        return resultados
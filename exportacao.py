@@ -0,0 +1,98 @@
+"""Exportação dos protocolos para planilha (xlsx), CSV ou CSV compactado.
+
+As linhas são lidas do banco em lotes (``yield_per``) e só com as colunas
+exportadas, sem montar objetos ORM. O arquivo é escrito em um temporário
+em disco (o xlsx em modo write-only do openpyxl) e depois enviado em
+streaming, então a memória usada não depende da quantidade de protocolos.
+"""
+import csv
+import gzip
+import io
+import tempfile
+from datetime import date
+
+from openpyxl import Workbook
+
+from app import db
+from models import Protocolo
+
+# Linhas buscadas do banco por vez
+LOTE = 2000
+
+COLUNAS = [
+    ('Número', Protocolo.numero),
+    ('Matrícula', Protocolo.matricula),
+    ('Nome', Protocolo.nome),
+    ('Endereço', Protocolo.endereco),
+    ('Município', Protocolo.municipio),
+    ('Bairro', Protocolo.bairro),
+    ('CEP', Protocolo.cep),
+    ('Telefone', Protocolo.telefone),
+    ('CPF', Protocolo.cpf),
+    ('RG', Protocolo.rg),
+    ('Cargo', Protocolo.cargo),
+    ('Lotação', Protocolo.lotacao),
+    ('Unidade', Protocolo.unidade_exercicio),
+    ('Tipo de Requerimento', Protocolo.tipo_requerimento),
+    ('Requer ao', Protocolo.requer_ao),
+    ('Data Solicitação', Protocolo.data_solicitacao),
+    ('Observações', Protocolo.observacoes),
+    ('Status', Protocolo.status),
+    ('Responsável', Protocolo.responsavel),
+]
+
+# formato -> (mimetype, nome do arquivo)
+FORMATOS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'backup_protocolos.xlsx'),
+    'csv': ('text/csv', 'backup_protocolos.csv'),
+    'csv.gz': ('application/gzip', 'backup_protocolos.csv.gz'),
+}
+
+
+def linhas(filtros):
+    """Valores exportados de cada protocolo que atende ``filtros``, em ordem de número."""
+    query = db.session.query(*[coluna for _, coluna in COLUNAS]).filter(*filtros)\
+        .order_by(Protocolo.ano, Protocolo.sequencial, Protocolo.id)\
+        .execution_options(yield_per=LOTE)
+    for linha in query:
+        yield [valor.strftime('%Y-%m-%d') if isinstance(valor, date) else valor for valor in linha]
+
+
+def _gravar_xlsx(registros, destino):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Backup Protocolos')
+    sheet.append([titulo for titulo, _ in COLUNAS])
+    for linha in registros:
+        sheet.append(linha)
+    workbook.save(destino)
+
+
+def _gravar_csv(registros, destino):
+    # BOM e ';' para o Excel em português abrir o arquivo com acentos e colunas corretos
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    writer = csv.writer(texto, delimiter=';')
+    writer.writerow([titulo for titulo, _ in COLUNAS])
+    writer.writerows(registros)
+    texto.flush()
+    texto.detach()
+
+
+def exportar(filtros, formato):
+    """Grava a exportação em um arquivo temporário e o devolve posicionado no início."""
+    arquivo = tempfile.TemporaryFile()
+    try:
+        registros = linhas(filtros)
+        if formato == 'xlsx':
+            _gravar_xlsx(registros, arquivo)
+        elif formato == 'csv':
+            _gravar_csv(registros, arquivo)
+        elif formato == 'csv.gz':
+            with gzip.GzipFile(fileobj=arquivo, mode='wb', compresslevel=6) as compactado:
+                _gravar_csv(registros, compactado)
+        else:
+            raise ValueError(f'Formato de exportação inválido: {formato!r}')
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
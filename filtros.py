@@ -0,0 +1,115 @@
+"""Filtros de protocolos compartilhados pelas listagens, relatórios, exportações e dashboard.
+
+``FiltroProtocolos.de_args`` lê os parâmetros da requisição uma única vez
+(datas viram ``date``, textos perdem os espaços das pontas) e ``condicoes``
+monta as condições do SQLAlchemy com a mesma semântica em todas as telas:
+
+- número, nome e tipo: "contém", sem acentos (``busca.contem``);
+- status, lotação e responsável: igualdade (valores vindos de listas);
+- ``data_inicio`` e ``data_fim``: período inclusivo nas duas pontas.
+
+As condições saem sempre na mesma ordem e com os valores em parâmetros, de
+modo que consultas com o mesmo conjunto de filtros têm a mesma estrutura e
+reaproveitam o SQL já compilado do cache do SQLAlchemy, seja qual for a
+rota que as monta.
+"""
+import dataclasses
+from datetime import date, datetime
+
+import busca
+from models import Protocolo
+
+# Nomes aceitos nos parâmetros além dos próprios campos (usados pelo dashboard)
+SINONIMOS = {'dataInicio': 'data_inicio', 'dataFim': 'data_fim'}
+
+# Colunas de Protocolo de cada campo; 'data' atende data_inicio e data_fim
+COLUNAS = {
+    'numero': Protocolo.numero,
+    'nome': Protocolo.nome,
+    'tipo': Protocolo.tipo_requerimento,
+    'status': Protocolo.status,
+    'lotacao': Protocolo.lotacao,
+    'responsavel': Protocolo.responsavel,
+    'data': Protocolo.data_solicitacao,
+}
+
+_CONTEM = ('numero', 'nome', 'tipo')
+_IGUAL = ('status', 'lotacao', 'responsavel')
+
+
+def _texto(valor):
+    valor = str(valor).strip() if valor is not None else ''
+    return valor or None
+
+
+def _data(valor):
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.strptime(str(valor).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'Data inválida: {valor!r} (use AAAA-MM-DD).')
+
+
+@dataclasses.dataclass(frozen=True)
+class FiltroProtocolos:
+    """Filtros de pesquisa de protocolos; campos vazios não filtram."""
+
+    numero: str = None
+    nome: str = None
+    tipo: str = None
+    status: str = None
+    lotacao: str = None
+    responsavel: str = None
+    data_inicio: date = None
+    data_fim: date = None
+
+    @classmethod
+    def de_args(cls, args):
+        """Lê os filtros de ``request.args`` (ou de um dicionário); ``ValueError`` se uma data for inválida."""
+        valores = {}
+        for nome, valor in args.items():
+            nome = SINONIMOS.get(nome, nome)
+            if nome in ('data_inicio', 'data_fim'):
+                valores[nome] = _data(valor)
+            elif nome in _CONTEM or nome in _IGUAL:
+                valores[nome] = _texto(valor)
+        return cls(**valores)
+
+    def para_dict(self):
+        """Só os campos preenchidos, em texto: parâmetros de tarefas e chaves de cache."""
+        return {
+            campo.name: valor.isoformat() if isinstance(valor, date) else valor
+            for campo in dataclasses.fields(self)
+            if (valor := getattr(self, campo.name)) is not None
+        }
+
+    def condicoes(self, colunas=COLUNAS):
+        """Condições dos campos preenchidos, sempre na mesma ordem.
+
+        ``colunas`` permite aplicar os filtros a outra tabela (ex.: o
+        consolidado do dashboard); campos sem coluna correspondente são
+        ignorados, e as datas só filtram se houver a coluna ``'data'``.
+        """
+        condicoes = []
+        for campo in _CONTEM:
+            valor = getattr(self, campo)
+            if valor and campo in colunas:
+                condicoes.append(busca.contem(colunas[campo], valor))
+        for campo in _IGUAL:
+            valor = getattr(self, campo)
+            if valor and campo in colunas:
+                condicoes.append(colunas[campo] == valor)
+        if 'data' in colunas:
+            if self.data_inicio:
+                condicoes.append(colunas['data'] >= self.data_inicio)
+            if self.data_fim:
+                condicoes.append(colunas['data'] <= self.data_fim)
+        return condicoes
+
+    def aplicar(self, query):
+        return query.filter(*self.condicoes())
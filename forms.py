@@ -63,6 +63,15 @@ class AnexoForm(FlaskForm):
     ])
     submit_anexo = SubmitField('Enviar Anexo')
 
+class ImportarServidoresForm(FlaskForm):
+    """Formulário para importar a base de servidores (extração do RH)."""
+    arquivo = FileField('Arquivo CSV, XLSX ou JSONL', validators=[
+        FileRequired(message='Nenhum arquivo selecionado!'),
+        FileAllowed(['csv', 'xlsx', 'jsonl'], 'Envie um arquivo .csv, .xlsx ou .jsonl.')
+    ])
+    manter_ausentes = BooleanField('Manter servidores que não estão no arquivo')
+    submit_importacao = SubmitField('Importar Servidores')
+
 class AdminUserCreationForm(FlaskForm):
     """Formulário para administradores criarem usuários."""
     nome_completo = StringField('Nome Completo', validators=[DataRequired()])
@@ -0,0 +1,48 @@
+"""Configuração do gunicorn em produção (``gunicorn -c gunicorn.conf.py app:app``).
+
+Os valores vêm de variáveis de ambiente; ver servidor.py.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import servidor  # noqa: E402
+
+# Lida por servidor.processos_cpu_por_worker ao dimensionar o pool de CPU de cada worker
+os.environ[servidor.VARIAVEL_GUNICORN] = '1'
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = servidor.classe_worker()
+workers = servidor.workers()
+threads = servidor.threads()
+worker_connections = servidor.conexoes_gevent()
+preload_app = servidor.preload()
+
+# Recicla os workers periodicamente (vazamentos de memória de longo prazo);
+# o jitter evita que todos reiniciem ao mesmo tempo
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Com preload_app o mestre já importou a aplicação; conexões que ele tenha
+    # aberto não podem ser compartilhadas pelos workers
+    if 'app' in sys.modules:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Soma os contadores do worker que sai aos de /metrics (ver metricas.py)
+    if 'metricas' in sys.modules:
+        import metricas
+        metricas.encerrar()
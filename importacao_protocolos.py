@@ -0,0 +1,207 @@
+"""Importação em lote de protocolos (migração do sistema antigo ou lotes de outros órgãos).
+
+O arquivo (CSV, XLSX ou JSONL, ver planilhas.py) é lido em streaming e
+processado em lotes. Cada lote é validado no pool de CPU (executor.py),
+dividido em uma parte por processo; as linhas válidas recebem número em
+bloco (``numeracao.reservar_sequenciais``) e entram com um INSERT de várias
+linhas em ``protocolos`` e outro no histórico, com um commit por lote.
+Números já existentes no arquivo (migração) são mantidos e o contador do
+ano avança até eles. Como os INSERTs em massa não passam pelos eventos do
+ORM, as variações do consolidado do dashboard são aplicadas aqui.
+
+Linhas rejeitadas vão para um relatório CSV com o número do registro, o
+motivo e os campos originais, que pode ser corrigido e importado de novo.
+"""
+import csv
+import itertools
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+import numeracao
+import planilhas
+import stats_diario
+from app import db, executor_cpu
+from models import HistoricoProtocolo, Protocolo, separar_numero
+
+CAMPOS = (
+    'numero', 'nome', 'matricula', 'endereco', 'municipio', 'bairro', 'cep', 'telefone', 'cpf', 'rg',
+    'cargo', 'lotacao', 'unidade_exercicio', 'tipo_requerimento', 'requer_ao', 'data_solicitacao',
+    'observacoes', 'responsavel', 'status',
+)
+
+# Nomes de cabeçalho aceitos além dos próprios nomes das colunas
+SINONIMOS = {
+    'protocolo': 'numero',
+    'requerente': 'nome',
+    'unidade_de_exercicio': 'unidade_exercicio',
+    'tipo': 'tipo_requerimento',
+    'data': 'data_solicitacao',
+}
+
+# Status padrão como no sistema antigo (o mesmo de criar_protocolo)
+STATUS_PADRAO = 'PROTOCOLO GERADO'
+
+FORMATOS_DATA = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+def _data(valor):
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto[:10], formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f'data_solicitacao inválida: {texto!r} (use AAAA-MM-DD ou DD/MM/AAAA).')
+
+
+def validar(registro):
+    """Converte um registro lido do arquivo nos valores do protocolo; ``ValueError`` se inválido."""
+    dados = {campo: planilhas.valor(registro.get(campo)) for campo in CAMPOS if campo != 'data_solicitacao'}
+    if not dados['nome']:
+        raise ValueError('nome é obrigatório.')
+    dados['data_solicitacao'] = _data(registro.get('data_solicitacao'))
+    if dados['numero']:
+        ano, sequencial = separar_numero(dados['numero'])
+        if not ano or not sequencial:
+            raise ValueError(f"numero fora do padrão NNNN/ANO: {dados['numero']!r}.")
+        dados['numero'] = numeracao.formatar_numero(sequencial, ano)
+    if dados['cpf'] and len([c for c in dados['cpf'] if c.isdigit()]) != 11:
+        raise ValueError(f"cpf deve ter 11 dígitos: {dados['cpf']!r}.")
+    return dados
+
+
+def _validar_parte(parte):
+    """Executada no pool de CPU: ``[(ordem, registro)]`` -> ``[(ordem, dados, erro)]``."""
+    validados = []
+    for ordem, registro in parte:
+        try:
+            validados.append((ordem, validar(registro), None))
+        except ValueError as e:
+            validados.append((ordem, None, str(e)))
+    return validados
+
+
+def _dividir(itens, partes):
+    tamanho = max(1, -(-len(itens) // partes))
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def _gravar(linhas, autor, origem):
+    """Insere as ``linhas`` já validadas e numeradas, com histórico e consolidado (sem commit)."""
+    ids = db.session.execute(
+        insert(Protocolo).returning(Protocolo.id, sort_by_parameter_order=True), linhas
+    ).scalars().all()
+    db.session.execute(insert(HistoricoProtocolo), [
+        {
+            'protocolo_id': protocolo_id,
+            'status': linha['status'],
+            'responsavel': autor,
+            'observacao': f'Protocolo importado de {origem}.',
+        }
+        for protocolo_id, linha in zip(ids, linhas)
+    ])
+
+    variacoes = Counter(
+        stats_diario.chave(l['data_solicitacao'], l['status'], l['tipo_requerimento'], l['lotacao']) for l in linhas
+    )
+    stats_diario.aplicar_variacoes(db.session.connection(), variacoes)
+    # Lido no commit para invalidar as respostas do dashboard em cache
+    db.session.info['consolidado_alterado'] = True
+
+
+def _importar_lote(validados, lote, autor, origem, vistos, rejeitar):
+    validos = []
+    for ordem, dados, erro in validados:
+        if erro:
+            rejeitar(ordem, lote[ordem], erro)
+        elif dados['numero'] and dados['numero'] in vistos:
+            rejeitar(ordem, lote[ordem], f"numero {dados['numero']} repetido no arquivo.")
+        else:
+            if dados['numero']:
+                vistos.add(dados['numero'])
+            validos.append((ordem, dados))
+
+    numeros = [dados['numero'] for _, dados in validos if dados['numero']]
+    existentes = set(db.session.execute(
+        select(Protocolo.numero).where(Protocolo.numero.in_(numeros))
+    ).scalars()) if numeros else set()
+
+    linhas = []
+    sem_numero = []
+    maiores = {}
+    hoje = datetime.now().date()
+    for ordem, dados in validos:
+        if dados['numero'] in existentes:
+            rejeitar(ordem, lote[ordem], f"numero {dados['numero']} já existe.")
+            continue
+        linha = {
+            **dados,
+            'data_solicitacao': dados['data_solicitacao'] or hoje,
+            'status': dados['status'] or STATUS_PADRAO,
+            'responsavel': dados['responsavel'] or autor,
+        }
+        if linha['numero']:
+            linha['ano'], linha['sequencial'] = separar_numero(linha['numero'])
+            maiores[linha['ano']] = max(maiores.get(linha['ano'], 0), linha['sequencial'])
+        else:
+            sem_numero.append(linha)
+        linhas.append((ordem, linha))
+
+    if not linhas:
+        return 0
+    try:
+        for ano, sequencial in maiores.items():
+            numeracao.garantir_minimo(ano, sequencial)
+        if sem_numero:
+            ano = hoje.year
+            for linha, sequencial in zip(sem_numero, numeracao.reservar_sequenciais(ano, len(sem_numero))):
+                linha['numero'] = numeracao.formatar_numero(sequencial, ano)
+                linha['ano'], linha['sequencial'] = ano, sequencial
+        _gravar([linha for _, linha in linhas], autor, origem)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for ordem, _ in linhas:
+            rejeitar(ordem, lote[ordem], f'Erro ao gravar o lote: {e}')
+        return 0
+    return len(linhas)
+
+
+def importar(arquivo, nome_arquivo, relatorio, autor, tamanho_lote=1000, encoding='utf-8-sig', progresso=None):
+    """Importa os protocolos de ``arquivo`` (binário), com um commit a cada ``tamanho_lote`` registros.
+
+    As linhas rejeitadas são escritas em CSV em ``relatorio`` (arquivo texto
+    aberto para escrita). ``autor`` é o login gravado no histórico e o
+    responsável dos protocolos que não trazem um. ``progresso``, se
+    informado, é chamado com o resultado parcial após cada lote. Devolve
+    ``{'lidos': ..., 'importados': ..., 'rejeitados': ...}``.
+    """
+    resultado = {'lidos': 0, 'importados': 0, 'rejeitados': 0}
+    escritor = csv.writer(relatorio)
+    escritor.writerow(('registro', 'erro') + CAMPOS)
+
+    def rejeitar(ordem, registro, erro):
+        escritor.writerow((ordem, erro) + tuple(registro.get(campo) for campo in CAMPOS))
+        resultado['rejeitados'] += 1
+
+    registros = enumerate(planilhas.ler_registros(arquivo, nome_arquivo, encoding, SINONIMOS), start=1)
+    vistos = set()
+    while True:
+        lote = dict(itertools.islice(registros, tamanho_lote))
+        if not lote:
+            break
+        resultado['lidos'] += len(lote)
+        partes = _dividir(list(lote.items()), executor_cpu.processos or 1)
+        validados = [item for parte in executor_cpu.mapear(_validar_parte, partes) for item in parte]
+        resultado['importados'] += _importar_lote(validados, lote, autor, nome_arquivo, vistos, rejeitar)
+        if progresso:
+            progresso(resultado)
+    return resultado
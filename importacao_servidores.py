@@ -0,0 +1,104 @@
+"""Importação da base de servidores (extração do RH) em CSV, XLSX ou JSONL.
+
+O arquivo é lido em streaming (planilhas.py), convertido para CSV em um
+arquivo temporário e carregado com ``COPY`` em uma tabela temporária. A partir dela, um único upsert por matrícula insere os
+novos servidores e atualiza apenas as linhas que mudaram, e um DELETE
+remove os que saíram da extração. Tudo acontece em uma transação: as
+consultas de servidores continuam lendo a versão anterior até o commit.
+
+Requer PostgreSQL (``COPY`` e ``xmax`` para separar inserções de atualizações).
+"""
+import csv
+import tempfile
+
+from sqlalchemy import text
+
+import planilhas
+from app import cache, db
+from planilhas import ArquivoInvalido
+
+COLUNAS = ('matricula', 'nome', 'lotacao', 'cargo', 'unidade_de_exercicio')
+
+# Nomes de cabeçalho aceitos além dos próprios nomes das colunas
+SINONIMOS = {
+    'unidade_exercicio': 'unidade_de_exercicio',
+    'unidade': 'unidade_de_exercicio',
+    'nome_servidor': 'nome',
+}
+
+_CRIAR_TEMPORARIA = text(
+    "CREATE TEMP TABLE servidores_importacao ("
+    " linha bigserial, matricula text, nome text, lotacao text, cargo text, unidade_de_exercicio text"
+    ") ON COMMIT DROP"
+)
+
+# Na mesma matrícula repetida no arquivo, vale a última linha
+_UPSERT = text(
+    "INSERT INTO servidores (matricula, nome, lotacao, cargo, unidade_de_exercicio) "
+    "SELECT DISTINCT ON (matricula) matricula, nome, lotacao, cargo, unidade_de_exercicio "
+    "FROM servidores_importacao ORDER BY matricula, linha DESC "
+    "ON CONFLICT (matricula) DO UPDATE SET "
+    "nome = excluded.nome, lotacao = excluded.lotacao, cargo = excluded.cargo, "
+    "unidade_de_exercicio = excluded.unidade_de_exercicio "
+    "WHERE (servidores.nome, servidores.lotacao, servidores.cargo, servidores.unidade_de_exercicio) "
+    "IS DISTINCT FROM (excluded.nome, excluded.lotacao, excluded.cargo, excluded.unidade_de_exercicio) "
+    "RETURNING (xmax = 0) AS inserido"
+)
+
+_REMOVER_AUSENTES = text(
+    "DELETE FROM servidores s WHERE NOT EXISTS "
+    "(SELECT 1 FROM servidores_importacao i WHERE i.matricula = s.matricula)"
+)
+
+
+def ler(arquivo, nome_arquivo, encoding='utf-8-sig'):
+    """Gera tuplas na ordem de ``COLUNAS`` a partir de um CSV, XLSX ou JSONL."""
+    registros = planilhas.ler_registros(arquivo, nome_arquivo, encoding, SINONIMOS)
+    for registro in registros:
+        if 'matricula' not in registro:
+            raise ArquivoInvalido('O arquivo precisa de uma coluna "matricula".')
+        yield tuple(planilhas.valor(registro.get(coluna)) for coluna in COLUNAS)
+
+
+def importar(arquivo, nome_arquivo, remover_ausentes=True, encoding='utf-8-sig'):
+    """Sincroniza ``servidores`` com o arquivo e faz commit.
+
+    Devolve um dicionário com as quantidades ``lidos``, ``ignorados`` (sem
+    matrícula), ``inseridos``, ``atualizados`` e ``removidos``.
+    """
+    resultado = {'lidos': 0, 'ignorados': 0, 'inseridos': 0, 'atualizados': 0, 'removidos': 0}
+
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as dados:
+        escritor = csv.writer(dados)
+        for linha in ler(arquivo, nome_arquivo, encoding):
+            if not linha[0]:
+                resultado['ignorados'] += 1
+                continue
+            escritor.writerow(linha)
+            resultado['lidos'] += 1
+        if not resultado['lidos']:
+            raise ArquivoInvalido('Nenhum servidor com matrícula encontrado no arquivo.')
+        dados.seek(0)
+
+        conexao = db.session.connection()
+        if conexao.dialect.name != 'postgresql':
+            raise RuntimeError('A importação de servidores requer PostgreSQL.')
+        try:
+            conexao.execute(_CRIAR_TEMPORARIA)
+            with conexao.connection.driver_connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY servidores_importacao ({', '.join(COLUNAS)}) FROM STDIN WITH (FORMAT csv)", dados
+                )
+            inseridos = conexao.execute(_UPSERT).scalars().all()
+            resultado['inseridos'] = sum(1 for inserido in inseridos if inserido)
+            resultado['atualizados'] = len(inseridos) - resultado['inseridos']
+            if remover_ausentes:
+                resultado['removidos'] = conexao.execute(_REMOVER_AUSENTES).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # A versão do namespace faz parte da assinatura do índice de busca: todos os workers o recarregam
+    cache.invalidar('servidores')
+    return resultado
@@ -0,0 +1,226 @@
+"""Instrumentação das requisições: tempo, SQL, bytes e memória por rota.
+
+Ativada com ``INSTRUMENTACAO=1``. Para cada requisição mede o tempo total,
+a quantidade e o tempo das consultas SQL (eventos do engine do SQLAlchemy)
+e o tamanho da resposta; com ``INSTRUMENTACAO_MEMORIA=1`` mede também o pico
+de memória alocada (tracemalloc, que deixa o processo mais lento e é global
+ao processo: com várias threads o pico inclui as requisições concorrentes).
+Os totais por rota saem em /metrics, somados entre os workers (ver
+metricas.py); requisições acima de
+``INSTRUMENTACAO_LENTA_MS`` são registradas no log e a resposta traz um
+cabeçalho ``Server-Timing``.
+
+Independente disso, um administrador pode pedir o perfil de uma única
+requisição acrescentando ``_perfil=cprofile`` (ou ``_perfil=pyinstrument``,
+se o pacote estiver instalado) à URL: a resposta é substituída pelo relatório.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+from flask import Response, abort, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metricas
+from app import app
+
+LIMITES_DURACAO = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_rotas = {}
+
+# Um perfil por vez: o cProfile do Python 3.12+ não admite dois ativos no processo
+_lock_perfil = threading.Lock()
+
+
+class _Rota:
+    __slots__ = ('requisicoes', 'segundos', 'buckets', 'consultas', 'segundos_sql', 'bytes', 'pico_memoria')
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.segundos = 0.0
+        self.buckets = [0] * len(LIMITES_DURACAO)
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.bytes = 0
+        self.pico_memoria = 0
+
+
+def _registrar(chave, duracao, consultas, segundos_sql, tamanho, pico):
+    with _lock:
+        rota = _rotas.get(chave)
+        if rota is None:
+            rota = _rotas[chave] = _Rota()
+        rota.requisicoes += 1
+        rota.segundos += duracao
+        for i, limite in enumerate(LIMITES_DURACAO):
+            if duracao <= limite:
+                rota.buckets[i] += 1
+        rota.consultas += consultas
+        rota.segundos_sql += segundos_sql
+        rota.bytes += tamanho or 0
+        rota.pico_memoria = max(rota.pico_memoria, pico or 0)
+
+
+# --- Medição das consultas ---
+
+# O início fica no contexto de execução do comando, e não na conexão: se o comando
+# falhar, after_cursor_execute não é chamado e nada sobra para as próximas medições
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentacao_inicio = time.perf_counter()
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_instrumentacao_inicio', None)
+    if inicio is None:
+        return
+    # Consultas fora de uma requisição (worker, comandos) não são contadas
+    if has_request_context() and 'instrumentacao' in g:
+        g.instrumentacao['consultas'] += 1
+        g.instrumentacao['segundos_sql'] += time.perf_counter() - inicio
+
+
+# --- Ciclo da requisição ---
+
+def _iniciar_medicao():
+    g.instrumentacao = {'inicio': time.perf_counter(), 'consultas': 0, 'segundos_sql': 0.0}
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def _encerrar_medicao(response):
+    medicao = g.pop('instrumentacao', None)
+    if medicao is None:
+        return response
+    duracao = time.perf_counter() - medicao['inicio']
+    pico = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    chave = (request.endpoint or 'desconhecido', request.method, f'{response.status_code // 100}xx')
+    # Respostas em streaming não têm tamanho conhecido aqui
+    _registrar(chave, duracao, medicao['consultas'], medicao['segundos_sql'], response.content_length, pico)
+
+    response.headers['Server-Timing'] = (
+        f"app;dur={duracao * 1000:.1f}, db;dur={medicao['segundos_sql'] * 1000:.1f};desc=\"{medicao['consultas']} consultas\""
+    )
+    if duracao * 1000 >= app.config['INSTRUMENTACAO_LENTA_MS']:
+        app.logger.warning(
+            f"Requisição lenta: {request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+            f"em {duracao * 1000:.0f} ms; {medicao['consultas']} consultas SQL ({medicao['segundos_sql'] * 1000:.0f} ms)"
+        )
+    return response
+
+
+# --- Perfil sob demanda ---
+
+def _iniciar_perfil():
+    tipo = request.args.get('_perfil')
+    if not tipo:
+        return
+    if not current_user.is_authenticated or current_user.tipo != 'admin':
+        abort(403)
+    if tipo not in ('cprofile', 'pyinstrument'):
+        abort(400, description="Use _perfil=cprofile ou _perfil=pyinstrument.")
+    if not _lock_perfil.acquire(blocking=False):
+        abort(409, description='Já há um perfil em andamento; tente novamente.')
+    try:
+        if tipo == 'pyinstrument':
+            try:
+                import pyinstrument  # Dependência opcional, necessária apenas para este perfil
+            except ImportError:
+                abort(400, description='pyinstrument não está instalado; use _perfil=cprofile.')
+            perfil = pyinstrument.Profiler()
+            perfil.start()
+        else:
+            perfil = cProfile.Profile()
+            perfil.enable()
+    except BaseException:
+        _lock_perfil.release()
+        raise
+    g.perfil = (tipo, perfil)
+
+
+def _parar_perfil():
+    tipo, perfil = g.pop('perfil')
+    try:
+        if tipo == 'pyinstrument':
+            perfil.stop()
+        else:
+            perfil.disable()
+    finally:
+        _lock_perfil.release()
+    return tipo, perfil
+
+
+def _relatorio_perfil(response):
+    if 'perfil' not in g:
+        return response
+    tipo, perfil = _parar_perfil()
+    if tipo == 'pyinstrument':
+        return Response(perfil.output_html(), mimetype='text/html')
+    saida = io.StringIO()
+    saida.write(f'{request.method} {request.full_path} -> {response.status_code}\n\n')
+    pstats.Stats(perfil, stream=saida).strip_dirs().sort_stats('cumulative').print_stats(60)
+    return Response(saida.getvalue(), mimetype='text/plain')
+
+
+@app.teardown_request
+def _descartar_perfil(exc):
+    # Requisição interrompida por exceção antes do after_request
+    if 'perfil' in g:
+        _parar_perfil()
+
+
+@app.before_request
+def _antes_da_requisicao():
+    _iniciar_perfil()
+    if app.config['INSTRUMENTACAO']:
+        _iniciar_medicao()
+
+
+@app.after_request
+def _depois_da_requisicao(response):
+    response = _relatorio_perfil(response)
+    if app.config['INSTRUMENTACAO']:
+        response = _encerrar_medicao(response)
+    return response
+
+
+if app.config['INSTRUMENTACAO']:
+    event.listen(Engine, 'before_cursor_execute', _antes_da_consulta)
+    event.listen(Engine, 'after_cursor_execute', _depois_da_consulta)
+    if app.config['INSTRUMENTACAO_MEMORIA'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# O pico de memória é o maior entre os processos, não a soma
+metricas.agregar_por_maximo('protocolo_http_memoria_pico_bytes')
+
+
+@metricas.coletor_por_processo
+def _metricas_requisicoes():
+    with _lock:
+        rotas = [(chave, rota.requisicoes, rota.segundos, list(rota.buckets), rota.consultas,
+                  rota.segundos_sql, rota.bytes, rota.pico_memoria) for chave, rota in _rotas.items()]
+    for (endpoint, metodo, status), requisicoes, segundos, buckets, consultas, segundos_sql, tamanho, pico in rotas:
+        rotulos = {'endpoint': endpoint, 'metodo': metodo, 'status': status}
+        ajuda = 'Duração das requisições HTTP em segundos.'
+        for limite, quantidade in zip(LIMITES_DURACAO, buckets):
+            yield ('protocolo_http_duracao_segundos_bucket', 'histogram', ajuda, {**rotulos, 'le': limite}, quantidade)
+        yield ('protocolo_http_duracao_segundos_bucket', 'histogram', ajuda, {**rotulos, 'le': '+Inf'}, requisicoes)
+        yield ('protocolo_http_duracao_segundos_sum', 'histogram', ajuda, rotulos, segundos)
+        yield ('protocolo_http_duracao_segundos_count', 'histogram', ajuda, rotulos, requisicoes)
+        yield ('protocolo_http_sql_consultas_total', 'counter',
+               'Consultas SQL executadas durante as requisições.', rotulos, consultas)
+        yield ('protocolo_http_sql_segundos_total', 'counter',
+               'Tempo gasto em consultas SQL durante as requisições.', rotulos, segundos_sql)
+        yield ('protocolo_http_resposta_bytes_total', 'counter',
+               'Bytes enviados nas respostas de tamanho conhecido.', rotulos, tamanho)
+        if tracemalloc.is_tracing():
+            yield ('protocolo_http_memoria_pico_bytes', 'gauge',
+                   'Maior pico de memória alocada durante uma requisição.', rotulos, pico)
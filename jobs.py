@@ -0,0 +1,193 @@
+"""Fila de tarefas em segundo plano (exportações e PDFs).
+
+As tarefas ficam na tabela ``jobs``. A web só enfileira e consulta o
+status, então uma exportação grande não prende um worker do gunicorn;
+``flask worker`` roda um ou mais processos que reivindicam a próxima
+tarefa pendente, executam a função registrada para o tipo (``@tarefa``) e
+guardam o arquivo gerado no storage de resultados. Não há broker externo:
+a própria tabela é a fila (``FOR UPDATE SKIP LOCKED`` no PostgreSQL, e um
+UPDATE condicional garante que só um processo fique com cada tarefa).
+
+Cada processo worker dá sinal de vida no cache compartilhado
+(``worker_ativo``); sem um worker ativo, as telas usam os links síncronos
+em vez de enfileirar tarefas que ninguém executaria.
+"""
+import multiprocessing
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, or_
+
+from app import app, cache, db, storage_jobs
+from models import Job
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+# Tarefas interrompidas (processo morto) são retomadas até este número de vezes
+MAX_TENTATIVAS = 3
+
+# Um worker sem sinal de vida há mais que isto (segundos) é considerado parado
+VALIDADE_SINAL = 60
+NAMESPACE_CACHE = 'jobs'
+
+_tarefas = {}
+
+
+def tarefa(tipo):
+    """Registra a função que executa as tarefas de ``tipo``.
+
+    A função recebe os parâmetros do job e devolve ``(arquivo, nome, mimetype)``,
+    com ``arquivo`` aberto para leitura binária.
+    """
+    def registrar(funcao):
+        _tarefas[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+def enfileirar(tipo, parametros, usuario_id=None):
+    if tipo not in _tarefas:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo!r}')
+    job = Job(tipo=tipo, parametros=parametros, usuario_id=usuario_id, status=PENDENTE)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def reivindicar():
+    """Marca a próxima tarefa disponível como em execução e a devolve (None se não houver)."""
+    abandonada = _agora() - timedelta(seconds=app.config['JOBS_TIMEOUT'])
+    disponivel = or_(
+        Job.status == PENDENTE,
+        and_(Job.status == EXECUTANDO, Job.iniciado_em < abandonada),
+    )
+    job_id = db.session.query(Job.id).filter(disponivel).order_by(Job.id)\
+        .with_for_update(skip_locked=True).limit(1).scalar()
+    if job_id is None:
+        db.session.rollback()
+        return None
+
+    atualizados = db.session.query(Job).filter(Job.id == job_id, disponivel).update({
+        'status': EXECUTANDO,
+        'iniciado_em': _agora(),
+        'tentativas': Job.tentativas + 1,
+    }, synchronize_session=False)
+    db.session.commit()
+    # Outro processo pode ter ficado com a tarefa entre o SELECT e o UPDATE
+    return db.session.get(Job, job_id) if atualizados else None
+
+
+def executar(job):
+    try:
+        if job.tentativas > MAX_TENTATIVAS:
+            raise RuntimeError('Tarefa interrompida repetidas vezes; abandonada.')
+        funcao = _tarefas.get(job.tipo)
+        if funcao is None:
+            raise ValueError(f'Tipo de tarefa desconhecido: {job.tipo!r}')
+        arquivo, nome, mimetype = funcao(job.parametros)
+        with arquivo:
+            chave, tamanho, _ = storage_jobs.save(arquivo)
+        job.status = CONCLUIDO
+        job.resultado_chave = chave
+        job.resultado_nome = nome
+        job.resultado_mime = mimetype
+        job.resultado_tamanho = tamanho
+    except Exception as e:
+        app.logger.exception(f'Erro ao executar a tarefa {job.id} ({job.tipo})')
+        db.session.rollback()
+        job.status = ERRO
+        job.erro = str(e)[:1000]
+    job.concluido_em = _agora()
+    db.session.commit()
+
+
+def limpar_antigos():
+    """Remove as tarefas encerradas há mais de JOBS_RETENCAO_HORAS e seus arquivos."""
+    limite = _agora() - timedelta(hours=app.config['JOBS_RETENCAO_HORAS'])
+    antigos = db.session.query(Job.id, Job.resultado_chave).filter(
+        Job.status.in_([CONCLUIDO, ERRO]), Job.concluido_em < limite
+    ).all()
+    if not antigos:
+        return 0
+    db.session.query(Job).filter(Job.id.in_([j.id for j in antigos])).delete(synchronize_session=False)
+    db.session.commit()
+    # Os resultados são endereçados pelo conteúdo: só apaga o que nenhuma outra tarefa usa
+    for chave in {j.resultado_chave for j in antigos if j.resultado_chave}:
+        if not db.session.query(Job.id).filter(Job.resultado_chave == chave).first():
+            storage_jobs.delete(chave)
+    return len(antigos)
+
+
+def worker_ativo():
+    """Se algum processo de ``flask worker`` deu sinal de vida nos últimos VALIDADE_SINAL segundos.
+
+    Depende de um cache compartilhado entre os processos ('arquivo' ou
+    'redis'); com 'memoria' o worker nunca é visto e tudo roda síncrono.
+    """
+    return cache.buscar(NAMESPACE_CACHE, 'worker', ttl=VALIDADE_SINAL) is not None
+
+
+def _sinalizar(parado):
+    # Em um thread, para o sinal continuar enquanto uma tarefa longa executa
+    while not parado.is_set():
+        try:
+            cache.guardar(NAMESPACE_CACHE, 'worker', time.time(), ttl=VALIDADE_SINAL)
+        except Exception:
+            app.logger.exception('Erro ao registrar o sinal de vida do worker')
+        parado.wait(VALIDADE_SINAL / 3)
+
+
+def processar(intervalo=2.0):
+    """Laço de um processo worker: executa tarefas até receber SIGTERM/SIGINT."""
+    parar = []
+    signal.signal(signal.SIGTERM, lambda *_: parar.append(True))
+    signal.signal(signal.SIGINT, lambda *_: parar.append(True))
+    parado = threading.Event()
+    threading.Thread(target=_sinalizar, args=(parado,), daemon=True).start()
+
+    with app.app_context():
+        # Conexões herdadas do processo pai (fork) não podem ser compartilhadas
+        db.engine.dispose(close=False)
+        ultima_limpeza = 0.0
+        while not parar:
+            job = reivindicar()
+            if job is not None:
+                executar(job)
+                db.session.remove()
+                continue
+            if time.monotonic() - ultima_limpeza > 3600:
+                limpar_antigos()
+                ultima_limpeza = time.monotonic()
+            db.session.remove()
+            time.sleep(intervalo)
+    parado.set()
+
+
+def iniciar_workers(processos=1, intervalo=2.0):
+    """Roda ``processos`` laços de ``processar`` e espera todos terminarem."""
+    if processos <= 1:
+        processar(intervalo)
+        return
+
+    filhos = [multiprocessing.Process(target=processar, args=(intervalo,), daemon=False) for _ in range(processos)]
+    for filho in filhos:
+        filho.start()
+
+    def repassar(signum, frame):
+        for filho in filhos:
+            if filho.is_alive():
+                filho.terminate()
+
+    signal.signal(signal.SIGTERM, repassar)
+    signal.signal(signal.SIGINT, repassar)
+    for filho in filhos:
+        filho.join()
@@ -0,0 +1,27 @@
+"""Estratégias de carregamento usadas pelas consultas de protocolos.
+
+As listagens trazem só as colunas exibidas nas tabelas; as telas de
+detalhe carregam o texto longo e os relacionamentos em poucas consultas
+(selectinload), evitando N+1 ao iterar anexos e histórico.
+"""
+from sqlalchemy.orm import load_only, selectinload, undefer_group
+
+from models import Protocolo
+
+# Colunas usadas por protocolos.html e relatorios.html, mais as da ordenação (cursores da paginação)
+LISTAGEM = (
+    load_only(
+        Protocolo.id, Protocolo.numero, Protocolo.nome, Protocolo.tipo_requerimento,
+        Protocolo.data_solicitacao, Protocolo.status, Protocolo.responsavel,
+        Protocolo.ano, Protocolo.sequencial
+    ),
+)
+
+# Todas as colunas do protocolo, inclusive o grupo 'texto' (endereço, observações...)
+COMPLETO = (undefer_group('texto'),)
+
+# Tela de detalhe: protocolo completo + anexos (sem o conteúdo) e histórico
+DETALHE = COMPLETO + (
+    selectinload(Protocolo.anexos),
+    selectinload(Protocolo.historico),
+)
@@ -0,0 +1,223 @@
+"""Métricas da aplicação no formato texto do Prometheus (rota /metrics).
+
+Cada módulo registra uma função que devolve amostras
+``(nome, tipo, ajuda, rotulos, valor)``; ``formatar`` agrupa as amostras
+por métrica e monta o texto da resposta. Nos histogramas as amostras usam os
+nomes com sufixo (``_bucket``, ``_sum``, ``_count``) e o cabeçalho sai uma
+vez, com o nome base.
+
+Há dois tipos de coletor:
+
+- ``@coletor``: valores que já são os mesmos em todos os processos (ex.: os
+  contadores do cache compartilhado), lidos na hora do /metrics;
+- ``@coletor_por_processo``: valores mantidos na memória de cada processo
+  (requisições por rota, pool de CPU). Com ``configurar(diretorio)``, cada
+  processo grava as suas amostras em ``<pid>.json`` nesse diretório (no
+  máximo a cada ``INTERVALO_PUBLICACAO`` segundos, ver ``publicar_se_devido``)
+  e o /metrics soma os arquivos de todos, como o modo multiprocess do
+  prometheus_client: o scrape pode cair em qualquer worker do gunicorn e os
+  totais são os mesmos. Contadores e histogramas somam todos os processos que
+  já existiram; gauges, só os vivos (ou o maior valor, para os nomes de
+  ``agregar_por_maximo``). Os arquivos de processos encerrados têm os
+  contadores somados a ``acumulado.json`` e são apagados.
+
+O diretório é local da máquina (os pids identificam os processos).
+"""
+import contextlib
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+
+# Intervalo (segundos) entre as gravações das amostras de cada processo no diretório
+INTERVALO_PUBLICACAO = 10
+
+_SUFIXOS_HISTOGRAMA = re.compile(r'_(bucket|sum|count)$')
+_ARQUIVO_PROCESSO = re.compile(r'^(\d+)\.json$')
+_ACUMULADO = 'acumulado.json'
+# Tipos que continuam valendo depois que o processo termina
+_CUMULATIVOS = ('counter', 'histogram')
+
+_coletores = []
+_coletores_processo = []
+_maximos = set()
+_estado = {'diretorio': None, 'pid': None, 'ultima': 0.0}
+_lock = threading.Lock()
+
+
+def coletor(funcao):
+    """Registra ``funcao`` como fonte de amostras para /metrics."""
+    _coletores.append(funcao)
+    return funcao
+
+
+def coletor_por_processo(funcao):
+    """Registra ``funcao`` como fonte de amostras deste processo, somadas às dos demais."""
+    _coletores_processo.append(funcao)
+    return funcao
+
+
+def agregar_por_maximo(nome):
+    """Gauges ``nome`` dos vários processos são combinados pelo maior valor, e não pela soma."""
+    _maximos.add(nome)
+
+
+def configurar(diretorio):
+    """Ativa a soma das amostras por processo através de ``diretorio``."""
+    os.makedirs(diretorio, exist_ok=True)
+    _estado['diretorio'] = diretorio
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def _travado(diretorio):
+    with open(os.path.join(diretorio, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _ler(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _gravar(caminho, amostras):
+    tmp = f'{caminho}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(amostras, f)
+    os.replace(tmp, caminho)
+
+
+def _amostras_locais():
+    return [
+        [nome, tipo, ajuda, {rotulo: str(valor) for rotulo, valor in rotulos.items()}, valor]
+        for coletar in _coletores_processo
+        for nome, tipo, ajuda, rotulos, valor in coletar()
+    ]
+
+
+def _somar(destino, amostras, tipos=None):
+    """Acrescenta ``amostras`` a ``destino`` (``{chave: amostra}``), somando as repetidas."""
+    for nome, tipo, ajuda, rotulos, valor in amostras:
+        if tipos is not None and tipo not in tipos:
+            continue
+        chave = (nome, tuple(sorted(rotulos.items())))
+        atual = destino.get(chave)
+        if atual is None:
+            destino[chave] = [nome, tipo, ajuda, rotulos, valor]
+        elif nome in _maximos:
+            atual[4] = max(atual[4], valor)
+        else:
+            atual[4] += valor
+
+
+def _incorporar(diretorio, pid):
+    """Soma os contadores do arquivo de ``pid`` ao acumulado e apaga o arquivo (chamar travado)."""
+    caminho = os.path.join(diretorio, f'{pid}.json')
+    if not os.path.exists(caminho):
+        return
+    acumulado = {}
+    _somar(acumulado, _ler(os.path.join(diretorio, _ACUMULADO)))
+    _somar(acumulado, _ler(caminho), _CUMULATIVOS)
+    _gravar(os.path.join(diretorio, _ACUMULADO), list(acumulado.values()))
+    os.remove(caminho)
+
+
+def publicar():
+    """Grava no diretório as amostras deste processo."""
+    diretorio = _estado['diretorio']
+    if diretorio is None:
+        return
+    pid = os.getpid()
+    amostras = _amostras_locais()
+    with _lock, _travado(diretorio):
+        if _estado['pid'] != pid:
+            # Primeira publicação do processo: um arquivo com o mesmo pid é de um processo que já terminou
+            _estado['pid'] = pid
+            _incorporar(diretorio, pid)
+        _estado['ultima'] = time.monotonic()
+        _gravar(os.path.join(diretorio, f'{pid}.json'), amostras)
+
+
+def publicar_se_devido():
+    if _estado['diretorio'] is not None and time.monotonic() - _estado['ultima'] >= INTERVALO_PUBLICACAO:
+        publicar()
+
+
+def encerrar():
+    """Soma os contadores deste processo ao acumulado e remove o seu arquivo (fim do worker).
+
+    Depois disso o processo não publica mais, para não contar de novo o que já foi somado.
+    """
+    diretorio = _estado['diretorio']
+    if diretorio is None:
+        return
+    publicar()
+    with _lock, _travado(diretorio):
+        _incorporar(diretorio, os.getpid())
+        _estado['diretorio'] = None
+
+
+def _amostras_por_processo():
+    diretorio = _estado['diretorio']
+    if diretorio is None:
+        return _amostras_locais()
+    publicar()
+    somadas = {}
+    with _travado(diretorio):
+        arquivos = []
+        for arquivo in sorted(os.listdir(diretorio)):
+            correspondencia = _ARQUIVO_PROCESSO.match(arquivo)
+            if not correspondencia:
+                continue
+            pid = int(correspondencia.group(1))
+            if _vivo(pid):
+                arquivos.append(arquivo)
+            else:
+                _incorporar(diretorio, pid)
+        _somar(somadas, _ler(os.path.join(diretorio, _ACUMULADO)))
+        for arquivo in arquivos:
+            _somar(somadas, _ler(os.path.join(diretorio, arquivo)))
+    return list(somadas.values())
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ''
+    pares = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for nome, valor in sorted(rotulos.items())
+    )
+    return '{' + pares + '}'
+
+
+def formatar():
+    metricas = {}
+    amostras = [amostra for coletar in _coletores for amostra in coletar()]
+    amostras.extend(_amostras_por_processo())
+    for nome, tipo, ajuda, rotulos, valor in amostras:
+        familia = _SUFIXOS_HISTOGRAMA.sub('', nome) if tipo == 'histogram' else nome
+        metrica = metricas.setdefault(familia, {'tipo': tipo, 'ajuda': ajuda, 'amostras': []})
+        metrica['amostras'].append((nome, rotulos, round(valor, 6) if isinstance(valor, float) else valor))
+
+    linhas = []
+    for nome, metrica in metricas.items():
+        linhas.append(f"# HELP {nome} {metrica['ajuda']}")
+        linhas.append(f"# TYPE {nome} {metrica['tipo']}")
+        for nome_amostra, rotulos, valor in metrica['amostras']:
+            linhas.append(f'{nome_amostra}{_formatar_rotulos(rotulos)} {valor}')
+    return '\n'.join(linhas) + '\n'
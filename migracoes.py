@@ -0,0 +1,127 @@
+"""Aplicação das migrações SQL versionadas em migrations/.
+
+Cada arquivo ``NNNN_descricao.sql`` é aplicado uma vez, em ordem, e
+registrado em ``schema_migrations``. Um arquivo roda inteiro em uma
+transação, exceto se a primeira linha for ``-- sem-transacao``: nesse caso
+cada comando (terminado em ``;`` no fim da linha) roda em autocommit, o que
+é necessário para ``CREATE INDEX CONCURRENTLY``, que não bloqueia as
+gravações na tabela enquanto o índice é criado.
+
+Um advisory lock impede que dois processos (ex.: duas instâncias subindo
+ao mesmo tempo) apliquem migrações simultaneamente.
+"""
+import os
+import re
+
+from app import app, db
+
+PASTA = os.path.join(app.root_path, 'migrations')
+MARCA_SEM_TRANSACAO = '-- sem-transacao'
+# Chave arbitrária do pg_advisory_lock reservada para as migrações
+CHAVE_LOCK = 72_240_001
+
+_NOME_ARQUIVO = re.compile(r'^(\d{4})_.+\.sql$')
+
+_CRIAR_TABELA = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    " versao TEXT PRIMARY KEY,"
+    " arquivo TEXT NOT NULL,"
+    " aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()"
+    ")"
+)
+
+
+def arquivos():
+    """``[(versao, arquivo)]`` de todas as migrações, em ordem."""
+    encontrados = []
+    for arquivo in sorted(os.listdir(PASTA)):
+        correspondencia = _NOME_ARQUIVO.match(arquivo)
+        if correspondencia:
+            encontrados.append((correspondencia.group(1), arquivo))
+    return encontrados
+
+
+def _comandos(sql):
+    """Separa o SQL em comandos terminados por ``;`` no fim da linha (só para arquivos sem transação)."""
+    comandos, atual = [], []
+    for linha in sql.splitlines():
+        if not atual and (not linha.strip() or linha.strip().startswith('--')):
+            continue
+        atual.append(linha)
+        if linha.rstrip().endswith(';'):
+            comandos.append('\n'.join(atual))
+            atual = []
+    if any(linha.strip() and not linha.strip().startswith('--') for linha in atual):
+        comandos.append('\n'.join(atual))
+    return comandos
+
+
+class Migrador:
+    """Conexão dedicada do psycopg2 (fora da sessão do SQLAlchemy) usada para migrar."""
+
+    def __init__(self):
+        self._conexao = db.engine.raw_connection()
+        self._bruta = self._conexao.driver_connection
+        self._bruta.autocommit = True
+        with self._bruta.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', (CHAVE_LOCK,))
+            cursor.execute(_CRIAR_TABELA)
+
+    def fechar(self):
+        try:
+            with self._bruta.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (CHAVE_LOCK,))
+        finally:
+            # A conexão volta ao pool da aplicação: sem isso, quem a pegasse depois rodaria sem transações
+            self._bruta.autocommit = False
+            self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def aplicadas(self):
+        with self._bruta.cursor() as cursor:
+            cursor.execute('SELECT versao FROM schema_migrations')
+            return {versao for versao, in cursor.fetchall()}
+
+    def pendentes(self):
+        aplicadas = self.aplicadas()
+        return [(versao, arquivo) for versao, arquivo in arquivos() if versao not in aplicadas]
+
+    def _registrar(self, cursor, versao, arquivo):
+        cursor.execute(
+            'INSERT INTO schema_migrations (versao, arquivo) VALUES (%s, %s) ON CONFLICT (versao) DO NOTHING',
+            (versao, arquivo),
+        )
+
+    def aplicar(self, versao, arquivo):
+        with open(os.path.join(PASTA, arquivo), encoding='utf-8') as f:
+            sql = f.read()
+
+        if sql.lstrip().startswith(MARCA_SEM_TRANSACAO):
+            # Comandos idempotentes (IF NOT EXISTS): se falhar no meio, basta rodar de novo
+            with self._bruta.cursor() as cursor:
+                for comando in _comandos(sql):
+                    cursor.execute(comando)
+                self._registrar(cursor, versao, arquivo)
+            return
+
+        self._bruta.autocommit = False
+        try:
+            with self._bruta.cursor() as cursor:
+                cursor.execute(sql)
+                self._registrar(cursor, versao, arquivo)
+            self._bruta.commit()
+        except Exception:
+            self._bruta.rollback()
+            raise
+        finally:
+            self._bruta.autocommit = True
+
+    def marcar(self, versao, arquivo):
+        """Registra a migração como aplicada sem executá-la (bancos migrados à mão)."""
+        with self._bruta.cursor() as cursor:
+            self._registrar(cursor, versao, arquivo)
@@ -0,0 +1,7 @@
+-- Anexos passam a ser gravados no storage de arquivos (ver storage.py).
+-- Depois de aplicar, rode `flask migrar-anexos` para mover o conteúdo legado
+-- e, em seguida, `VACUUM FULL anexos;` para devolver o espaço ao disco.
+
+ALTER TABLE anexos ALTER COLUMN file_data DROP NOT NULL;
+ALTER TABLE anexos ADD COLUMN IF NOT EXISTS sha256 TEXT;
+CREATE INDEX IF NOT EXISTS ix_anexos_sha256 ON anexos (sha256);
@@ -0,0 +1,14 @@
+-- Contador de numeração por ano (ver numeracao.py), inicializado com o
+-- maior sequencial já emitido em cada ano.
+
+CREATE TABLE IF NOT EXISTS protocolo_sequencias (
+    ano INTEGER PRIMARY KEY,
+    ultimo INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO protocolo_sequencias (ano, ultimo)
+SELECT split_part(numero, '/', 2)::int, MAX(split_part(numero, '/', 1)::int)
+FROM protocolos
+WHERE numero ~ '^[0-9]+/[0-9]{4}$'
+GROUP BY 1
+ON CONFLICT (ano) DO UPDATE SET ultimo = GREATEST(protocolo_sequencias.ultimo, EXCLUDED.ultimo);
@@ -0,0 +1,13 @@
+-- Chave de ordenação dos protocolos: ano e sequencial extraídos de numero
+-- (NNNN/ANO). Mantidas pela aplicação a cada gravação (models.Protocolo);
+-- números fora do padrão ficam com (0, 0).
+
+ALTER TABLE protocolos ADD COLUMN IF NOT EXISTS ano INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE protocolos ADD COLUMN IF NOT EXISTS sequencial INTEGER NOT NULL DEFAULT 0;
+
+UPDATE protocolos
+SET ano = split_part(numero, '/', 2)::int,
+    sequencial = split_part(numero, '/', 1)::int
+WHERE numero ~ '^[0-9]+/[0-9]+$';
+
+CREATE INDEX IF NOT EXISTS ix_protocolos_ano_sequencial ON protocolos (ano, sequencial, id);
@@ -0,0 +1,15 @@
+-- Busca sem acentos com índices de trigramas (ver busca.py).
+-- unaccent() não é IMMUTABLE, então é envolvida em uma função própria para
+-- poder ser usada em índices de expressão.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION normalizar_busca(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+    AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, texto)) $$;
+
+CREATE INDEX IF NOT EXISTS ix_protocolos_numero_trgm ON protocolos USING gin (normalizar_busca(numero) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_protocolos_nome_trgm ON protocolos USING gin (normalizar_busca(nome) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_protocolos_tipo_trgm ON protocolos USING gin (normalizar_busca(tipo_requerimento) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_servidores_nome_trgm ON servidores USING gin (normalizar_busca(nome) gin_trgm_ops);
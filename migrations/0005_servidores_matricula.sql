@@ -0,0 +1,6 @@
+-- Índice único na matrícula dos servidores (consulta por matrícula e upsert
+-- nas importações). Antes de aplicar, confira se há duplicatas:
+--
+--   SELECT matricula, count(*) FROM servidores GROUP BY matricula HAVING count(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_servidores_matricula ON servidores (matricula);
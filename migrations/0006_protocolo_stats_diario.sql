@@ -0,0 +1,19 @@
+-- Consolidado diário de protocolos lido pelo dashboard (ver stats_diario.py).
+-- Valores nulos viram '' (texto) e 0001-01-01 (data), pois fazem parte da chave.
+-- O mesmo preenchimento pode ser refeito com `flask reconstruir-estatisticas`.
+
+CREATE TABLE IF NOT EXISTS protocolo_stats_diario (
+    data DATE NOT NULL,
+    status VARCHAR NOT NULL,
+    tipo_requerimento VARCHAR NOT NULL,
+    lotacao VARCHAR NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (data, status, tipo_requerimento, lotacao)
+);
+
+INSERT INTO protocolo_stats_diario (data, status, tipo_requerimento, lotacao, total)
+SELECT coalesce(data_solicitacao, DATE '0001-01-01'), coalesce(status, ''),
+       coalesce(tipo_requerimento, ''), coalesce(lotacao, ''), count(*)
+FROM protocolos
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (data, status, tipo_requerimento, lotacao) DO UPDATE SET total = excluded.total;
@@ -0,0 +1,20 @@
+-- Fila de tarefas em segundo plano (ver jobs.py e `flask worker`).
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    parametros JSON NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    usuario_id INTEGER REFERENCES usuarios (id),
+    resultado_chave TEXT,
+    resultado_nome TEXT,
+    resultado_mime TEXT,
+    resultado_tamanho BIGINT,
+    erro TEXT,
+    criado_em TIMESTAMPTZ DEFAULT now(),
+    iniciado_em TIMESTAMPTZ,
+    concluido_em TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_status_id ON jobs (status, id);
@@ -0,0 +1,22 @@
+-- sem-transacao
+-- Índices dos filtros mais usados. CONCURRENTLY não bloqueia as gravações
+-- enquanto o índice é criado, mas não pode rodar dentro de uma transação
+-- (ver migracoes.py). Se um comando falhar, o índice pode ficar INVALID:
+-- remova-o com DROP INDEX CONCURRENTLY e rode `flask migrar` de novo.
+
+-- Meus protocolos: filtro por responsável, paginado por id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_protocolos_responsavel_id ON protocolos (responsavel, id);
+
+-- Listagens filtradas por status, na ordem padrão (ano, sequencial, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_protocolos_status_ordem ON protocolos (status, ano, sequencial, id);
+
+-- Filtro por período da solicitação (listagens, exportação, relatórios)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_protocolos_data_solicitacao ON protocolos (data_solicitacao);
+
+-- Pendentes antigos: só os protocolos ainda não finalizados, por data
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_protocolos_pendentes ON protocolos (data_solicitacao)
+    WHERE status NOT IN ('Finalizado', 'Concluído');
+
+-- Histórico e anexos de um protocolo (página de detalhe, PDF, exclusão em cascata)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historico_protocolos_protocolo_id ON historico_protocolos (protocolo_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_anexos_protocolo_id ON anexos (protocolo_id);
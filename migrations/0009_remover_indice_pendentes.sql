@@ -0,0 +1,6 @@
+-- sem-transacao
+-- O cartão de pendentes antigos do dashboard lê o consolidado diário
+-- (protocolo_stats_diario, ver 0006), não protocolos: o índice parcial criado
+-- na 0008 não atende nenhuma consulta e só custa espaço e escrita a cada
+-- protocolo gravado.
+DROP INDEX CONCURRENTLY IF EXISTS ix_protocolos_pendentes;
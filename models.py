@@ -1,6 +1,7 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from sqlalchemy.dialects.postgresql import BYTEA
+from sqlalchemy.orm import validates
 
 # Flask-Login requires this callback to load a user from the session
 @login_manager.user_loader
@@ -19,14 +20,34 @@ class Usuario(db.Model, UserMixin):
     tipo = db.Column(db.Text, nullable=False)
     email = db.Column(db.Text)
 
+def separar_numero(numero):
+    """Separa 'NNNN/ANO' em (ano, sequencial); números fora do padrão viram (0, 0)."""
+    try:
+        sequencial, ano = numero.split('/')
+        return int(ano), int(sequencial)
+    except (AttributeError, ValueError):
+        return 0, 0
+
 class Protocolo(db.Model):
     __tablename__ = 'protocolos'
+    __table_args__ = (
+        # Serve a ordenação padrão das listagens (ano, sequencial) sem ordenar a tabela inteira
+        db.Index('ix_protocolos_ano_sequencial', 'ano', 'sequencial', 'id'),
+        # Filtros mais usados (migrations/0008_indices_filtros.sql)
+        db.Index('ix_protocolos_responsavel_id', 'responsavel', 'id'),
+        db.Index('ix_protocolos_status_ordem', 'status', 'ano', 'sequencial', 'id'),
+        db.Index('ix_protocolos_data_solicitacao', 'data_solicitacao'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     visto = db.Column(db.Boolean, default=False)
     numero = db.Column(db.String, unique=True)
+    # Partes do número, mantidas em sincronia por _atualizar_chave_ordenacao
+    ano = db.Column(db.Integer, nullable=False, default=0)
+    sequencial = db.Column(db.Integer, nullable=False, default=0)
     nome = db.Column(db.String)
     matricula = db.Column(db.String)
-    endereco = db.Column(db.Text)
+    # Colunas de texto longo só são carregadas quando pedidas (grupo 'texto', ver loading.py)
+    endereco = db.deferred(db.Column(db.Text), group='texto')
     municipio = db.Column(db.String)
     bairro = db.Column(db.String)
     cep = db.Column(db.String)
@@ -37,9 +58,9 @@ class Protocolo(db.Model):
     lotacao = db.Column(db.String)
     unidade_exercicio = db.Column(db.String)
     tipo_requerimento = db.Column(db.String)
-    requer_ao = db.Column(db.Text)
+    requer_ao = db.deferred(db.Column(db.Text), group='texto')
     data_solicitacao = db.Column(db.Date)
-    observacoes = db.Column(db.Text)
+    observacoes = db.deferred(db.Column(db.Text), group='texto')
     responsavel = db.Column(db.String)
     data_envio = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
     status = db.Column(db.String, default='Aberto')
@@ -48,21 +69,48 @@ class Protocolo(db.Model):
     anexos = db.relationship('Anexo', backref='protocolo', lazy=True, cascade="all, delete-orphan")
     historico = db.relationship('HistoricoProtocolo', backref='protocolo', lazy=True, cascade="all, delete-orphan")
 
+    @validates('numero')
+    def _atualizar_chave_ordenacao(self, key, numero):
+        self.ano, self.sequencial = separar_numero(numero)
+        return numero
+
+class ProtocoloSequencia(db.Model):
+    """Último sequencial emitido em cada ano (ver numeracao.py)."""
+    __tablename__ = 'protocolo_sequencias'
+    ano = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ultimo = db.Column(db.Integer, nullable=False, default=0)
+
+class ProtocoloStatsDiario(db.Model):
+    """Quantidade de protocolos por dia, status, tipo e lotação (ver stats_diario.py).
+
+    Valores ausentes ficam como '' (texto) ou stats_diario.SEM_DATA (data),
+    pois as colunas fazem parte da chave primária.
+    """
+    __tablename__ = 'protocolo_stats_diario'
+    data = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String, primary_key=True)
+    tipo_requerimento = db.Column(db.String, primary_key=True)
+    lotacao = db.Column(db.String, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
 class Anexo(db.Model):
     __tablename__ = 'anexos'
     id = db.Column(db.BigInteger, primary_key=True)
-    protocolo_id = db.Column(db.BigInteger, db.ForeignKey('protocolos.id'), nullable=False)
+    protocolo_id = db.Column(db.BigInteger, db.ForeignKey('protocolos.id'), nullable=False, index=True)
     file_name = db.Column(db.Text, nullable=False)
     storage_path = db.Column(db.Text, nullable=False)
     file_size = db.Column(db.BigInteger, nullable=False)
     mime_type = db.Column(db.Text, nullable=False)
-    file_data = db.Column(BYTEA, nullable=False)
+    # Hash do conteúdo; preenchido quando o arquivo está no storage (storage_path é a chave)
+    sha256 = db.Column(db.Text, index=True)
+    # Conteúdo legado gravado no banco, mantido só até rodar `flask migrar-anexos`
+    file_data = db.deferred(db.Column(BYTEA, nullable=True))
     created_at = db.Column(db.TIMESTAMP(timezone=True), server_default=db.func.now())
 
 class HistoricoProtocolo(db.Model):
     __tablename__ = 'historico_protocolos'
     id = db.Column(db.Integer, primary_key=True)
-    protocolo_id = db.Column(db.Integer, db.ForeignKey('protocolos.id'), nullable=True)
+    protocolo_id = db.Column(db.Integer, db.ForeignKey('protocolos.id'), nullable=True, index=True)
     status = db.Column(db.String)
     responsavel = db.Column(db.String)
     observacao = db.Column(db.Text)
@@ -77,7 +125,7 @@ class Lotacao(db.Model):
 class Servidor(db.Model):
     __tablename__ = 'servidores'
     id = db.Column(db.BigInteger, primary_key=True)
-    matricula = db.Column(db.Text, nullable=False)
+    matricula = db.Column(db.Text, nullable=False, unique=True, index=True)
     nome = db.Column(db.Text)
     lotacao = db.Column(db.Text)
     cargo = db.Column(db.Text)
@@ -94,3 +142,26 @@ class EmailSistema(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.Text, nullable=False)
     email = db.Column(db.Text, nullable=False)
+
+class Job(db.Model):
+    """Tarefa executada em segundo plano por `flask worker` (ver jobs.py)."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Busca da próxima tarefa pendente
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+    id = db.Column(db.BigInteger, primary_key=True)
+    tipo = db.Column(db.Text, nullable=False)
+    parametros = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.Text, nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    # Arquivo gerado, guardado no storage de resultados (chave, nome para download, tipo e tamanho)
+    resultado_chave = db.Column(db.Text)
+    resultado_nome = db.Column(db.Text)
+    resultado_mime = db.Column(db.Text)
+    resultado_tamanho = db.Column(db.BigInteger)
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.TIMESTAMP(timezone=True), server_default=db.func.now())
+    iniciado_em = db.Column(db.TIMESTAMP(timezone=True))
+    concluido_em = db.Column(db.TIMESTAMP(timezone=True))
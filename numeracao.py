@@ -0,0 +1,55 @@
+"""Numeração dos protocolos no formato NNNN/ANO.
+
+O último sequencial de cada ano fica em ``protocolo_sequencias``. A reserva é
+um único upsert que incrementa o contador e devolve o novo valor; a linha do
+ano fica travada até o fim da transação, então duas requisições simultâneas
+nunca recebem o mesmo número e um rollback devolve o número reservado.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import db
+from models import ProtocoloSequencia
+
+_RESERVAR = text(
+    "INSERT INTO protocolo_sequencias (ano, ultimo) VALUES (:ano, :quantidade) "
+    "ON CONFLICT (ano) DO UPDATE SET ultimo = protocolo_sequencias.ultimo + :quantidade "
+    "RETURNING ultimo"
+)
+
+# Só avança o contador: números já emitidos acima de ``sequencial`` continuam valendo
+_GARANTIR_MINIMO = text(
+    "INSERT INTO protocolo_sequencias (ano, ultimo) VALUES (:ano, :sequencial) "
+    "ON CONFLICT (ano) DO UPDATE SET ultimo = excluded.ultimo "
+    "WHERE protocolo_sequencias.ultimo < excluded.ultimo"
+)
+
+
+def formatar_numero(sequencial, ano):
+    """Formata o número com 4 dígitos, preenchendo com zeros à esquerda."""
+    return f'{str(sequencial).zfill(4)}/{ano}'
+
+
+def reservar_sequenciais(ano, quantidade=1):
+    """Reserva ``quantidade`` sequenciais consecutivos do ano na transação corrente."""
+    ultimo = db.session.execute(_RESERVAR, {'ano': ano, 'quantidade': quantidade}).scalar()
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def garantir_minimo(ano, sequencial):
+    """Garante que o contador do ano esteja em pelo menos ``sequencial`` (números importados)."""
+    db.session.execute(_GARANTIR_MINIMO, {'ano': ano, 'sequencial': sequencial})
+
+
+def proximo_numero(ano=None):
+    """Reserva e retorna o próximo número de protocolo do ano (padrão: ano corrente)."""
+    ano = ano or datetime.now().year
+    sequencial = reservar_sequenciais(ano)[0]
+    return formatar_numero(sequencial, ano)
+
+
+def ultimo_sequencial(ano):
+    """Último sequencial já emitido no ano, lido direto do contador."""
+    sequencia = db.session.get(ProtocoloSequencia, ano)
+    return sequencia.ultimo if sequencia else 0
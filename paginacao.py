@@ -0,0 +1,99 @@
+"""Paginação por cursor (keyset) para as listagens de protocolos.
+
+Em vez de OFFSET + COUNT(*), cada página é buscada a partir da chave da
+última linha exibida (``WHERE (ano, sequencial, id) < (...)``), o que usa o
+índice de ordenação e custa o mesmo na primeira ou na milésima página.
+"""
+import base64
+import json
+
+from sqlalchemy import tuple_
+
+from app import db
+
+PROXIMA = 'p'
+ANTERIOR = 'a'
+
+
+def codificar_cursor(valores, direcao=PROXIMA):
+    dados = json.dumps([direcao, list(valores)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(dados).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna ``(direcao, valores)``; cursores ausentes ou inválidos voltam à primeira página."""
+    if not cursor:
+        return PROXIMA, None
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direcao, valores = json.loads(dados)
+    except (ValueError, TypeError):
+        return PROXIMA, None
+    if direcao not in (PROXIMA, ANTERIOR) or not isinstance(valores, list):
+        return PROXIMA, None
+    return direcao, valores
+
+
+def _valores_validos(valores, colunas):
+    """Confere se cada valor do cursor tem o tipo da coluna (ex.: int para ano, sequencial e id)."""
+    if len(valores) != len(colunas):
+        return False
+    for valor, coluna in zip(valores, colunas):
+        tipo = coluna.type.python_type
+        # bool é subclasse de int, mas não é um valor válido para colunas inteiras
+        if not isinstance(valor, tipo) or (isinstance(valor, bool) and tipo is not bool):
+            return False
+    return True
+
+
+def estimar_total(query):
+    """Total aproximado de linhas segundo o planejador do PostgreSQL (None em outros bancos)."""
+    conexao = db.session.connection()
+    if conexao.dialect.name != 'postgresql':
+        return None
+    compilado = query.order_by(None).statement.compile(
+        dialect=conexao.dialect, compile_kwargs={'render_postcompile': True}
+    )
+    plano = conexao.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + compilado.string, compilado.params).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+class PaginaKeyset:
+    """Uma página de resultados e os cursores para as páginas vizinhas."""
+
+    def __init__(self, items, colunas, has_prev, has_next, total_aproximado=None):
+        self.items = items
+        self.has_prev = has_prev and bool(items)
+        self.has_next = has_next and bool(items)
+        self.total_aproximado = total_aproximado
+        chave = lambda item: [getattr(item, coluna.key) for coluna in colunas]
+        self.prev_cursor = codificar_cursor(chave(items[0]), ANTERIOR) if self.has_prev else None
+        self.next_cursor = codificar_cursor(chave(items[-1]), PROXIMA) if self.has_next else None
+
+
+def paginar_keyset(query, colunas, cursor=None, per_page=10, com_total=False):
+    """Pagina ``query`` em ordem decrescente de ``colunas`` (a última deve ser única, ex.: id)."""
+    total = estimar_total(query) if com_total else None
+    direcao, valores = decodificar_cursor(cursor)
+    if valores is not None and not _valores_validos(valores, colunas):
+        direcao, valores = PROXIMA, None
+    chave = tuple_(*colunas)
+
+    if direcao == ANTERIOR:
+        query = query.filter(chave > tuple_(*valores)).order_by(*[c.asc() for c in colunas])
+    else:
+        if valores is not None:
+            query = query.filter(chave < tuple_(*valores))
+        query = query.order_by(*[c.desc() for c in colunas])
+
+    # Uma linha a mais indica se existe página seguinte na direção pedida
+    items = query.limit(per_page + 1).all()
+    tem_mais = len(items) > per_page
+    items = items[:per_page]
+
+    if direcao == ANTERIOR:
+        items.reverse()
+        return PaginaKeyset(items, colunas, has_prev=tem_mais, has_next=True, total_aproximado=total)
+    return PaginaKeyset(items, colunas, has_prev=valores is not None, has_next=tem_mais, total_aproximado=total)
@@ -0,0 +1,133 @@
+"""Geração dos PDFs de protocolo com WeasyPrint.
+
+O que não muda entre documentos é preparado uma vez por processo: a
+configuração de fontes, a folha de estilos já interpretada
+(static/pdf.css) e os arquivos estáticos (imagens), servidos da memória por
+um ``url_fetcher`` próprio em vez de baixados a cada documento. O PDF pronto
+fica em um cache de arquivos próprio (``cache_pdf``, fora do cache JSON)
+sob o hash do HTML renderizado, então reimprimir um protocolo que não mudou
+não passa de novo pelo layout.
+
+O layout roda no pool de CPU compartilhado (executor.py), fora do worker
+HTTP. ``gerar_lote`` junta vários protocolos em um só arquivo: os que não
+estão no cache são diagramados em paralelo no pool e as partes são
+concatenadas com pypdf.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+
+from flask import render_template
+from pypdf import PdfWriter
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+from werkzeug.security import safe_join
+
+from app import app, cache_pdf, executor_cpu
+
+# Origem fictícia usada como base_url: os caminhos abaixo dela vêm de static/
+BASE_URL = 'http://pdf.interno/'
+
+# O layout do WeasyPrint (Pango) não é seguro entre threads
+_lock = threading.RLock()
+_fontes = None
+_estilos = None
+_estaticos = {}
+
+
+def _preparar():
+    global _fontes, _estilos
+    with _lock:
+        if _estilos is None:
+            fontes = FontConfiguration()
+            with open(os.path.join(app.static_folder, 'pdf.css'), encoding='utf-8') as f:
+                _estilos = CSS(string=f.read(), font_config=fontes)
+            _fontes = fontes
+            pasta = os.path.join(app.static_folder, 'img')
+            for nome in sorted(os.listdir(pasta)):
+                _arquivo_estatico(f'img/{nome}')
+    return _fontes, _estilos
+
+
+def _arquivo_estatico(relativo):
+    if relativo not in _estaticos:
+        caminho = safe_join(app.static_folder, relativo)
+        if caminho is None or not os.path.isfile(caminho):
+            return None
+        with open(caminho, 'rb') as f:
+            _estaticos[relativo] = f.read()
+    return _estaticos[relativo]
+
+
+def _buscar_url(url, *args, **kwargs):
+    if not url.startswith(BASE_URL):
+        return default_url_fetcher(url, *args, **kwargs)
+    prefixo = app.static_url_path.strip('/') + '/'
+    caminho = url[len(BASE_URL):].split('?', 1)[0]
+    conteudo = _arquivo_estatico(caminho.split(prefixo, 1)[1]) if prefixo in caminho else None
+    if conteudo is None:
+        raise ValueError(f'Recurso não encontrado para o PDF: {url}')
+    return {'string': conteudo, 'mime_type': mimetypes.guess_type(caminho)[0], 'redirected_url': url}
+
+
+def _renderizar(html):
+    fontes, estilos = _preparar()
+    with _lock:
+        documento = HTML(string=html, base_url=BASE_URL, url_fetcher=_buscar_url)
+        return documento.write_pdf(stylesheets=[estilos], font_config=fontes)
+
+
+def _html(protocolo):
+    html = render_template('pdf_template.html', protocolo=protocolo)
+    return html, hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+def gerar(protocolo):
+    """Devolve ``(pdf, hash)`` do protocolo; o hash identifica o conteúdo (útil como ETag).
+
+    Precisa de um contexto de requisição (``url_for`` no template).
+    """
+    html, digest = _html(protocolo)
+    conteudo = cache_pdf.get(digest)
+    if conteudo is None:
+        conteudo = executor_cpu.executar(_renderizar, html)
+        cache_pdf.set(digest, conteudo)
+    return conteudo, digest
+
+
+def gerar_lote(protocolos):
+    """Um único PDF com todos os ``protocolos``, na ordem dada (mesmo contexto de ``gerar``)."""
+    documentos = [_html(protocolo) for protocolo in protocolos]
+
+    partes = {}
+    faltantes = {}
+    for html, digest in documentos:
+        conteudo = cache_pdf.get(digest)
+        if conteudo is not None:
+            partes[digest] = conteudo
+        elif digest not in faltantes:
+            faltantes[digest] = html
+
+    # Cada processo do pool prepara fontes e estilos uma vez e reaproveita nos próximos
+    renderizados = executor_cpu.mapear(_renderizar, faltantes.values())
+    for digest, conteudo in zip(faltantes, renderizados):
+        partes[digest] = conteudo
+        cache_pdf.set(digest, conteudo)
+
+    writer = PdfWriter()
+    for _, digest in documentos:
+        writer.append(io.BytesIO(partes[digest]))
+    saida = io.BytesIO()
+    writer.write(saida)
+    return saida.getvalue()
+
+
+def nome_arquivo(protocolo):
+    return f'protocolo_{protocolo.numero.replace("/", "-")}.pdf'
+
+
+def aquecer():
+    """Carrega fontes, estilos e imagens e faz um primeiro layout, fora do caminho das requisições."""
+    _renderizar('<p>PDF</p>')
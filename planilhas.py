@@ -0,0 +1,98 @@
+"""Leitura em streaming de arquivos tabulares (CSV, XLSX e JSONL) para importações.
+
+``ler_registros`` devolve um dicionário por linha, com os nomes das colunas
+normalizados (minúsculas, sem acentos, espaços viram ``_``), sem carregar o
+arquivo inteiro na memória: o XLSX é aberto em modo read-only e o CSV tem o
+separador detectado nas primeiras linhas.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+import unicodedata
+
+from openpyxl import load_workbook
+
+EXTENSOES = ('.csv', '.xlsx', '.jsonl')
+
+
+class ArquivoInvalido(ValueError):
+    """O arquivo não tem o formato esperado (extensão, cabeçalho ou conteúdo)."""
+
+
+def normalizar_cabecalho(nome, sinonimos=None):
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode('ascii')
+    nome = '_'.join(nome.strip().lower().replace('-', ' ').split())
+    return (sinonimos or {}).get(nome, nome)
+
+
+def valor(valor):
+    """Texto sem espaços nas pontas (None se vazio); números inteiros de planilha sem o '.0'."""
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _com_inicio(inicio, resto):
+    yield from io.StringIO(inicio + resto.readline())
+    yield from resto
+
+
+def _linhas_csv(arquivo, encoding):
+    texto = codecs.getreader(encoding)(arquivo, errors='replace')
+    amostra = texto.read(4096)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        # Arquivo com uma só coluna (ou vazio): não há separador para detectar
+        dialeto = csv.excel
+    yield from csv.reader(_com_inicio(amostra, texto), dialeto)
+
+
+def _linhas_xlsx(arquivo):
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    finally:
+        planilha.close()
+
+
+def _registros_jsonl(arquivo, encoding, sinonimos):
+    for numero, linha in enumerate(codecs.getreader(encoding)(arquivo, errors='replace'), start=1):
+        if not linha.strip():
+            continue
+        try:
+            objeto = json.loads(linha)
+        except ValueError:
+            raise ArquivoInvalido(f'Linha {numero} não é um JSON válido.')
+        if not isinstance(objeto, dict):
+            raise ArquivoInvalido(f'Linha {numero} não é um objeto JSON.')
+        yield {normalizar_cabecalho(chave, sinonimos): conteudo for chave, conteudo in objeto.items()}
+
+
+def ler_registros(arquivo, nome_arquivo, encoding='utf-8-sig', sinonimos=None):
+    """Gera um dicionário por linha de ``arquivo`` (binário), conforme a extensão de ``nome_arquivo``.
+
+    No CSV e no XLSX a primeira linha é o cabeçalho. Os valores vêm como
+    estão no arquivo (texto no CSV; números e datas podem vir tipados no
+    XLSX e no JSONL).
+    """
+    extensao = os.path.splitext(nome_arquivo.lower())[1]
+    if extensao == '.jsonl':
+        yield from _registros_jsonl(arquivo, encoding, sinonimos)
+        return
+    if extensao == '.csv':
+        linhas = _linhas_csv(arquivo, encoding)
+    elif extensao == '.xlsx':
+        linhas = _linhas_xlsx(arquivo)
+    else:
+        raise ArquivoInvalido(f"Envie um arquivo {', '.join(EXTENSOES)}.")
+
+    cabecalho = [normalizar_cabecalho(nome, sinonimos) for nome in next(linhas, ())]
+    for linha in linhas:
+        if any(celula not in (None, '') for celula in linha):
+            yield dict(zip(cabecalho, linha))
@@ -0,0 +1,140 @@
+"""Verificação dos planos de execução das consultas das rotas principais.
+
+``consultas()`` monta as mesmas consultas que as rotas fazem (listagens,
+filtros, detalhe, busca, fila de tarefas) e ``verificar`` roda ``EXPLAIN``
+em cada uma, apontando as que leem por varredura sequencial uma tabela com
+mais linhas que o limite, ou seja, as que ficaram sem índice. O dashboard
+é a exceção prevista (``VARREDURAS_PREVISTAS``): soma o consolidado diário
+inteiro, cujo tamanho depende de dias e dimensões, não de protocolos; a
+verificação garante que ele não leia ``protocolos``.
+
+Com ``semear`` a verificação insere protocolos fictícios antes (e
+desfaz tudo no fim), para que o planejador escolha como faria em um banco
+grande mesmo rodando contra uma base de desenvolvimento. O ANALYZE dos
+dados semeados atualiza ``pg_class.reltuples`` no lugar, o que o rollback
+não desfaz; por isso as tabelas são analisadas de novo depois dele. Mesmo
+assim, prefira semear em uma base descartável: até essa nova análise, o
+planejador das outras sessões vê as estatísticas infladas.
+"""
+import json
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+import dashboard
+import stats_diario
+from app import ORDEM_LISTAGEM, db
+from filtros import FiltroProtocolos
+from models import Anexo, HistoricoProtocolo, Job, Protocolo, Servidor
+
+TAMANHO_PAGINA = 21
+
+_SEMEAR = text(
+    "INSERT INTO protocolos (numero, ano, sequencial, nome, status, tipo_requerimento, lotacao, "
+    "responsavel, data_solicitacao, visto) "
+    "SELECT lpad(i::text, 6, '0') || '/1900', 1900, i, 'Requerente ' || i, "
+    "(ARRAY['PROTOCOLO GERADO', 'Em análise', 'Encaminhado', 'Finalizado', 'Concluído'])[1 + i % 5], "
+    "'Tipo ' || (i % 40), 'Lotação ' || (i % 60), 'usuario' || (i % 200), "
+    "DATE '2020-01-01' + (i % 2000), false "
+    "FROM generate_series(1, :quantidade) AS i"
+)
+
+_TABELAS_SEMEADAS = ('protocolos', 'historico_protocolos', 'protocolo_stats_diario')
+
+# Varreduras sequenciais que fazem parte da consulta e não contam como falha
+VARREDURAS_PREVISTAS = {'dashboard': {'protocolo_stats_diario'}}
+
+_HISTORICO_SEMEADO = text(
+    "INSERT INTO historico_protocolos (protocolo_id, status, responsavel) "
+    "SELECT id, status, responsavel FROM protocolos WHERE ano = 1900"
+)
+
+
+def consultas():
+    """``{nome: consulta}`` com o formato das consultas feitas pelas rotas."""
+    hoje = date.today()
+    pagina = lambda consulta: consulta.limit(TAMANHO_PAGINA)  # noqa: E731
+    listagem = db.session.query(Protocolo.id)
+    return {
+        'listagem': pagina(listagem.order_by(*(c.desc() for c in ORDEM_LISTAGEM))),
+        'listagem por status': pagina(
+            listagem.filter(*FiltroProtocolos(status='Em análise').condicoes())
+            .order_by(*(c.desc() for c in ORDEM_LISTAGEM))
+        ),
+        'listagem por período': pagina(
+            listagem.filter(*FiltroProtocolos(data_inicio=hoje - timedelta(days=7), data_fim=hoje).condicoes())
+            .order_by(*(c.desc() for c in ORDEM_LISTAGEM))
+        ),
+        'busca por nome': pagina(listagem.filter(*FiltroProtocolos(nome='silva').condicoes())),
+        'meus protocolos': pagina(
+            listagem.filter(*FiltroProtocolos(responsavel='usuario1').condicoes()).order_by(Protocolo.id.desc())
+        ),
+        # Todos os cartões, inclusive os pendentes antigos, saem desta consulta ao consolidado
+        'dashboard': dashboard.consulta(FiltroProtocolos(), '30d', hoje),
+        'histórico do protocolo': db.session.query(HistoricoProtocolo.id).filter(HistoricoProtocolo.protocolo_id == 1),
+        'anexos do protocolo': db.session.query(Anexo.id).filter(Anexo.protocolo_id == 1),
+        'servidor por matrícula': db.session.query(Servidor.id).filter(Servidor.matricula == '1'),
+        'fila de tarefas': db.session.query(Job.id).filter(Job.status == 'pendente').order_by(Job.id).limit(1),
+    }
+
+
+def _plano(consulta, conexao):
+    # Mesmo caminho de paginacao.estimar_total: o psycopg2 interpola os
+    # parâmetros no cliente, então o planejador vê os valores (índices parciais)
+    compilado = consulta.statement.compile(dialect=conexao.dialect, compile_kwargs={'render_postcompile': True})
+    plano = conexao.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + compilado.string, compilado.params).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]['Plan']
+
+
+def _varreduras(plano):
+    if plano.get('Node Type') == 'Seq Scan':
+        yield plano['Relation Name']
+    for filho in plano.get('Plans', ()):
+        yield from _varreduras(filho)
+
+
+def _analisar(conexao):
+    for tabela in _TABELAS_SEMEADAS:
+        conexao.execute(text(f'ANALYZE {tabela}'))
+
+
+def verificar(limite_linhas=1000, semear=0):
+    """Devolve ``[(nome, grandes, linhas)]`` para cada consulta de ``consultas()``.
+
+    ``linhas`` tem as tabelas lidas por varredura sequencial e o total de
+    linhas estimado pelo PostgreSQL; ``grandes`` são as que passam de
+    ``limite_linhas``, fora as de ``VARREDURAS_PREVISTAS``. Tudo roda em uma transação desfeita no fim; com
+    ``semear``, as estatísticas das tabelas são recalculadas após o rollback.
+    """
+    conexao = db.session.connection()
+    if conexao.dialect.name != 'postgresql':
+        raise RuntimeError('A verificação dos planos requer PostgreSQL.')
+    try:
+        if semear:
+            conexao.execute(_SEMEAR, {'quantidade': semear})
+            conexao.execute(_HISTORICO_SEMEADO)
+            stats_diario.reconstruir(conexao)
+            _analisar(conexao)
+
+        resultado = []
+        for nome, consulta in consultas().items():
+            tabelas = set(_varreduras(_plano(consulta, conexao)))
+            linhas = {
+                tabela: conexao.execute(
+                    text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabela)'), {'tabela': tabela}
+                ).scalar() or 0
+                for tabela in tabelas
+            }
+            previstas = VARREDURAS_PREVISTAS.get(nome, set())
+            grandes = sorted(
+                tabela for tabela, total in linhas.items() if total > limite_linhas and tabela not in previstas
+            )
+            resultado.append((nome, grandes, linhas))
+        return resultado
+    finally:
+        db.session.rollback()
+        if semear:
+            _analisar(db.session.connection())
+            db.session.commit()
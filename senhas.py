@@ -0,0 +1,22 @@
+"""Hash e conferência de senhas com bcrypt, executados no pool de CPU (ver executor.py).
+
+bcrypt é lento de propósito; rodando no pool, uma leva de logins não
+prende os workers HTTP.
+"""
+from app import bcrypt, executor_cpu
+
+
+def _gerar_hash(senha):
+    return bcrypt.generate_password_hash(senha).decode('utf-8')
+
+
+def _conferir(hash_senha, senha):
+    return bcrypt.check_password_hash(hash_senha, senha)
+
+
+def gerar_hash(senha):
+    return executor_cpu.executar(_gerar_hash, senha)
+
+
+def conferir(hash_senha, senha):
+    return executor_cpu.executar(_conferir, hash_senha, senha)
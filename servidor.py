@@ -0,0 +1,99 @@
+"""Parâmetros de execução em produção: workers do gunicorn e pool de conexões.
+
+gunicorn.conf.py e app.py leem os mesmos valores daqui, para que as
+conexões abertas por todos os workers juntos caibam no limite do
+PostgreSQL (``DB_MAX_CONEXOES``) e os pools de CPU de todos eles juntos
+não passem do número de CPUs.
+
+Classes de worker:
+  * ``sync``: um pedido por processo; mais processos (2 x CPUs + 1).
+  * ``gthread`` (padrão): ``GUNICORN_THREADS`` pedidos por processo.
+  * ``gevent``: muitas conexões por processo; requer ``pip install gevent``
+    (e psycogreen para o psycopg2 não bloquear) e roda sem preload, pois o
+    monkey patching precisa acontecer antes de importar a aplicação.
+"""
+import os
+
+CLASSES_WORKER = ('sync', 'gthread', 'gevent')
+# Definida por gunicorn.conf.py antes de carregar a aplicação (e herdada pelos workers)
+VARIAVEL_GUNICORN = 'SERVIDOR_GUNICORN'
+
+
+def _int(nome, padrao):
+    valor = os.getenv(nome)
+    return int(valor) if valor else padrao
+
+
+def _cpus():
+    return os.cpu_count() or 1
+
+
+def classe_worker():
+    classe = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+    if classe not in CLASSES_WORKER:
+        raise RuntimeError(f"GUNICORN_WORKER_CLASS inválido: {classe!r} (use {', '.join(CLASSES_WORKER)}).")
+    return classe
+
+
+def workers():
+    padrao = _cpus() * 2 + 1 if classe_worker() == 'sync' else _cpus() + 1
+    return _int('GUNICORN_WORKERS', padrao)
+
+
+def threads():
+    return _int('GUNICORN_THREADS', 4) if classe_worker() == 'gthread' else 1
+
+
+def conexoes_gevent():
+    return _int('GUNICORN_WORKER_CONNECTIONS', 100)
+
+
+def preload():
+    if classe_worker() == 'gevent':
+        return False
+    return os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def pedidos_simultaneos_por_worker():
+    classe = classe_worker()
+    if classe == 'gthread':
+        return threads()
+    if classe == 'gevent':
+        return conexoes_gevent()
+    return 1
+
+
+def sob_gunicorn():
+    return os.getenv(VARIAVEL_GUNICORN) == '1'
+
+
+def processos_cpu_por_worker():
+    """Processos do pool de CPU (executor.py) deste processo.
+
+    Sob o gunicorn, as CPUs divididas entre os workers; fora dele (``flask
+    worker``, comandos de importação) o processo é o único usuário do pool
+    e fica com todas as CPUs.
+    """
+    padrao = max(1, _cpus() // workers()) if sob_gunicorn() else _cpus()
+    return _int('EXECUTOR_PROCESSOS', padrao)
+
+
+def opcoes_engine(database_url):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` com o pool dimensionado pela concorrência de cada worker."""
+    if database_url.startswith('sqlite'):
+        return {}
+    # Uma conexão por pedido simultâneo, limitada à fatia de cada worker no total permitido
+    pool_size = _int('DB_POOL_SIZE', min(pedidos_simultaneos_por_worker(), 10))
+    max_overflow = _int('DB_MAX_OVERFLOW', 2)
+    maximo_total = _int('DB_MAX_CONEXOES', 80)
+    if maximo_total:
+        por_worker = max(1, maximo_total // workers())
+        pool_size = min(pool_size, por_worker)
+        max_overflow = max(0, min(max_overflow, por_worker - pool_size))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_pre_ping': True,
+        'pool_recycle': _int('DB_POOL_RECYCLE', 1800),
+        'pool_timeout': _int('DB_POOL_TIMEOUT', 10),
+    }
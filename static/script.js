@@ -14,6 +14,21 @@ document.addEventListener('DOMContentLoaded', function () {
         initializeProtocolForm();
     }
 
+    // --- Protocol List Paging (via /api/protocolos) ---
+    if (document.querySelector('#tabelaProtocolos[data-api-url]')) {
+        initializePaginacaoProtocolos();
+    }
+
+    // --- Bulk selection (status update / forwarding of many protocols) ---
+    if (document.getElementById('acoesEmLote')) {
+        initializeSelecaoProtocolos();
+    }
+
+    // --- Background Jobs (exports and PDFs) ---
+    if (document.querySelector('[data-job-url]')) {
+        initializeJobs();
+    }
+
     // --- Modal Logic ---
     // This will be expanded to handle all modals.
     // Example for the "Atualizar Status" modal
@@ -375,25 +390,20 @@ window.confirmarEncaminhamento = async function() {
     }
 
     const data = {
-        protocoloId: protocoloId,
+        protocoloIds: protocoloId.split(',').filter(Boolean),
         novoStatus: 'Encaminhado', // O status é fixo para 'Encaminhado'
         novoResponsavel: novoResponsavel,
         observacao: `Encaminhado para ${novoResponsavel}. Observação: ${observacao}`
     };
 
     try {
-        const response = await fetch('/protocolos/atualizar', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
-        });
-        const result = await response.json();
+        const result = await enviarAtualizacaoLote(data);
         if (result.sucesso) {
-            alert('Protocolo encaminhado com sucesso!');
-            // Fecha o modal e recarrega a página para ver a mudança
+            alert(mensagemResultadoLote(result, 'encaminhado(s)'));
+            // Fecha o modal e atualiza as linhas da tabela sem recarregar a página
             const modal = bootstrap.Modal.getInstance(document.getElementById('modalEncaminhar'));
             modal.hide();
-            window.location.reload();
+            aplicarResultadosLote(result);
         } else {
             throw new Error(result.mensagem || 'Erro desconhecido');
         }
@@ -419,7 +429,7 @@ window.confirmarAtualizacaoStatus = async function() {
     const observacao = document.getElementById('observacaoAtualizacao').value;
 
     const data = {
-        protocoloId: protocoloId,
+        protocoloIds: protocoloId.split(',').filter(Boolean),
         novoStatus: novoStatus,
         // Ao apenas atualizar o status, o responsável não muda, a menos que seja um encaminhamento.
         // O responsável pela ação é o 'current_user' no backend.
@@ -427,17 +437,12 @@ window.confirmarAtualizacaoStatus = async function() {
     };
 
     try {
-        const response = await fetch('/protocolos/atualizar', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
-        });
-        const result = await response.json();
+        const result = await enviarAtualizacaoLote(data);
         if (result.sucesso) {
-            alert('Status do protocolo atualizado com sucesso!');
+            alert(mensagemResultadoLote(result, 'atualizado(s)'));
             const modal = bootstrap.Modal.getInstance(document.getElementById('modalAtualizarStatus'));
             modal.hide();
-            window.location.reload();
+            aplicarResultadosLote(result);
         } else {
             throw new Error(result.mensagem || 'Erro desconhecido');
         }
@@ -447,6 +452,204 @@ window.confirmarAtualizacaoStatus = async function() {
     }
 };
 
+// --- Bulk Update Functions ---
+// Both modals post to the batch endpoint; a single protocol is just a batch of one.
+async function enviarAtualizacaoLote(data) {
+    const response = await fetch('/protocolos/atualizar/lote', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data)
+    });
+    return response.json();
+}
+
+function mensagemResultadoLote(result, acao) {
+    const falhas = result.resultados.filter(r => !r.sucesso);
+    let mensagem = `${result.atualizados} protocolo(s) ${acao} com sucesso.`;
+    if (falhas.length) {
+        mensagem += `\n${falhas.length} não atualizado(s): ` + falhas.map(r => `#${r.id} (${r.mensagem})`).join(', ');
+    }
+    return mensagem;
+}
+
+// Updates status/responsible cells in place; reloads only if an updated protocol is not on this page.
+function aplicarResultadosLote(result) {
+    let faltaLinha = false;
+    result.resultados.filter(r => r.sucesso).forEach(r => {
+        const linha = document.querySelector(`#tabelaProtocolos tr[data-protocolo-id="${r.id}"]`);
+        if (!linha) {
+            faltaLinha = true;
+            return;
+        }
+        linha.querySelector('.col-status').innerHTML = `<span class="badge bg-info">${escapeHtml(r.status)}</span>`;
+        linha.querySelector('.col-responsavel').textContent = r.responsavel ?? '';
+        const selecao = linha.querySelector('.selecao-protocolo');
+        if (selecao) selecao.checked = false;
+    });
+    if (faltaLinha) {
+        window.location.reload();
+        return;
+    }
+    if (document.getElementById('acoesEmLote')) {
+        atualizarSelecaoProtocolos();
+    }
+}
+
+function initializeSelecaoProtocolos() {
+    const tabela = document.getElementById('tabelaProtocolos');
+    const todos = document.getElementById('selecionarTodosProtocolos');
+    todos.addEventListener('change', function () {
+        tabela.querySelectorAll('.selecao-protocolo').forEach(caixa => { caixa.checked = todos.checked; });
+        atualizarSelecaoProtocolos();
+    });
+    tabela.addEventListener('change', function (event) {
+        if (event.target.classList.contains('selecao-protocolo')) {
+            atualizarSelecaoProtocolos();
+        }
+    });
+}
+
+function atualizarSelecaoProtocolos() {
+    const caixas = Array.from(document.querySelectorAll('#tabelaProtocolos .selecao-protocolo'));
+    const ids = caixas.filter(caixa => caixa.checked).map(caixa => caixa.value);
+    document.getElementById('selecionarTodosProtocolos').checked = caixas.length > 0 && ids.length === caixas.length;
+    document.getElementById('contagemSelecionados').textContent = ids.length
+        ? `${ids.length} protocolo(s) selecionado(s)`
+        : 'Nenhum protocolo selecionado';
+    document.querySelectorAll('#acoesEmLote [data-acao-lote]').forEach(botao => {
+        botao.setAttribute('data-protocolo-id', ids.join(','));
+        botao.disabled = ids.length === 0;
+    });
+}
+
+// --- Protocol List Functions ---
+function escapeHtml(valor) {
+    return String(valor ?? '').replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
+function initializePaginacaoProtocolos() {
+    const nav = document.getElementById('paginacaoProtocolos');
+    nav.addEventListener('click', function (event) {
+        const link = event.target.closest('a[data-cursor]');
+        if (!link) return;
+        event.preventDefault();
+        carregarPaginaProtocolos(link.dataset.cursor, link.href);
+    });
+    // Back/forward buttons: fall back to the server-rendered page
+    window.addEventListener('popstate', () => window.location.reload());
+}
+
+function renderLinhaProtocolo(p) {
+    const data = p.data_solicitacao ? new Date(p.data_solicitacao + 'T00:00:00').toLocaleDateString('pt-BR') : '';
+    return `
+        <tr data-protocolo-id="${p.id}">
+            <td><input type="checkbox" class="form-check-input selecao-protocolo" value="${p.id}"></td>
+            <td>${escapeHtml(p.numero)}</td>
+            <td>${escapeHtml(p.nome)}</td>
+            <td>${escapeHtml(p.tipo_requerimento)}</td>
+            <td>${data}</td>
+            <td class="col-status"><span class="badge bg-info">${escapeHtml(p.status)}</span></td>
+            <td class="col-responsavel">${escapeHtml(p.responsavel)}</td>
+            <td>
+                <a href="/protocolo/${p.id}" class="btn btn-sm btn-primary">Detalhes</a>
+                <button type="button" class="btn btn-sm btn-info" data-bs-toggle="modal" data-bs-target="#modalAtualizarStatus" data-protocolo-id="${p.id}">
+                    Atualizar Status
+                </button>
+                <button type="button" class="btn btn-sm btn-warning" data-bs-toggle="modal" data-bs-target="#modalEncaminhar" data-protocolo-id="${p.id}">
+                    Encaminhar
+                </button>
+                <button type="button" class="btn btn-sm btn-dark" onclick="previsualizarPDF(${p.id})">Documento</button>
+            </td>
+        </tr>`;
+}
+
+function atualizarLinkPaginacao(item, cursor, params) {
+    if (cursor) {
+        params.set('cursor', cursor);
+        item.classList.remove('disabled');
+        item.innerHTML = `<a class="page-link" href="?${params.toString()}" data-cursor="${cursor}">${item.textContent.trim()}</a>`;
+    } else {
+        item.classList.add('disabled');
+        item.innerHTML = `<a class="page-link" href="#">${item.textContent.trim()}</a>`;
+    }
+}
+
+async function carregarPaginaProtocolos(cursor, urlPagina) {
+    const tabela = document.getElementById('tabelaProtocolos');
+    const params = new URLSearchParams(window.location.search);
+    params.delete('page');
+    params.set('cursor', cursor);
+
+    try {
+        const response = await fetch(`${tabela.dataset.apiUrl}?${params.toString()}`);
+        if (!response.ok) throw new Error('Falha ao carregar a página de protocolos');
+        const pagina = await response.json();
+
+        const tbody = tabela.querySelector('tbody');
+        tbody.innerHTML = pagina.itens.length
+            ? pagina.itens.map(renderLinhaProtocolo).join('')
+            : '<tr><td colspan="8" class="text-center">Nenhum protocolo encontrado.</td></tr>';
+        if (document.getElementById('acoesEmLote')) {
+            atualizarSelecaoProtocolos();
+        }
+
+        const itens = document.querySelectorAll('#paginacaoProtocolos .page-item');
+        atualizarLinkPaginacao(itens[0], pagina.anterior, new URLSearchParams(params));
+        atualizarLinkPaginacao(itens[itens.length - 1], pagina.proximo, new URLSearchParams(params));
+        history.pushState(null, '', urlPagina);
+    } catch (error) {
+        console.error('Erro ao paginar protocolos:', error);
+        window.location.href = urlPagina;
+    }
+}
+
+// --- Background Job Functions ---
+// Links with data-job-url enqueue the job, poll its status and then download the result.
+// The href stays as the synchronous fallback when JavaScript is unavailable, and is also
+// used when a job is still waiting for a worker after JOB_PENDING_MAX_MS (worker stopped).
+const JOB_POLL_INTERVAL_MS = 2000;
+const JOB_PENDING_MAX_MS = 60000;
+
+function initializeJobs() {
+    document.querySelectorAll('[data-job-url]').forEach(link => {
+        link.addEventListener('click', function (event) {
+            event.preventDefault();
+            executarJob(this);
+        });
+    });
+}
+
+async function executarJob(link) {
+    if (link.classList.contains('disabled')) return;
+    const textoOriginal = link.innerHTML;
+    link.classList.add('disabled');
+    link.innerHTML = 'Gerando...';
+    try {
+        let response = await fetch(link.dataset.jobUrl, { method: 'POST' });
+        if (!response.ok) throw new Error(`Erro ${response.status}`);
+        let job = await response.json();
+        const inicio = Date.now();
+        while (job.status === 'pendente' || job.status === 'executando') {
+            if (job.status === 'pendente' && Date.now() - inicio > JOB_PENDING_MAX_MS) {
+                window.location.href = link.href;
+                return;
+            }
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            response = await fetch(job.statusUrl);
+            if (!response.ok) throw new Error(`Erro ${response.status}`);
+            job = await response.json();
+        }
+        if (job.status !== 'concluido') throw new Error(job.erro || 'Falha ao gerar o arquivo.');
+        window.location.href = job.downloadUrl;
+    } catch (error) {
+        console.error('Erro na tarefa em segundo plano:', error);
+        alert(`Não foi possível gerar o arquivo: ${error.message}`);
+    } finally {
+        link.classList.remove('disabled');
+        link.innerHTML = textoOriginal;
+    }
+}
+
 // --- Protocol Form Functions ---
 function initializeProtocolForm() {
     // These values are injected by the template in 'edit' mode.
@@ -656,8 +859,8 @@ function openServidorSearchModal() {
 async function searchServidorByName() {
     const searchTerm = this.value.trim();
     const resultadosDiv = document.getElementById('buscaNomeResultados');
-    if (searchTerm.length < 3) {
-        resultadosDiv.innerHTML = '<p class="text-center text-muted">Digite ao menos 3 caracteres.</p>';
+    if (searchTerm.length < 2) {
+        resultadosDiv.innerHTML = '<p class="text-center text-muted">Digite ao menos 2 caracteres.</p>';
         return;
     }
     try {
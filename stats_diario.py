@@ -0,0 +1,118 @@
+"""Consolidado diário de protocolos usado pelo dashboard.
+
+``protocolo_stats_diario`` guarda quantos protocolos existem por data de
+solicitação, status, tipo e lotação. A tabela é mantida a cada flush da
+sessão: protocolos criados somam 1 na sua chave, excluídos subtraem 1 e
+alterados em alguma dessas colunas passam de uma chave para outra. Assim o
+dashboard lê poucas linhas por dia em vez de varrer ``protocolos``.
+Alterações feitas por UPDATE/DELETE em massa não passam pelos eventos e
+precisam chamar ``aplicar_variacoes`` ou ``flask reconstruir-estatisticas``.
+"""
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import Date, String, bindparam, delete, event, func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from models import Protocolo, ProtocoloStatsDiario
+
+# Valor gravado no lugar de data_solicitacao nula (a coluna faz parte da chave)
+SEM_DATA = date.min
+
+DIMENSOES = ('data_solicitacao', 'status', 'tipo_requerimento', 'lotacao')
+
+_SOMAR = text(
+    "INSERT INTO protocolo_stats_diario (data, status, tipo_requerimento, lotacao, total) "
+    "VALUES (:data, :status, :tipo_requerimento, :lotacao, :total) "
+    "ON CONFLICT (data, status, tipo_requerimento, lotacao) "
+    "DO UPDATE SET total = protocolo_stats_diario.total + excluded.total"
+).bindparams(
+    bindparam('data', type_=Date),
+    bindparam('status', type_=String),
+    bindparam('tipo_requerimento', type_=String),
+    bindparam('lotacao', type_=String),
+)
+
+
+def chave(data_solicitacao, status, tipo_requerimento, lotacao):
+    """Chave do consolidado para os valores de um protocolo."""
+    return (data_solicitacao or SEM_DATA, status or '', tipo_requerimento or '', lotacao or '')
+
+
+def aplicar_variacoes(conexao, variacoes):
+    """Soma ``variacoes`` (``{chave: quantidade}``) ao consolidado.
+
+    As linhas vão em ordem de chave: transações concorrentes que tocam as
+    mesmas chaves travam as linhas na mesma ordem e não entram em deadlock.
+    """
+    linhas = [
+        {'data': c[0], 'status': c[1], 'tipo_requerimento': c[2], 'lotacao': c[3], 'total': n}
+        for c, n in sorted(variacoes.items()) if n
+    ]
+    if linhas:
+        conexao.execute(_SOMAR, linhas)
+
+
+def reconstruir(conexao):
+    """Recalcula o consolidado inteiro a partir de ``protocolos``."""
+    conexao.execute(delete(ProtocoloStatsDiario))
+    dimensoes = (
+        func.coalesce(Protocolo.data_solicitacao, SEM_DATA),
+        func.coalesce(Protocolo.status, ''),
+        func.coalesce(Protocolo.tipo_requerimento, ''),
+        func.coalesce(Protocolo.lotacao, ''),
+    )
+    conexao.execute(insert(ProtocoloStatsDiario).from_select(
+        ['data', 'status', 'tipo_requerimento', 'lotacao', 'total'],
+        select(*dimensoes, func.count(Protocolo.id)).group_by(*dimensoes),
+    ))
+
+
+def _chave_atual(protocolo):
+    return chave(*(getattr(protocolo, atributo) for atributo in DIMENSOES))
+
+
+def _chave_anterior(protocolo):
+    estado = inspect(protocolo)
+    valores = []
+    for atributo in DIMENSOES:
+        historico = estado.attrs[atributo].history
+        if historico.deleted:
+            valores.append(historico.deleted[0])
+        elif historico.unchanged:
+            valores.append(historico.unchanged[0])
+        else:
+            valores.append(getattr(protocolo, atributo))
+    return chave(*valores)
+
+
+def _ao_alterar(target, value, oldvalue, initiator):
+    # Nada a fazer: o listener existe só para ligar active_history, que carrega
+    # o valor antigo antes de substituí-lo mesmo se o atributo expirou após um
+    # commit, deixando-o disponível no histórico para _chave_anterior.
+    return value
+
+
+for _atributo in DIMENSOES:
+    event.listen(getattr(Protocolo, _atributo), 'set', _ao_alterar, active_history=True)
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_consolidado(session, flush_context):
+    variacoes = Counter()
+    for obj in session.new:
+        if isinstance(obj, Protocolo):
+            variacoes[_chave_atual(obj)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Protocolo):
+            variacoes[_chave_anterior(obj)] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Protocolo):
+            anterior, atual = _chave_anterior(obj), _chave_atual(obj)
+            if anterior != atual:
+                variacoes[anterior] -= 1
+                variacoes[atual] += 1
+    if any(variacoes.values()):
+        # Lido no commit para invalidar as respostas do dashboard em cache
+        session.info['consolidado_alterado'] = True
+    aplicar_variacoes(session.connection(), variacoes)
@@ -0,0 +1,263 @@
+"""Armazenamento dos arquivos anexados aos protocolos.
+
+Os anexos são endereçados pelo SHA-256 do conteúdo: a chave gravada em
+``Anexo.storage_path`` é derivada do hash, então o mesmo arquivo enviado
+duas vezes ocupa espaço uma única vez. O backend é escolhido pela
+configuração ``ANEXOS_STORAGE`` ('local' ou 's3').
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+# Tamanho dos blocos usados para copiar/ler arquivos sem carregá-los inteiros na memória
+CHUNK_SIZE = 1024 * 1024
+
+
+def chave_para_hash(digest):
+    """Monta a chave de armazenamento a partir do hash (ex.: 'ab/cd/abcd...')."""
+    return f'{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def copiar_com_hash(origem, destino):
+    """Copia ``origem`` para ``destino`` em blocos, calculando tamanho e SHA-256."""
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    while True:
+        bloco = origem.read(CHUNK_SIZE)
+        if not bloco:
+            break
+        sha256.update(bloco)
+        tamanho += len(bloco)
+        destino.write(bloco)
+    return sha256.hexdigest(), tamanho
+
+
+class LeitorEmBlocos(io.RawIOBase):
+    """Arquivo somente leitura e posicionável que busca o conteúdo sob demanda.
+
+    ``ler_bloco(posicao, tamanho)`` devolve os bytes do intervalo pedido; só o
+    bloco corrente fica em memória, independente do tamanho do arquivo.
+    """
+
+    def __init__(self, ler_bloco, tamanho, ao_fechar=None):
+        self._ler_bloco = ler_bloco
+        self._tamanho = tamanho
+        self._ao_fechar = ao_fechar
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._tamanho
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer):
+        restante = self._tamanho - self._pos
+        if restante <= 0:
+            return 0
+        dados = self._ler_bloco(self._pos, min(len(buffer), restante)) or b''
+        n = len(dados)
+        buffer[:n] = dados
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed and self._ao_fechar is not None:
+            self._ao_fechar()
+        super().close()
+
+
+class _LeitorS3(io.RawIOBase):
+    """Leitura posicionável de um objeto S3.
+
+    Cada reposicionamento abre um novo GET com cabeçalho Range a partir da
+    posição atual, e o corpo é consumido em streaming.
+    """
+
+    def __init__(self, client, bucket, key):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._pos = 0
+        self._body = None
+        self._tamanho = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def _obter_tamanho(self):
+        if self._tamanho is None:
+            self._tamanho = self._client.head_object(Bucket=self._bucket, Key=self._key)['ContentLength']
+        return self._tamanho
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._obter_tamanho()
+        offset = max(0, offset)
+        if offset != self._pos:
+            self._fechar_body()
+            self._pos = offset
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._body is None:
+            if self._pos >= self._obter_tamanho():
+                return 0
+            resposta = self._client.get_object(Bucket=self._bucket, Key=self._key, Range=f'bytes={self._pos}-')
+            self._body = resposta['Body']
+        dados = self._body.read(len(buffer))
+        n = len(dados)
+        buffer[:n] = dados
+        self._pos += n
+        return n
+
+    def _fechar_body(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def close(self):
+        self._fechar_body()
+        super().close()
+
+
+class BlobStorage:
+    """Interface comum dos backends de armazenamento de anexos."""
+
+    def save(self, stream):
+        """Grava o conteúdo de ``stream`` e retorna ``(chave, tamanho, sha256)``."""
+        raise NotImplementedError
+
+    def open(self, chave):
+        """Abre o arquivo da ``chave`` para leitura binária (posicionável, lido em streaming)."""
+        raise NotImplementedError
+
+    def exists(self, chave):
+        raise NotImplementedError
+
+    def delete(self, chave):
+        raise NotImplementedError
+
+
+class LocalStorage(BlobStorage):
+    """Guarda os anexos em um diretório do sistema de arquivos local."""
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+
+    def _caminho(self, chave):
+        return os.path.join(self.raiz, *chave.split('/'))
+
+    def save(self, stream):
+        tmp_dir = os.path.join(self.raiz, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                digest, tamanho = copiar_com_hash(stream, destino)
+            chave = chave_para_hash(digest)
+            caminho = self._caminho(chave)
+            if os.path.exists(caminho):
+                # Conteúdo já armazenado: descarta a cópia temporária
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                os.replace(tmp_path, caminho)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return chave, tamanho, digest
+
+    def open(self, chave):
+        return open(self._caminho(chave), 'rb')
+
+    def exists(self, chave):
+        return os.path.exists(self._caminho(chave))
+
+    def delete(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage(BlobStorage):
+    """Guarda os anexos em um bucket compatível com S3.
+
+    ``client`` pode ser qualquer objeto com a interface do cliente boto3
+    (``get_object``, ``head_object``, ``upload_fileobj``, ``delete_object``),
+    o que permite usar MinIO ou outro substituto local via ``endpoint_url``.
+    """
+
+    def __init__(self, bucket, prefixo='', endpoint_url=None, client=None):
+        if client is None:
+            import boto3  # Dependência opcional, necessária apenas para este backend
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefixo = prefixo.strip('/')
+
+    def _key(self, chave):
+        return f'{self.prefixo}/{chave}' if self.prefixo else chave
+
+    def save(self, stream):
+        # O hash só é conhecido ao final da leitura, então o conteúdo passa
+        # por um arquivo temporário antes de ser enviado ao bucket.
+        with tempfile.TemporaryFile() as tmp:
+            digest, tamanho = copiar_com_hash(stream, tmp)
+            chave = chave_para_hash(digest)
+            if not self.exists(chave):
+                tmp.seek(0)
+                self.client.upload_fileobj(tmp, self.bucket, self._key(chave))
+        return chave, tamanho, digest
+
+    def open(self, chave):
+        return _LeitorS3(self.client, self.bucket, self._key(chave))
+
+    def exists(self, chave):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(chave))
+            return True
+        except Exception as e:
+            status = getattr(e, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode')
+            if status == 404:
+                return False
+            raise
+
+    def delete(self, chave):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(chave))
+
+
+def criar_storage(config):
+    """Instancia o backend de armazenamento configurado."""
+    backend = config.get('ANEXOS_STORAGE', 'local')
+    if backend == 'local':
+        return LocalStorage(config['ANEXOS_DIR'])
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['ANEXOS_S3_BUCKET'],
+            prefixo=config.get('ANEXOS_S3_PREFIX') or '',
+            endpoint_url=config.get('ANEXOS_S3_ENDPOINT_URL'),
+        )
+    raise RuntimeError(f"ANEXOS_STORAGE inválido: {backend!r} (use 'local' ou 's3').")
@@ -0,0 +1,79 @@
+import hashlib
+import io
+from datetime import date
+
+import pytest
+
+from models import Anexo, Protocolo, Servidor
+
+
+@pytest.fixture
+def protocolo(banco):
+    protocolo = Protocolo(numero='0001/2026', nome='Maria', data_solicitacao=date(2026, 1, 5), status='Aberto')
+    banco.session.add(protocolo)
+    banco.session.commit()
+    return protocolo
+
+
+@pytest.fixture
+def limites(app):
+    anteriores = app.config['MAX_CONTENT_LENGTH'], app.config['ANEXO_LIMITES_POR_TIPO']
+    yield app.config
+    app.config['MAX_CONTENT_LENGTH'], app.config['ANEXO_LIMITES_POR_TIPO'] = anteriores
+
+
+def enviar(cliente, protocolo_id, conteudo, nome):
+    return cliente.post(f'/protocolo/{protocolo_id}/anexo/novo', data={'anexo': (io.BytesIO(conteudo), nome)},
+                        content_type='multipart/form-data')
+
+
+def test_anexo_gravado_no_storage_com_hash_e_tamanho(cliente, protocolo):
+    conteudo = b'%PDF-1.4 ' + b'x' * 700_000  # acima do limite do spool em memória
+    assert enviar(cliente, protocolo.id, conteudo, 'requerimento.pdf').status_code == 302
+
+    anexo = Anexo.query.one()
+    assert anexo.file_size == len(conteudo)
+    assert anexo.sha256 == hashlib.sha256(conteudo).hexdigest()
+    assert anexo.file_data is None
+
+    resposta = cliente.get(f'/anexo/{anexo.id}/download')
+    assert resposta.status_code == 200
+    assert resposta.get_data() == conteudo
+
+
+def test_mesmo_conteudo_reaproveita_o_blob(cliente, protocolo):
+    enviar(cliente, protocolo.id, b'igual', 'a.txt')
+    enviar(cliente, protocolo.id, b'igual', 'b.txt')
+    chaves = {anexo.storage_path for anexo in Anexo.query.all()}
+    assert len(chaves) == 1
+
+
+def test_limite_por_tipo_recusa_antes_de_gravar(cliente, protocolo, limites):
+    limites['ANEXO_LIMITES_POR_TIPO'] = {'txt': 1024}
+
+    resposta = enviar(cliente, protocolo.id, b'x' * 4096, 'grande.txt')
+    assert resposta.status_code == 302
+    assert Anexo.query.count() == 0
+
+    assert enviar(cliente, protocolo.id, b'x' * 4096, 'grande.pdf').status_code == 302
+    assert enviar(cliente, protocolo.id, b'x' * 512, 'pequeno.txt').status_code == 302
+    assert sorted(anexo.file_name for anexo in Anexo.query.all()) == ['grande.pdf', 'pequeno.txt']
+
+
+def test_limite_total_da_requisicao(cliente, protocolo, limites):
+    limites['MAX_CONTENT_LENGTH'] = 64 * 1024
+
+    enviar(cliente, protocolo.id, b'x' * (128 * 1024), 'grande.pdf')
+    assert Anexo.query.count() == 0
+
+
+def test_limite_por_tipo_nao_vale_para_a_importacao_de_servidores(cliente, limites):
+    limites['ANEXO_LIMITES_POR_TIPO'] = {'csv': 1024}
+    linhas = ''.join(f'{i},Servidor {i},SEDUC,Professor,Escola {i}\n' for i in range(200))
+    arquivo = ('matricula,nome,lotacao,cargo,unidade_de_exercicio\n' + linhas).encode()
+    assert len(arquivo) > 1024
+
+    resposta = cliente.post('/admin/servidores/importar', data={'arquivo': (io.BytesIO(arquivo), 'rh.csv')},
+                            content_type='multipart/form-data')
+    assert resposta.status_code == 302
+    assert Servidor.query.count() == 200
@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+
+import busca
+from models import Protocolo, Servidor
+
+
+def test_normalizar_remove_acentos_e_maiusculas():
+    assert busca.normalizar('João CONCEIÇÃO') == 'joao conceicao'
+    assert busca.normalizar(None) is None
+
+
+def test_similaridade_por_trigramas():
+    assert busca.similaridade('Márquez', 'marquez') == 1.0
+    assert busca.similaridade('marquez', 'marques') > busca.similaridade('marquez', 'silva') == 0.0
+    assert busca.similaridade(None, 'x') == 0.0
+
+
+@pytest.fixture
+def protocolos(banco):
+    nomes = ['João da Silva', 'Joana Silveira', 'Maria José Conceição', 'Ana 100% Souza']
+    for i, nome in enumerate(nomes, start=1):
+        banco.session.add(Protocolo(numero=f'{i:04d}/2026', nome=nome, status='Aberto', responsavel='admin',
+                                    tipo_requerimento='Licença Prêmio', data_solicitacao=date(2026, 2, i)))
+    banco.session.commit()
+
+
+def nomes_listados(cliente, **filtros):
+    dados = cliente.get('/api/protocolos', query_string=filtros).get_json()
+    return sorted(item['nome'] for item in dados['itens'])
+
+
+def test_filtro_sem_acentos_com_todas_as_palavras(cliente, protocolos):
+    assert nomes_listados(cliente, nome='joao silva') == ['João da Silva']
+    assert nomes_listados(cliente, nome='SILV') == ['Joana Silveira', 'João da Silva']
+    assert nomes_listados(cliente, nome='conceicao') == ['Maria José Conceição']
+    assert nomes_listados(cliente, tipo='licenca premio') == sorted(
+        ['João da Silva', 'Joana Silveira', 'Maria José Conceição', 'Ana 100% Souza'])
+
+
+def test_curingas_do_like_sao_literais(cliente, protocolos):
+    assert nomes_listados(cliente, nome='100%') == ['Ana 100% Souza']
+    assert nomes_listados(cliente, nome='a_a') == []
+
+
+def test_numero_contem(cliente, protocolos):
+    assert nomes_listados(cliente, numero='0003') == ['Maria José Conceição']
+
+
+@pytest.fixture
+def servidores(banco):
+    nomes = ['Mariana Lopes', 'Mário Márquez', 'Ricardo Marques', 'Rosa Maria Silva', 'Pedro Henrique']
+    for i, nome in enumerate(nomes, start=1):
+        banco.session.add(Servidor(matricula=str(1000 + i), nome=nome, lotacao='SEDUC'))
+    banco.session.commit()
+
+
+def buscar_servidores(cliente, termo):
+    resposta = cliente.get('/api/servidores/search', query_string={'nome': termo})
+    assert resposta.status_code == 200
+    return [s['nome'] for s in resposta.get_json()]
+
+
+def test_autocompletar_por_prefixo_sem_acentos(cliente, servidores):
+    assert buscar_servidores(cliente, 'mar')[:2] == ['Mariana Lopes', 'Mário Márquez']
+    assert 'Rosa Maria Silva' in buscar_servidores(cliente, 'mar')
+    assert buscar_servidores(cliente, 'mario marq') == ['Mário Márquez']
+
+
+def test_trecho_no_meio_do_nome_ordenado_por_relevancia(cliente, servidores):
+    # Nenhuma palavra começa com 'arquez': cai na busca por trigramas, o mais parecido primeiro
+    assert buscar_servidores(cliente, 'arquez') == ['Mário Márquez']
+    assert buscar_servidores(cliente, 'arque')[0] in ('Mário Márquez', 'Ricardo Marques')
+    assert sorted(buscar_servidores(cliente, 'arque')) == ['Mário Márquez', 'Ricardo Marques']
+
+
+def test_busca_curta_recusada(cliente, servidores):
+    assert cliente.get('/api/servidores/search', query_string={'nome': 'm'}).status_code == 400
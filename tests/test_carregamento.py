@@ -0,0 +1,72 @@
+"""Comandos SQL e bytes lidos por rota (estratégias de loading.py).
+
+Cada rota é medida com um protocolo e depois com muitos, todos com
+histórico, anexos legados (conteúdo no banco) e texto longo: a quantidade de
+comandos não pode crescer com os registros (N+1) nem passar do orçamento da
+rota, e os bytes lidos mostram que as listagens não trazem o texto longo e
+que nenhuma rota traz o conteúdo dos anexos.
+"""
+from datetime import date
+
+import pytest
+
+from models import Anexo, HistoricoProtocolo, Protocolo
+
+TEXTO_LONGO = 'x' * 50_000
+CONTEUDO_LEGADO = b'\0' * 200_000
+
+# (rota, máximo de comandos, máximo de bytes lidos); {id} é o protocolo com mais filhos.
+# Os comandos incluem o carregamento do usuário logado e, nas páginas, a estimativa do total.
+ROTAS = [
+    ('/protocolos', 3, 5_000),
+    ('/meus_protocolos', 3, 5_000),
+    ('/relatorios', 3, 5_000),
+    ('/api/protocolos', 2, 5_000),
+    # Detalhe: o texto longo do protocolo (3 x 50 KB) é lido, o conteúdo dos anexos não
+    ('/protocolo/{id}', 4, 3 * len(TEXTO_LONGO) + 20_000),
+    ('/api/protocolo/{id}', 2, 3 * len(TEXTO_LONGO) + 20_000),
+    ('/protocolo/{id}/editar', 2, 3 * len(TEXTO_LONGO) + 20_000),
+]
+
+
+def semear(banco, quantidade, filhos=1):
+    inicio = banco.session.query(Protocolo).count()
+    ids = []
+    for i in range(inicio + 1, inicio + quantidade + 1):
+        protocolo = Protocolo(
+            numero=f'{i:04d}/2026', nome=f'Requerente {i}', status='Aberto', responsavel='admin',
+            tipo_requerimento='Férias', data_solicitacao=date(2026, 1, 1 + i % 28),
+            endereco=TEXTO_LONGO, observacoes=TEXTO_LONGO, requer_ao=TEXTO_LONGO,
+        )
+        for j in range(filhos):
+            protocolo.historico.append(HistoricoProtocolo(status='Aberto', responsavel='admin', observacao=f'passo {j}'))
+            protocolo.anexos.append(Anexo(
+                file_name=f'a{j}.pdf', storage_path=f'legado/{i}/{j}', file_size=len(CONTEUDO_LEGADO),
+                mime_type='application/pdf', file_data=CONTEUDO_LEGADO,
+            ))
+        banco.session.add(protocolo)
+        banco.session.flush()
+        ids.append(protocolo.id)
+    banco.session.commit()
+    return ids
+
+
+def medir(cliente, contador_sql, url):
+    with contador_sql.medir() as medicao:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200, url
+    return len(medicao.comandos), medicao.bytes
+
+
+@pytest.mark.parametrize('rota, max_comandos, max_bytes', ROTAS)
+def test_comandos_e_bytes_por_rota(cliente, banco, contador_sql, rota, max_comandos, max_bytes):
+    primeiro, = semear(banco, 1, filhos=1)
+    comandos_um, _ = medir(cliente, contador_sql, rota.format(id=primeiro))
+
+    semear(banco, 25, filhos=3)
+    maior, = semear(banco, 1, filhos=10)
+    comandos_muitos, lidos = medir(cliente, contador_sql, rota.format(id=maior))
+
+    assert comandos_muitos == comandos_um, 'a quantidade de comandos cresce com os registros (N+1)'
+    assert comandos_muitos <= max_comandos
+    assert lidos <= max_bytes
@@ -0,0 +1,143 @@
+"""Estatísticas do dashboard (dashboard.py) sobre o consolidado diário.
+
+Os protocolos são criados e alterados pela sessão, que mantém
+``protocolo_stats_diario``; os números do dashboard são comparados com a
+mesma conta feita em Python sobre os protocolos, com e sem filtros.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+import dashboard
+from filtros import FiltroProtocolos
+from models import Protocolo
+
+HOJE = date(2026, 3, 20)
+TIPOS = ('Férias', 'Licença Prêmio', 'Abono', 'Aposentadoria', 'Progressão', 'Certidão', None)
+STATUS = ('PROTOCOLO GERADO', 'Em análise', 'Finalizado', 'Concluído', None)
+LOTACOES = ('SEDUC', 'SESAU', None)
+
+
+@pytest.fixture
+def protocolos(banco):
+    criados = []
+    for i in range(90):
+        protocolo = Protocolo(
+            numero=f'{i + 1:04d}/2026', nome=f'Requerente {i}',
+            tipo_requerimento=TIPOS[i % len(TIPOS)], status=STATUS[i % len(STATUS)],
+            lotacao=LOTACOES[i % len(LOTACOES)],
+            data_solicitacao=None if i % 17 == 0 else HOJE - timedelta(days=i % 45),
+        )
+        banco.session.add(protocolo)
+        criados.append(protocolo)
+    banco.session.commit()
+    return criados
+
+
+def esperado(protocolos, filtro, periodo='30d', agrupamento='day'):
+    """As estatísticas contadas protocolo a protocolo."""
+    def atende(p):
+        return ((not filtro.tipo or filtro.tipo.lower() in (p.tipo_requerimento or '').lower())
+                and (not filtro.status or p.status == filtro.status)
+                and (not filtro.lotacao or p.lotacao == filtro.lotacao))
+
+    def ate_o_fim(p):
+        return not filtro.data_fim or (p.data_solicitacao is not None and p.data_solicitacao <= filtro.data_fim)
+
+    inicio_novos = filtro.data_inicio or HOJE - timedelta(days=dashboard.DIAS_NOVOS_PADRAO)
+    inicio_evolucao, fim_evolucao = dashboard.periodo_evolucao(periodo, HOJE)
+    no_periodo = [
+        p for p in protocolos
+        if atende(p) and ate_o_fim(p)
+        and (not filtro.data_inicio or (p.data_solicitacao is not None and p.data_solicitacao >= filtro.data_inicio))
+    ]
+    por_tipo = Counter(p.tipo_requerimento for p in no_periodo if p.tipo_requerimento)
+    por_status = Counter(p.status for p in no_periodo if p.status)
+    evolucao = Counter()
+    for p in protocolos:
+        dia = p.data_solicitacao
+        if atende(p) and dia and dia >= inicio_evolucao and (not fim_evolucao or dia < fim_evolucao):
+            evolucao[dia.replace(day=1) if agrupamento == 'month' else dia] += 1
+    todos_tipos = [{'tipo_requerimento': t, 'total': n} for t, n in sorted(por_tipo.items(), key=lambda i: (-i[1], i[0]))]
+    return {
+        'novosNoPeriodo': sum(
+            1 for p in protocolos
+            if atende(p) and ate_o_fim(p) and p.data_solicitacao and p.data_solicitacao >= inicio_novos
+        ),
+        'pendentesAntigos': sum(
+            1 for p in protocolos
+            if p.data_solicitacao and p.data_solicitacao <= HOJE - timedelta(days=dashboard.DIAS_PENDENTE_ANTIGO)
+            and p.status and p.status not in dashboard.STATUS_FINALIZADOS
+        ),
+        'totalFinalizados': sum(1 for p in no_periodo if p.status in dashboard.STATUS_FINALIZADOS),
+        'topTipos': todos_tipos[:5],
+        'todosTipos': todos_tipos,
+        'statusProtocolos': [{'status': s, 'total': n} for s, n in sorted(por_status.items(), key=lambda i: (-i[1], i[0]))],
+        'evolucaoProtocolos': [{'intervalo': d.isoformat(), 'total': evolucao[d]} for d in sorted(evolucao)],
+    }
+
+
+FILTROS = [
+    FiltroProtocolos(),
+    FiltroProtocolos(tipo='licen'),
+    FiltroProtocolos(status='Em análise', lotacao='SEDUC'),
+    FiltroProtocolos(data_inicio=HOJE - timedelta(days=20)),
+    FiltroProtocolos(data_inicio=HOJE - timedelta(days=40), data_fim=HOJE - timedelta(days=10)),
+    FiltroProtocolos(data_fim=HOJE - timedelta(days=3), lotacao='SESAU'),
+]
+
+
+@pytest.mark.parametrize('filtro', FILTROS, ids=lambda f: str(f.para_dict()))
+def test_numeros_conferem_com_os_protocolos(protocolos, filtro):
+    assert dashboard.estatisticas(filtro, hoje=HOJE) == esperado(protocolos, filtro)
+
+
+@pytest.mark.parametrize('periodo, agrupamento', [('7d', 'day'), ('month', 'day'), ('all', 'month')])
+def test_evolucao_por_periodo_e_agrupamento(protocolos, periodo, agrupamento):
+    obtido = dashboard.estatisticas(FiltroProtocolos(), periodo, agrupamento, hoje=HOJE)
+    assert obtido == esperado(protocolos, FiltroProtocolos(), periodo, agrupamento)
+
+
+def test_consolidado_acompanha_alteracoes_e_exclusoes(banco, protocolos):
+    protocolos[1].status = 'Finalizado'
+    protocolos[2].tipo_requerimento = 'Abono'
+    protocolos[3].data_solicitacao = HOJE - timedelta(days=30)
+    banco.session.delete(protocolos[4])
+    banco.session.commit()
+    restantes = Protocolo.query.all()
+
+    for filtro in FILTROS:
+        assert dashboard.estatisticas(filtro, hoje=HOJE) == esperado(restantes, filtro)
+
+
+def test_uma_consulta_por_calculo(protocolos, contador_sql):
+    for filtro in FILTROS:
+        with contador_sql.medir() as medicao:
+            dashboard.estatisticas(filtro, 'all', 'month', hoje=HOJE)
+        assert len(medicao.comandos) == 1
+        assert 'protocolo_stats_diario' in medicao.comandos[0]
+        assert 'FROM protocolos' not in medicao.comandos[0]
+
+
+def test_rota_usa_o_cache_e_invalida_no_commit(cliente, banco, protocolos, contador_sql):
+    url = '/protocolos/dashboard-stats?tipo=ferias'
+    with contador_sql.medir() as medicao:
+        antes = cliente.get(url).get_json()
+    primeira = list(medicao.comandos)
+    with contador_sql.medir() as medicao:
+        assert cliente.get(url).get_json() == antes
+    # A segunda só carrega o usuário logado
+    assert len(medicao.comandos) == len(primeira) - 1
+    assert not any('protocolo_stats_diario' in comando for comando in medicao.comandos)
+
+    banco.session.add(Protocolo(numero='9999/2026', nome='Novo', tipo_requerimento='Férias',
+                                status='Em análise', data_solicitacao=date.today()))
+    banco.session.commit()
+    depois = cliente.get(url).get_json()
+    assert depois['novosNoPeriodo'] == antes['novosNoPeriodo'] + 1
+
+
+def test_data_invalida(cliente):
+    resposta = cliente.get('/protocolos/dashboard-stats?data_inicio=31/02/2026')
+    assert resposta.status_code == 400
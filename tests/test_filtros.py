@@ -0,0 +1,161 @@
+"""Filtros de protocolos compartilhados (filtros.py).
+
+Os mesmos parâmetros têm de selecionar os mesmos protocolos na listagem,
+na API, em relatórios, na exportação (direta e pela fila) e nos números do
+dashboard; e a mesma combinação de filtros tem de gerar a mesma consulta,
+para reaproveitar o SQL compilado.
+"""
+import csv
+import io
+import unicodedata
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+import dashboard
+import jobs
+from filtros import FiltroProtocolos
+from models import Job, Protocolo
+
+PROTOCOLOS = [
+    # nome, tipo, status, lotação, responsável, data
+    ('Maria da Conceição', 'Licença Prêmio', 'Em análise', 'SEDUC', 'admin', date(2026, 1, 5)),
+    ('João Conceicao Lima', 'Férias', 'Finalizado', 'SESAU', 'ana', date(2026, 1, 20)),
+    ('Ana Simões', 'Licença Maternidade', 'Em análise', 'SESAU', 'admin', date(2026, 2, 1)),
+    ('Paulo Brandão', 'Abono', 'PROTOCOLO GERADO', 'SEDUC', 'ana', date(2026, 2, 15)),
+    ('Luíza Falcão', 'Férias', 'Em análise', 'SEDUC', 'admin', date(2026, 3, 1)),
+    ('Carlos Magalhães', 'Licenca Premio', 'Concluído', 'SEFAZ', 'ana', date(2025, 12, 31)),
+    ('Sérgio Assunção', 'Aposentadoria', 'Em análise', None, 'admin', date(2024, 7, 1)),
+]
+
+FILTROS = [
+    {'nome': 'conceicao'},
+    {'nome': 'CONCEIÇÃO  maria'},
+    {'tipo': 'licenca premio'},
+    {'tipo': 'ferias', 'lotacao': 'SEDUC'},
+    {'status': 'Em análise'},
+    {'responsavel': 'ana'},
+    {'data_inicio': '2026-01-20', 'data_fim': '2026-02-15'},
+    {'dataInicio': '2026-02-01'},
+    {'data_fim': '2026-01-31', 'status': 'Finalizado'},
+    {'numero': '0003'},
+]
+
+
+def _sem_acentos(texto):
+    return unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+
+
+def atende(filtro, protocolo):
+    """A semântica documentada em filtros.py, protocolo a protocolo."""
+    def contem(valor, termo):
+        return not termo or all(palavra in _sem_acentos(valor) for palavra in _sem_acentos(termo).split())
+
+    data = protocolo.data_solicitacao
+    return (
+        contem(protocolo.numero, filtro.numero) and contem(protocolo.nome, filtro.nome)
+        and contem(protocolo.tipo_requerimento, filtro.tipo)
+        and all(not getattr(filtro, campo) or getattr(protocolo, coluna) == getattr(filtro, campo)
+                for campo, coluna in (('status', 'status'), ('lotacao', 'lotacao'), ('responsavel', 'responsavel')))
+        and (not filtro.data_inicio or (data is not None and data >= filtro.data_inicio))
+        and (not filtro.data_fim or (data is not None and data <= filtro.data_fim))
+    )
+
+
+@pytest.fixture
+def protocolos(banco):
+    criados = [
+        Protocolo(numero=f'{i:04d}/2026', nome=nome, tipo_requerimento=tipo, status=status, lotacao=lotacao,
+                  responsavel=responsavel, data_solicitacao=data)
+        for i, (nome, tipo, status, lotacao, responsavel, data) in enumerate(PROTOCOLOS, start=1)
+    ]
+    banco.session.add_all(criados)
+    banco.session.commit()
+    return criados
+
+
+def esperados(protocolos, args):
+    filtro = FiltroProtocolos.de_args(args)
+    return sorted(p.nome for p in protocolos if atende(filtro, p))
+
+
+def nomes_no_html(html):
+    return sorted(nome for nome, *_ in PROTOCOLOS if f'<td>{nome}</td>' in html)
+
+
+def nomes_no_csv(conteudo):
+    return sorted(linha['Nome'] for linha in csv.DictReader(io.StringIO(conteudo.decode('utf-8-sig')), delimiter=';'))
+
+
+@pytest.mark.parametrize('args', FILTROS, ids=str)
+def test_mesmos_protocolos_em_todas_as_rotas(cliente, protocolos, args):
+    esperado = esperados(protocolos, args)
+
+    api = cliente.get('/api/protocolos', query_string={**args, 'per_page': 100}).get_json()
+    assert sorted(item['nome'] for item in api['itens']) == esperado
+    for rota in ('/protocolos', '/relatorios'):
+        assert nomes_no_html(cliente.get(rota, query_string=args).get_data(as_text=True)) == esperado, rota
+    assert nomes_no_csv(cliente.get('/protocolos/backup/csv', query_string=args).get_data()) == esperado
+
+    # Meus protocolos: os mesmos filtros, com o responsável trocado pelo usuário logado
+    meus = esperados(protocolos, {**args, 'responsavel': 'admin'})
+    assert nomes_no_html(cliente.get('/meus_protocolos', query_string=args).get_data(as_text=True)) == meus
+
+
+@pytest.mark.parametrize('args', [a for a in FILTROS if not {'nome', 'numero', 'responsavel'} & set(a)], ids=str)
+def test_dashboard_conta_os_mesmos_protocolos(cliente, protocolos, args):
+    # Os campos que não existem no consolidado (nome, número, responsável) não se aplicam aos cartões
+    stats = cliente.get('/protocolos/dashboard-stats', query_string=args).get_json()
+    assert sum(item['total'] for item in stats['statusProtocolos']) == len(esperados(protocolos, args))
+
+
+@pytest.mark.parametrize('args', FILTROS, ids=str)
+def test_exportacao_pela_fila_usa_os_mesmos_filtros(app, cliente, protocolos, args):
+    resposta = cliente.post('/jobs/exportacao/csv', query_string=args)
+    assert resposta.status_code == 202
+    assert Job.query.one().parametros['filtros'] == FiltroProtocolos.de_args(args).para_dict()
+
+    with app.app_context():
+        jobs.executar(jobs.reivindicar())
+    estado = cliente.get(resposta.get_json()['statusUrl']).get_json()
+    assert nomes_no_csv(cliente.get(estado['downloadUrl']).get_data()) == esperados(protocolos, args)
+
+
+def test_de_args_e_para_dict():
+    filtro = FiltroProtocolos.de_args({
+        'nome': '  maria ', 'tipo': '', 'status': 'Em análise', 'dataInicio': '2026-01-05',
+        'data_fim': '2026-02-01', 'pagina': '3', 'cursor': 'abc',
+    })
+    assert filtro == FiltroProtocolos(nome='maria', status='Em análise',
+                                      data_inicio=date(2026, 1, 5), data_fim=date(2026, 2, 1))
+    assert filtro.para_dict() == {'nome': 'maria', 'status': 'Em análise',
+                                  'data_inicio': '2026-01-05', 'data_fim': '2026-02-01'}
+    assert FiltroProtocolos.de_args(filtro.para_dict()) == filtro
+    assert FiltroProtocolos.de_args({}).para_dict() == {}
+
+
+@pytest.mark.parametrize('data', ['05/01/2026', '2026-02-30', 'ontem'])
+def test_data_invalida(cliente, data):
+    with pytest.raises(ValueError):
+        FiltroProtocolos.de_args({'data_inicio': data})
+    assert cliente.get('/api/protocolos', query_string={'data_inicio': data}).status_code == 400
+
+
+def test_mesma_combinacao_mesma_consulta_compilada():
+    def chave(filtro):
+        return select(Protocolo.id).where(*filtro.condicoes())._generate_cache_key()
+
+    a = FiltroProtocolos(nome='maria', status='Em análise', data_inicio=date(2026, 1, 1))
+    b = FiltroProtocolos(nome='joao', status='Finalizado', data_inicio=date(2025, 6, 1))
+    assert chave(a) == chave(b)
+    assert chave(a) != chave(FiltroProtocolos(nome='maria', lotacao='SEDUC', data_inicio=date(2026, 1, 1)))
+    # Cada palavra do "contém" é uma condição: o número de palavras muda a consulta
+    assert chave(a) != chave(FiltroProtocolos(nome='maria silva', status='Em análise', data_inicio=date(2026, 1, 1)))
+
+
+def test_condicoes_em_outra_tabela_ignoram_campos_sem_coluna():
+    filtro = FiltroProtocolos(nome='maria', responsavel='ana', tipo='ferias', status='Em análise',
+                              data_inicio=date(2026, 1, 1))
+    assert len(filtro.condicoes(dashboard.COLUNAS_CONSOLIDADO)) == 2
+    assert len(filtro.condicoes()) == 5
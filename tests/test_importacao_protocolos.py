@@ -0,0 +1,158 @@
+"""Importação em lote de protocolos (importacao_protocolos.py)."""
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+from openpyxl import Workbook
+
+import importacao_protocolos
+import numeracao
+import stats_diario
+from executor import ExecutorLimitado
+from models import HistoricoProtocolo, Protocolo, ProtocoloStatsDiario
+
+ANO = date.today().year
+CABECALHO = ('protocolo', 'requerente', 'cpf', 'tipo', 'lotacao', 'data', 'status')
+REGISTROS = [
+    ('0007/2019', 'Maria da Conceição', '123.456.789-01', 'Férias', 'SEDUC', '05/03/2019', 'Finalizado'),
+    (None, 'João Magalhães', None, 'Abono', 'SESAU', '2024-02-10', None),
+    (f'0040/{ANO}', 'Ana Simões', None, 'Férias', 'SEDUC', None, 'Em análise'),
+    (None, 'Paulo Brandão', '98765432100', None, None, '2025-07-01', None),
+]
+INVALIDOS = [
+    (None, None, None, 'Férias', 'SEDUC', '2024-01-01', None),            # sem nome
+    (None, 'Data Errada', None, None, None, '31/02/2024', None),
+    (None, 'CPF Curto', '123', None, None, None, None),
+    ('7/19/X', 'Número Errado', None, None, None, None, None),
+    ('0007/2019', 'Número Repetido', None, None, None, None, None),
+]
+
+
+def csv_(linhas):
+    texto = io.StringIO()
+    csv.writer(texto, delimiter=';').writerows([CABECALHO, *linhas])
+    return io.BytesIO(texto.getvalue().encode('utf-8'))
+
+
+def xlsx(linhas):
+    planilha = Workbook()
+    for linha in [CABECALHO, *linhas]:
+        planilha.active.append(list(linha))
+    arquivo = io.BytesIO()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def jsonl(linhas):
+    return io.BytesIO(''.join(
+        json.dumps({c: v for c, v in zip(CABECALHO, linha) if v is not None}) + '\n' for linha in linhas
+    ).encode('utf-8'))
+
+
+FORMATOS = {'csv': csv_, 'xlsx': xlsx, 'jsonl': jsonl}
+
+
+def importar(arquivo, nome, **kwargs):
+    relatorio = io.StringIO()
+    resultado = importacao_protocolos.importar(arquivo, nome, relatorio, 'importador', **kwargs)
+    return resultado, list(csv.DictReader(io.StringIO(relatorio.getvalue())))
+
+
+@pytest.mark.parametrize('formato', FORMATOS)
+def test_ida_e_volta(banco, formato):
+    resultado, rejeitadas = importar(FORMATOS[formato](REGISTROS), f'lote.{formato}')
+
+    assert resultado == {'lidos': 4, 'importados': 4, 'rejeitados': 0}
+    assert rejeitadas == []
+    protocolos = {p.nome: p for p in Protocolo.query}
+    maria = protocolos['Maria da Conceição']
+    assert (maria.numero, maria.ano, maria.sequencial) == ('0007/2019', 2019, 7)
+    assert (maria.data_solicitacao, maria.status, maria.cpf) == (date(2019, 3, 5), 'Finalizado', '123.456.789-01')
+    assert (maria.tipo_requerimento, maria.lotacao, maria.responsavel) == ('Férias', 'SEDUC', 'importador')
+    # Sem status nem data: os padrões de criar_protocolo
+    assert protocolos['Ana Simões'].data_solicitacao == date.today()
+    assert protocolos['João Magalhães'].status == importacao_protocolos.STATUS_PADRAO
+    # Sem número: o ano corrente, depois do maior número do ano trazido pelo arquivo
+    assert sorted(p.numero for p in Protocolo.query.filter(Protocolo.ano == ANO)) == [
+        f'0040/{ANO}', f'0041/{ANO}', f'0042/{ANO}',
+    ]
+    assert numeracao.proximo_numero() == f'0043/{ANO}'
+
+    historico = HistoricoProtocolo.query.all()
+    assert sorted(h.protocolo_id for h in historico) == sorted(p.id for p in protocolos.values())
+    assert {(h.responsavel, h.observacao) for h in historico} == {('importador', f'Protocolo importado de lote.{formato}.')}
+
+
+def test_relatorio_de_rejeitadas_pode_ser_corrigido_e_reimportado(banco):
+    resultado, rejeitadas = importar(csv_([REGISTROS[0], *INVALIDOS]), 'lote.csv')
+
+    assert resultado == {'lidos': 6, 'importados': 1, 'rejeitados': 5}
+    assert [(r['registro'], r['nome']) for r in rejeitadas] == [
+        ('2', ''), ('3', 'Data Errada'), ('4', 'CPF Curto'), ('5', 'Número Errado'), ('6', 'Número Repetido'),
+    ]
+    assert 'nome é obrigatório' in rejeitadas[0]['erro']
+    assert 'data_solicitacao inválida' in rejeitadas[1]['erro']
+    assert 'cpf deve ter 11 dígitos' in rejeitadas[2]['erro']
+    assert 'fora do padrão' in rejeitadas[3]['erro']
+    assert 'repetido no arquivo' in rejeitadas[4]['erro']
+
+    corrigidas = [r for r in rejeitadas if r['nome'] in ('Data Errada', 'CPF Curto')]
+    corrigidas[0]['data_solicitacao'] = '28/02/2024'
+    corrigidas[1]['cpf'] = '12345678901'
+    texto = io.StringIO()
+    escritor = csv.DictWriter(texto, fieldnames=list(corrigidas[0]))
+    escritor.writeheader()
+    escritor.writerows(corrigidas)
+    resultado, rejeitadas = importar(io.BytesIO(texto.getvalue().encode('utf-8')), 'corrigidas.csv')
+    assert resultado == {'lidos': 2, 'importados': 2, 'rejeitados': 0}
+
+    # O número que já está no banco é rejeitado em uma nova importação
+    resultado, rejeitadas = importar(csv_([REGISTROS[0]]), 'de-novo.csv')
+    assert resultado['rejeitados'] == 1 and 'já existe' in rejeitadas[0]['erro']
+    assert Protocolo.query.count() == 3
+
+
+def test_comandos_por_lote_nao_crescem_com_o_lote(banco, contador_sql):
+    def medir(quantidade, inicio):
+        linhas = [(None, f'Requerente {i}', None, 'Férias', 'SEDUC', '2024-01-01', None) for i in range(inicio, inicio + quantidade)]
+        with contador_sql.medir() as medicao:
+            resultado, _ = importar(csv_(linhas), 'lote.csv', tamanho_lote=500)
+        assert resultado['importados'] == quantidade
+        return len(medicao.comandos)
+
+    assert medir(2, 0) == medir(400, 2)
+    assert HistoricoProtocolo.query.count() == 402
+
+
+def test_um_commit_por_lote(banco):
+    linhas = [(None, f'Requerente {i}', None, None, None, None, None) for i in range(7)]
+    parciais = []
+    resultado, _ = importar(csv_(linhas), 'lote.csv', tamanho_lote=3, progresso=lambda r: parciais.append(dict(r)))
+    assert resultado['importados'] == 7
+    assert [p['importados'] for p in parciais] == [3, 6, 7]
+    sequenciais = sorted(s for s, in banco.session.query(Protocolo.sequencial))
+    assert sequenciais == list(range(1, 8))
+
+
+def test_validacao_no_pool_de_processos(banco, monkeypatch):
+    pool = ExecutorLimitado(2, max_fila=8, timeout=60)
+    monkeypatch.setattr(importacao_protocolos, 'executor_cpu', pool)
+    try:
+        resultado, rejeitadas = importar(csv_(REGISTROS + INVALIDOS), 'lote.csv')
+    finally:
+        if pool._pool is not None:
+            pool._pool.shutdown()
+    assert resultado == {'lidos': 9, 'importados': 4, 'rejeitados': 5}
+    assert [r['registro'] for r in rejeitadas] == ['5', '6', '7', '8', '9']
+
+
+def test_consolidado_do_dashboard(banco):
+    importar(csv_(REGISTROS), 'lote.csv')
+    mantido = sorted((l.data, l.status, l.tipo_requerimento, l.lotacao, l.total) for l in ProtocoloStatsDiario.query)
+
+    stats_diario.reconstruir(banco.session.connection())
+    banco.session.commit()
+    assert mantido == sorted((l.data, l.status, l.tipo_requerimento, l.lotacao, l.total) for l in ProtocoloStatsDiario.query)
@@ -0,0 +1,109 @@
+"""Sincronização da base de servidores (importacao_servidores.py)."""
+import io
+import json
+
+import pytest
+from openpyxl import Workbook
+
+import importacao_servidores
+from importacao_servidores import ArquivoInvalido
+from models import Servidor
+
+CABECALHO = ('matricula', 'nome', 'lotacao', 'cargo', 'unidade_de_exercicio')
+INICIAIS = [
+    ('1001', 'Maria da Conceição', 'SEDUC', 'Professora', 'Escola A'),
+    ('1002', 'João Magalhães', 'SESAU', 'Enfermeiro', 'Hospital B'),
+    ('1003', 'Ana Simões', 'SEDUC', 'Merendeira', 'Escola C'),
+]
+
+
+def csv_(linhas, cabecalho=CABECALHO, separador=';'):
+    texto = '\n'.join(separador.join(campo or '' for campo in linha) for linha in [cabecalho, *linhas])
+    return io.BytesIO(('\ufeff' + texto + '\n').encode('utf-8'))
+
+
+def xlsx(linhas, cabecalho=CABECALHO):
+    planilha = Workbook()
+    for linha in [cabecalho, *linhas]:
+        planilha.active.append(list(linha))
+    arquivo = io.BytesIO()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def jsonl(linhas, cabecalho=CABECALHO):
+    return io.BytesIO(''.join(json.dumps(dict(zip(cabecalho, linha))) + '\n' for linha in linhas).encode('utf-8'))
+
+
+FORMATOS = {'csv': csv_, 'xlsx': xlsx, 'jsonl': jsonl}
+
+
+def na_tabela():
+    return sorted(
+        (s.matricula, s.nome, s.lotacao, s.cargo, s.unidade_de_exercicio) for s in Servidor.query
+    )
+
+
+def importar(formato, linhas, **kwargs):
+    return importacao_servidores.importar(FORMATOS[formato](linhas), f'rh.{formato}', **kwargs)
+
+
+@pytest.mark.parametrize('formato', FORMATOS)
+def test_ida_e_volta(banco, formato):
+    assert importar(formato, INICIAIS) == {'lidos': 3, 'ignorados': 0, 'inseridos': 3, 'atualizados': 0, 'removidos': 0}
+    assert na_tabela() == INICIAIS
+
+    # O mesmo arquivo de novo não reescreve nenhuma linha
+    assert importar(formato, INICIAIS) == {'lidos': 3, 'ignorados': 0, 'inseridos': 0, 'atualizados': 0, 'removidos': 0}
+
+    nova = [
+        INICIAIS[0],
+        ('1002', 'João Magalhães', 'SEDUC', 'Enfermeiro', 'Escola D'),
+        ('1004', 'Paulo Brandão', 'SEFAZ', 'Auditor', None),
+    ]
+    assert importar(formato, nova) == {'lidos': 3, 'ignorados': 0, 'inseridos': 1, 'atualizados': 1, 'removidos': 1}
+    assert na_tabela() == sorted(nova)
+
+
+def test_manter_ausentes(banco):
+    importar('csv', INICIAIS)
+    resultado = importar('csv', [('1004', 'Paulo Brandão', 'SEFAZ', 'Auditor', 'Sede')], remover_ausentes=False)
+    assert (resultado['inseridos'], resultado['removidos']) == (1, 0)
+    assert Servidor.query.count() == 4
+
+
+def test_matricula_repetida_vale_a_ultima_e_sem_matricula_e_ignorada(banco):
+    linhas = [*INICIAIS, ('1001', 'Maria da Conceição Lima', 'SEDUC', 'Diretora', 'Escola A'), (None, 'Sem Matrícula', 'X', 'Y', 'Z')]
+    resultado = importar('csv', linhas)
+    assert (resultado['lidos'], resultado['ignorados'], resultado['inseridos']) == (4, 1, 3)
+    assert Servidor.query.filter_by(matricula='1001').one().cargo == 'Diretora'
+
+
+def test_cabecalho_com_acentos_sinonimos_e_matricula_numerica(banco):
+    cabecalho = ('Matrícula', 'Nome Servidor', 'Lotação', 'Cargo', 'Unidade')
+    importacao_servidores.importar(xlsx([(1001.0, ' Maria ', 'SEDUC', 'Professora', 'Escola A')], cabecalho), 'rh.xlsx')
+    assert na_tabela() == [('1001', 'Maria', 'SEDUC', 'Professora', 'Escola A')]
+
+
+def test_arquivo_invalido_nao_altera_a_tabela(banco):
+    importar('csv', INICIAIS)
+    with pytest.raises(ArquivoInvalido):
+        importacao_servidores.importar(csv_([('Maria',)], cabecalho=('nome',)), 'rh.csv')
+    with pytest.raises(ArquivoInvalido):
+        importar('csv', [(None, 'Sem Matrícula', 'X', 'Y', 'Z')])
+    with pytest.raises(ArquivoInvalido):
+        importacao_servidores.importar(io.BytesIO(b'{"matricula": 1'), 'rh.jsonl')
+    assert na_tabela() == INICIAIS
+
+
+def test_rota_e_busca_enxergam_a_importacao(cliente, banco):
+    assert cliente.get('/api/servidores/search', query_string={'nome': 'magal'}).get_json() == []
+
+    resposta = cliente.post('/admin/servidores/importar', data={'arquivo': (csv_(INICIAIS), 'rh.csv')},
+                            content_type='multipart/form-data')
+    assert resposta.status_code == 302
+
+    encontrados = cliente.get('/api/servidores/search', query_string={'nome': 'magal'}).get_json()
+    assert [s['matricula'] for s in encontrados] == ['1002']
+    assert cliente.get('/api/servidor/1003').get_json()['nome'] == 'Ana Simões'
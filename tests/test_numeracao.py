@@ -0,0 +1,95 @@
+"""Numeração dos protocolos sob concorrência (numeracao.py).
+
+Vários threads, cada um com a sua conexão, reservam números do mesmo ano ao
+mesmo tempo. Os números gravados têm de ser exatamente 1..N: nenhum
+repetido e nenhum buraco, inclusive quando parte das transações é desfeita.
+"""
+import threading
+from datetime import date
+
+import numeracao
+from conftest import entrar
+from models import Protocolo, ProtocoloSequencia
+
+THREADS = 16
+ANO = 2031
+
+
+def em_paralelo(app, quantidade, funcao):
+    """Roda ``funcao(i)`` em ``quantidade`` threads liberados juntos; devolve as exceções."""
+    largada = threading.Barrier(quantidade)
+    erros = []
+
+    def executar(i):
+        try:
+            with app.app_context():
+                largada.wait()
+                funcao(i)
+        except Exception as e:  # noqa: BLE001 - reportado pelo teste
+            erros.append(e)
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return erros
+
+
+def test_sem_repeticao_nem_buracos(app, banco):
+    def criar(i):
+        numero = numeracao.proximo_numero(ANO)
+        banco.session.add(Protocolo(numero=numero, nome=f'Requerente {i}', data_solicitacao=date(ANO, 1, 2)))
+        banco.session.commit()
+
+    assert em_paralelo(app, THREADS, criar) == []
+
+    sequenciais = sorted(s for s, in banco.session.query(Protocolo.sequencial).filter(Protocolo.ano == ANO))
+    assert sequenciais == list(range(1, THREADS + 1))
+    assert numeracao.ultimo_sequencial(ANO) == THREADS
+
+
+def test_rollback_devolve_o_numero(app, banco):
+    def criar_ou_desistir(i):
+        numero = numeracao.proximo_numero(ANO)
+        banco.session.add(Protocolo(numero=numero, nome=f'Requerente {i}'))
+        if i % 3 == 0:
+            banco.session.rollback()
+        else:
+            banco.session.commit()
+
+    assert em_paralelo(app, THREADS, criar_ou_desistir) == []
+
+    gravados = THREADS - len(range(0, THREADS, 3))
+    sequenciais = sorted(s for s, in banco.session.query(Protocolo.sequencial).filter(Protocolo.ano == ANO))
+    assert sequenciais == list(range(1, gravados + 1))
+    assert banco.session.get(ProtocoloSequencia, ANO).ultimo == gravados
+
+
+def test_reserva_em_bloco_concorrente(app, banco):
+    blocos = []
+
+    def reservar(i):
+        blocos.append(list(numeracao.reservar_sequenciais(ANO, 1 + i % 4)))
+        banco.session.commit()
+
+    assert em_paralelo(app, THREADS, reservar) == []
+
+    numeros = sorted(n for bloco in blocos for n in bloco)
+    assert numeros == list(range(1, len(numeros) + 1))
+    assert all(bloco == list(range(bloco[0], bloco[-1] + 1)) for bloco in blocos)
+
+
+def test_criar_protocolo_concorrente_pela_rota(app, admin, banco):
+    ano = date.today().year
+    clientes = [entrar(app) for _ in range(8)]
+
+    def enviar(i):
+        resposta = clientes[i].post('/protocolo/novo', data={'nome': f'Requerente {i}', 'data_solicitacao': f'{ano}-01-02'})
+        assert resposta.status_code == 302
+
+    assert em_paralelo(app, len(clientes), enviar) == []
+
+    sequenciais = sorted(s for s, in banco.session.query(Protocolo.sequencial).filter(Protocolo.ano == ano))
+    assert sequenciais == list(range(1, len(clientes) + 1))
+    assert clientes[0].get(f'/protocolos/ultimoNumero/{ano}').get_json() == {'ultimo': len(clientes)}
@@ -0,0 +1,125 @@
+"""PDF em lote (GET /protocolos/pdf, tarefa 'pdf_lote' e pdf.gerar_lote)."""
+import io
+from datetime import date
+
+import pytest
+from pypdf import PdfReader
+
+import jobs
+import pdf
+from cache import CacheBinario
+from models import Job, Protocolo
+
+
+@pytest.fixture
+def protocolos(banco):
+    criados = []
+    for i in range(1, 7):
+        protocolo = Protocolo(
+            numero=f'{i:04d}/2026', ano=2026, sequencial=i, nome=f'Requerente {i}',
+            tipo_requerimento='Férias' if i % 2 else 'Abono', status='Em análise',
+            data_solicitacao=date(2026, 2, i), observacoes='linha\n' * (i * 10),
+        )
+        banco.session.add(protocolo)
+        criados.append(protocolo)
+    banco.session.commit()
+    return criados
+
+
+@pytest.fixture
+def cache_vazio(monkeypatch, tmp_path):
+    """Cache de PDFs só deste teste: os ids recomeçam a cada teste e o HTML se repetiria."""
+    monkeypatch.setattr(pdf, 'cache_pdf', CacheBinario(str(tmp_path), 3600, 64 * 2**20, 8 * 2**20))
+
+
+@pytest.fixture
+def lotes(monkeypatch, cache_vazio):
+    """Números dos protocolos de cada chamada a ``pdf.gerar_lote``, na ordem recebida."""
+    chamadas = []
+    original = pdf.gerar_lote
+
+    def registrar(protocolos):
+        chamadas.append([protocolo.numero for protocolo in protocolos])
+        return original(protocolos)
+
+    monkeypatch.setattr(pdf, 'gerar_lote', registrar)
+    return chamadas
+
+
+@pytest.fixture
+def renderizados(monkeypatch):
+    """Quantas vezes o layout rodou (o pool roda no processo nos testes)."""
+    contagem = []
+    original = pdf._renderizar
+    monkeypatch.setattr(pdf, '_renderizar', lambda html: contagem.append(html) or original(html))
+    return contagem
+
+
+@pytest.fixture
+def limite_sincrono(app):
+    anterior = app.config['PDF_LOTE_SINCRONO_MAX']
+    yield app.config
+    app.config['PDF_LOTE_SINCRONO_MAX'] = anterior
+
+
+def paginas(conteudo):
+    return len(PdfReader(io.BytesIO(conteudo)).pages)
+
+
+def test_ids_na_ordem_dada(cliente, protocolos, lotes):
+    ids = [protocolos[2].id, protocolos[0].id, protocolos[4].id]
+    resposta = cliente.get('/protocolos/pdf', query_string={'ids': ','.join(map(str, ids))})
+
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'application/pdf'
+    assert lotes == [['0003/2026', '0001/2026', '0005/2026']]
+
+    individuais = [cliente.get(f'/protocolo/{i}/pdf').get_data() for i in ids]
+    assert paginas(resposta.get_data()) == sum(paginas(conteudo) for conteudo in individuais)
+
+
+def test_filtros_da_listagem_na_ordem_da_listagem(cliente, protocolos, lotes):
+    resposta = cliente.get('/protocolos/pdf', query_string={'tipo': 'ferias'})
+    assert resposta.status_code == 200
+    assert lotes == [['0001/2026', '0003/2026', '0005/2026']]
+
+
+def test_nenhum_protocolo(cliente, protocolos, lotes):
+    assert cliente.get('/protocolos/pdf', query_string={'nome': 'ninguém'}).status_code == 404
+    assert cliente.get('/protocolos/pdf', query_string={'ids': 'a,b'}).status_code == 400
+    assert lotes == []
+
+
+def test_acima_do_limite_sincrono_vai_para_a_fila(app, cliente, protocolos, lotes, limite_sincrono):
+    limite_sincrono['PDF_LOTE_SINCRONO_MAX'] = 2
+
+    resposta = cliente.get('/protocolos/pdf', query_string={'tipo': 'ferias'})
+    assert resposta.status_code == 400
+    dados = resposta.get_json()
+    assert 'limite de 2' in dados['error']
+    assert lotes == []
+
+    resposta = cliente.post(dados['jobUrl'])
+    assert resposta.status_code == 202
+    job = Job.query.one()
+    assert (job.tipo, job.parametros) == ('pdf_lote', {'ids': [], 'filtros': {'tipo': 'ferias'}})
+
+    # A fila usa o limite de PDF_LOTE_MAX, não o da requisição
+    with app.app_context():
+        jobs.executar(jobs.reivindicar())
+    estado = cliente.get(resposta.get_json()['statusUrl']).get_json()
+    assert estado['status'] == jobs.CONCLUIDO, estado['erro']
+    assert lotes == [['0001/2026', '0003/2026', '0005/2026']]
+    assert paginas(cliente.get(estado['downloadUrl']).get_data()) >= 3
+
+
+def test_diagrama_so_o_que_falta_no_cache(cliente, protocolos, cache_vazio, renderizados):
+    repetidos = ','.join(str(p.id) for p in (protocolos[0], protocolos[1], protocolos[0]))
+    assert cliente.get('/protocolos/pdf', query_string={'ids': repetidos}).status_code == 200
+    # O mesmo protocolo duas vezes no lote é diagramado uma vez só
+    assert len(renderizados) == 2
+
+    assert cliente.get(f'/protocolo/{protocolos[2].id}/pdf').status_code == 200
+    todos = ','.join(str(p.id) for p in protocolos[:3])
+    assert cliente.get('/protocolos/pdf', query_string={'ids': todos}).status_code == 200
+    assert len(renderizados) == 3
@@ -0,0 +1,40 @@
+"""Planos de execução das consultas das rotas (planos.py e ``flask verificar-consultas``)."""
+from sqlalchemy import text
+
+import planos
+from models import HistoricoProtocolo, Protocolo, ProtocoloStatsDiario
+
+SEMEAR = 50_000
+LIMITE = 1000
+
+
+def test_nenhuma_varredura_em_tabela_grande(banco):
+    resultado = planos.verificar(LIMITE, semear=SEMEAR)
+
+    assert [nome for nome, _, _ in resultado] == list(planos.consultas())
+    assert [(nome, grandes) for nome, grandes, _ in resultado if grandes] == []
+    linhas_dashboard = dict((nome, linhas) for nome, _, linhas in resultado)['dashboard']
+    # O dashboard só lê o consolidado, nunca protocolos
+    assert set(linhas_dashboard) <= planos.VARREDURAS_PREVISTAS['dashboard']
+
+    # A semeadura é desfeita no fim
+    assert Protocolo.query.count() == 0
+    assert HistoricoProtocolo.query.count() == 0
+    assert ProtocoloStatsDiario.query.count() == 0
+
+
+def test_aponta_a_consulta_sem_indice(banco):
+    # Desfeito pelo rollback de verificar, na mesma transação
+    banco.session.execute(text('DROP INDEX ix_historico_protocolos_protocolo_id'))
+    grandes = {nome: grandes for nome, grandes, _ in planos.verificar(LIMITE, semear=SEMEAR)}
+    assert grandes['histórico do protocolo'] == ['historico_protocolos']
+
+    indices = banco.session.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'historico_protocolos'")).scalars()
+    assert 'ix_historico_protocolos_protocolo_id' in set(indices)
+
+
+def test_comando(app, banco):
+    resultado = app.test_cli_runner().invoke(args=['verificar-consultas', '--semear', str(SEMEAR)])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'ok    dashboard' in resultado.output
+    assert 'FALHA' not in resultado.output
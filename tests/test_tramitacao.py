@@ -0,0 +1,126 @@
+"""Atualização de status em lote (POST /protocolos/atualizar/lote, tramitacao.py)."""
+from datetime import date
+
+import pytest
+
+import stats_diario
+from models import HistoricoProtocolo, Protocolo, ProtocoloStatsDiario
+
+URL = '/protocolos/atualizar/lote'
+
+
+def semear(banco, quantidade):
+    inicio = Protocolo.query.count()
+    protocolos = [
+        Protocolo(numero=f'{i:04d}/2026', nome=f'Requerente {i}', status='Em análise', responsavel='maria',
+                  tipo_requerimento='Férias', lotacao='SEDUC', data_solicitacao=date(2026, 1, 1 + i % 5))
+        for i in range(inicio + 1, inicio + quantidade + 1)
+    ]
+    banco.session.add_all(protocolos)
+    banco.session.commit()
+    return [protocolo.id for protocolo in protocolos]
+
+
+def consolidado(banco):
+    return sorted(
+        (linha.data, linha.status, linha.tipo_requerimento, linha.lotacao, linha.total)
+        for linha in ProtocoloStatsDiario.query.filter(ProtocoloStatsDiario.total != 0)
+    )
+
+
+def test_resultado_por_id_e_historico(cliente, banco):
+    ids = semear(banco, 3)
+    resposta = cliente.post(URL, json={
+        'protocoloIds': [ids[2], 9999, ids[0], ids[2]], 'novoStatus': 'Encaminhado',
+        'novoResponsavel': 'joao', 'observacao': 'Para o RH',
+    })
+
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert dados['sucesso'] and dados['atualizados'] == 2
+    assert dados['resultados'] == [
+        {'id': ids[2], 'sucesso': True, 'status': 'Encaminhado', 'responsavel': 'joao'},
+        {'id': 9999, 'sucesso': False, 'mensagem': 'Protocolo não encontrado.'},
+        {'id': ids[0], 'sucesso': True, 'status': 'Encaminhado', 'responsavel': 'joao'},
+    ]
+
+    banco.session.expire_all()
+    estados = {p.id: (p.status, p.responsavel) for p in Protocolo.query}
+    assert estados == {ids[0]: ('Encaminhado', 'joao'), ids[1]: ('Em análise', 'maria'), ids[2]: ('Encaminhado', 'joao')}
+    historico = sorted((h.protocolo_id, h.status, h.responsavel, h.observacao) for h in HistoricoProtocolo.query)
+    assert historico == [(ids[0], 'Encaminhado', 'admin', 'Para o RH'), (ids[2], 'Encaminhado', 'admin', 'Para o RH')]
+
+
+def test_sem_responsavel_mantem_o_atual(cliente, banco):
+    ids = semear(banco, 2)
+    dados = cliente.post(URL, json={'protocoloIds': ids, 'novoStatus': 'Finalizado'}).get_json()
+    assert [r['responsavel'] for r in dados['resultados']] == ['maria', 'maria']
+
+
+def test_comandos_nao_crescem_com_o_lote(cliente, banco, contador_sql):
+    def medir(ids):
+        with contador_sql.medir() as medicao:
+            assert cliente.post(URL, json={'protocoloIds': ids, 'novoStatus': 'Encaminhado'}).status_code == 200
+        return list(medicao.comandos)
+
+    um = medir(semear(banco, 1))
+    muitos = medir(semear(banco, 200))
+
+    assert len(muitos) == len(um)
+    assert sum(c.startswith('UPDATE protocolos ') for c in muitos) == 1
+    assert sum(c.startswith('INSERT INTO historico_protocolos') for c in muitos) == 1
+    assert HistoricoProtocolo.query.count() == 201
+
+
+def test_erro_desfaz_o_lote_inteiro(cliente, banco, monkeypatch):
+    ids = semear(banco, 5)
+
+    def falhar(conexao, variacoes):
+        raise RuntimeError('falha simulada')
+
+    monkeypatch.setattr(stats_diario, 'aplicar_variacoes', falhar)
+    resposta = cliente.post(URL, json={'protocoloIds': ids, 'novoStatus': 'Finalizado'})
+
+    assert resposta.status_code == 500
+    banco.session.expire_all()
+    assert {p.status for p in Protocolo.query} == {'Em análise'}
+    assert HistoricoProtocolo.query.count() == 0
+
+
+def test_consolidado_do_dashboard_acompanha_o_lote(cliente, banco):
+    ids = semear(banco, 10)
+    cliente.post(URL, json={'protocoloIds': ids[:6], 'novoStatus': 'Finalizado'})
+    cliente.post(URL, json={'protocoloIds': ids[4:], 'novoStatus': 'Encaminhado'})
+    mantido = consolidado(banco)
+
+    stats_diario.reconstruir(banco.session.connection())
+    banco.session.commit()
+    assert mantido == consolidado(banco)
+
+
+@pytest.mark.parametrize('corpo', [
+    {'protocoloIds': [], 'novoStatus': 'Finalizado'},
+    {'protocoloIds': [1, 2]},
+    {'protocoloIds': ['x'], 'novoStatus': 'Finalizado'},
+])
+def test_dados_invalidos(cliente, banco, corpo):
+    assert cliente.post(URL, json=corpo).status_code == 400
+
+
+def test_limite_do_lote(app, cliente, banco):
+    anterior = app.config['ATUALIZACAO_LOTE_MAX']
+    app.config['ATUALIZACAO_LOTE_MAX'] = 3
+    try:
+        resposta = cliente.post(URL, json={'protocoloIds': semear(banco, 4), 'novoStatus': 'Finalizado'})
+    finally:
+        app.config['ATUALIZACAO_LOTE_MAX'] = anterior
+    assert resposta.status_code == 400
+    assert HistoricoProtocolo.query.count() == 0
+
+
+def test_rota_de_um_protocolo(cliente, banco):
+    protocolo_id, = semear(banco, 1)
+    resposta = cliente.post('/protocolos/atualizar', json={'protocoloId': protocolo_id, 'novoStatus': 'Finalizado'})
+    assert resposta.get_json()['sucesso']
+    assert cliente.post('/protocolos/atualizar', json={'protocoloId': 9999, 'novoStatus': 'Finalizado'}).status_code == 404
+    assert HistoricoProtocolo.query.count() == 1
@@ -0,0 +1,71 @@
+"""Atualização de status e encaminhamento de protocolos em lote.
+
+Em vez de carregar e salvar cada protocolo pelo ORM, o lote inteiro vira um
+``UPDATE ... WHERE id IN (...)`` e um único INSERT de várias linhas no
+histórico, na mesma transação. Como o UPDATE em massa não passa pelos
+eventos do ORM, as variações do consolidado do dashboard (stats_diario.py)
+são calculadas aqui, a partir dos valores lidos (e travados) antes da
+alteração.
+"""
+from collections import Counter
+
+from sqlalchemy import insert, select, update
+
+import stats_diario
+from app import db
+from models import HistoricoProtocolo, Protocolo
+
+
+def atualizar_status(ids, status, autor, responsavel=None, observacao=None):
+    """Aplica ``status`` (e ``responsavel``, se informado) aos protocolos ``ids``.
+
+    Não faz commit. Devolve ``{id: resultado}`` com ``sucesso`` e os novos
+    valores de cada protocolo, ou a mensagem de erro dos ids inexistentes.
+    """
+    ids = list(dict.fromkeys(ids))
+    atuais = db.session.execute(
+        select(Protocolo.id, Protocolo.data_solicitacao, Protocolo.status,
+               Protocolo.tipo_requerimento, Protocolo.lotacao, Protocolo.responsavel)
+        .where(Protocolo.id.in_(ids))
+        .order_by(Protocolo.id)
+        .with_for_update()
+    ).all()
+    encontrados = {linha.id: linha for linha in atuais}
+
+    if encontrados:
+        valores = {'status': status}
+        if responsavel:
+            valores['responsavel'] = responsavel
+        db.session.execute(
+            update(Protocolo).where(Protocolo.id.in_(list(encontrados))).values(**valores),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.execute(insert(HistoricoProtocolo), [
+            {'protocolo_id': protocolo_id, 'status': status, 'responsavel': autor, 'observacao': observacao}
+            for protocolo_id in encontrados
+        ])
+
+        variacoes = Counter()
+        for linha in atuais:
+            anterior = stats_diario.chave(linha.data_solicitacao, linha.status, linha.tipo_requerimento, linha.lotacao)
+            atual = stats_diario.chave(linha.data_solicitacao, status, linha.tipo_requerimento, linha.lotacao)
+            if anterior != atual:
+                variacoes[anterior] -= 1
+                variacoes[atual] += 1
+        if any(variacoes.values()):
+            stats_diario.aplicar_variacoes(db.session.connection(), variacoes)
+            # Lido no commit para invalidar as respostas do dashboard em cache
+            db.session.info['consolidado_alterado'] = True
+
+    resultados = {}
+    for protocolo_id in ids:
+        linha = encontrados.get(protocolo_id)
+        if linha is None:
+            resultados[protocolo_id] = {'sucesso': False, 'mensagem': 'Protocolo não encontrado.'}
+        else:
+            resultados[protocolo_id] = {
+                'sucesso': True,
+                'status': status,
+                'responsavel': responsavel or linha.responsavel,
+            }
+    return resultados
@@ -0,0 +1,70 @@
+"""Limites de tamanho aplicados aos uploads enquanto o corpo da requisição é lido."""
+import os
+from tempfile import SpooledTemporaryFile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Arquivos até este tamanho ficam em memória; acima disso o parser usa disco
+SPOOL_MAX_SIZE = 500 * 1024
+# Folga para os demais campos e delimitadores do multipart
+MULTIPART_OVERHEAD = 64 * 1024
+# Rotas de envio de anexos, as únicas sujeitas a ANEXO_LIMITES_POR_TIPO (a importação de
+# servidores, por exemplo, recebe planilhas maiores e só respeita MAX_CONTENT_LENGTH)
+ENDPOINTS_ANEXO = frozenset({'adicionar_anexo'})
+
+
+def parse_limites_por_tipo(valor):
+    """Converte 'pdf=50,jpg=10' (MB) em {'pdf': 52428800, 'jpg': 10485760}."""
+    limites = {}
+    for item in (valor or '').split(','):
+        if '=' not in item:
+            continue
+        extensao, megabytes = item.split('=', 1)
+        limites[extensao.strip().lower().lstrip('.')] = int(float(megabytes) * 1024 * 1024)
+    return limites
+
+
+class _ArquivoLimitado:
+    """Arquivo temporário que aborta a requisição ao passar de ``limite`` bytes."""
+
+    def __init__(self, limite):
+        self._arquivo = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='rb+')
+        self._limite = limite
+        self._escritos = 0
+
+    def write(self, dados):
+        self._escritos += len(dados)
+        if self._escritos > self._limite:
+            self._arquivo.close()
+            raise RequestEntityTooLarge()
+        return self._arquivo.write(dados)
+
+    def __getattr__(self, nome):
+        return getattr(self._arquivo, nome)
+
+    def __iter__(self):
+        return iter(self._arquivo)
+
+
+class RequestComLimites(Request):
+    """Request que aplica ``ANEXO_LIMITES_POR_TIPO`` a cada anexo enviado.
+
+    Vale só para as rotas de ``ENDPOINTS_ANEXO``. O limite é escolhido pela extensão do arquivo assim que o cabeçalho da
+    parte chega, antes do conteúdo ser gravado; ``MAX_CONTENT_LENGTH``
+    continua valendo para a requisição inteira.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        from flask import current_app
+
+        if self.endpoint not in ENDPOINTS_ANEXO:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        extensao = os.path.splitext(filename or '')[1].lower().lstrip('.')
+        limite = current_app.config.get('ANEXO_LIMITES_POR_TIPO', {}).get(extensao)
+        if limite is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        if total_content_length and total_content_length > limite + MULTIPART_OVERHEAD:
+            raise RequestEntityTooLarge()
+        return _ArquivoLimitado(limite)